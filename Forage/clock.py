@@ -0,0 +1,138 @@
+"""
+Clock abstraction so the robot and controller code can run in virtual time.
+
+Code calls get_clock().time() / .monotonic() / .sleep() / .wait() instead of
+the time module, and classes take an optional clock argument. SystemClock is the
+default. VirtualClock returns from sleep() immediately after advancing its
+time, so a whole mission can be replayed in milliseconds. Virtual time is
+shared by every thread: a sleep in any thread advances it for all of them,
+so virtual runs should be driven from a single thread.
+
+Version2/clock.py is a copy of this file; change both together.
+"""
+
+import asyncio
+import threading
+import time
+
+
+class SystemClock:
+    """Wall-clock time."""
+
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def wait(self, event, timeout=None):
+        """Wait for a threading.Event. Returns False if timeout seconds pass first."""
+        return event.wait(timeout)
+
+    async def async_sleep(self, seconds):
+        await asyncio.sleep(seconds)
+
+    async def async_wait(self, event, timeout=None):
+        """Wait for an asyncio.Event. Returns False if timeout seconds pass first."""
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class VirtualClock:
+    """Time that only moves when someone sleeps or calls advance()."""
+
+    def __init__(self, start=0.0):
+        self.lock = threading.Lock()
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        with self.lock:
+            self.now += max(0.0, seconds)
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+        # Still yield so other threads get a chance to run
+        time.sleep(0)
+
+    def wait(self, event, timeout=None):
+        """Jump ahead by timeout if the event is still clear; without a timeout, block until it is set."""
+        if timeout is None:
+            return event.wait()
+        time.sleep(0)
+        if not event.is_set():
+            self.advance(timeout)
+        return event.is_set()
+
+    async def async_sleep(self, seconds):
+        self.advance(seconds)
+        await asyncio.sleep(0)
+
+    async def async_wait(self, event, timeout=None):
+        """Give pending callbacks one pass, then jump ahead by timeout if the event is still clear.
+        Without a timeout, block until the event is set, like SystemClock."""
+        if timeout is None:
+            await event.wait()
+            return True
+        await asyncio.sleep(0)
+        if not event.is_set():
+            self.advance(timeout)
+        return event.is_set()
+
+
+class SkewedClock:
+    """Another clock offset by a fixed amount and running at a slightly different rate.
+
+    Stands in for a second machine with its own unsynchronized clock when
+    testing clock_sync.py. drift is the rate error, e.g. 50e-6 for 50 ppm.
+    """
+
+    def __init__(self, base, offset=0.0, drift=0.0):
+        self.base = base
+        self.offset = offset
+        self.drift = drift
+        self.start = base.time()
+        self.start_monotonic = base.monotonic()
+
+    def time(self):
+        return self.start + self.offset + (self.base.time() - self.start) * (1 + self.drift)
+
+    def monotonic(self):
+        return self.start_monotonic + (self.base.monotonic() - self.start_monotonic) * (1 + self.drift)
+
+    def sleep(self, seconds):
+        self.base.sleep(seconds)
+
+    def wait(self, event, timeout=None):
+        return self.base.wait(event, timeout)
+
+    async def async_sleep(self, seconds):
+        await self.base.async_sleep(seconds)
+
+    async def async_wait(self, event, timeout=None):
+        return await self.base.async_wait(event, timeout)
+
+
+_clock = SystemClock()
+
+
+def get_clock():
+    """Return the process-wide clock."""
+    return _clock
+
+
+def set_clock(clock):
+    """Replace the process-wide clock, e.g. with a VirtualClock for simulation."""
+    global _clock
+    _clock = clock
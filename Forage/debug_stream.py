@@ -0,0 +1,161 @@
+"""
+Debug video over HTTP for a headless robot.
+
+The control loop hands every frame to publish(), which only drops it into a
+latest-value Mailbox. A publisher thread wakes at most fps times a second,
+takes the newest frame, has the controller draw its overlay on it, shrinks
+it by scale and encodes it as JPEG. Frames in between are never drawn or
+encoded, and nothing is drawn or encoded while nobody is watching.
+
+Open http://<robot>:<port>/ in a browser for the MJPEG stream, or fetch
+/frame.jpg for a single snapshot.
+"""
+
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+from clock import get_clock
+from pipeline import Mailbox
+
+
+class DebugStream:
+    def __init__(self, render, port=8080, fps=5, scale=0.5, quality=70, clock=None):
+        """render(image, detection) returns the debug image for one frame; it runs on the publisher thread."""
+        self.render = render
+        self.port = port
+        self.fps = fps
+        self.scale = scale
+        self.quality = quality
+        self.clock = clock or get_clock()
+        self.frames = Mailbox("stream")
+        self.cond = threading.Condition()
+        self.jpeg = None
+        self.frame_id = 0
+        self.viewers = 0
+        self.closed = False
+        self.server = None
+        self.threads = []
+
+        # Statistics
+        self.sent = 0  # Frames encoded
+        self.encode_time = 0.0
+
+    def start(self):
+        self.server = ThreadingHTTPServer(("0.0.0.0", self.port), self.handler())
+        self.server.daemon_threads = True
+        self.threads = [threading.Thread(target=self.server.serve_forever, daemon=True),
+                        threading.Thread(target=self.publish_loop, daemon=True)]
+        for thread in self.threads:
+            thread.start()
+        print(f"[STREAM] Debug video on http://0.0.0.0:{self.port}/ at up to {self.fps}fps")
+
+    def publish(self, image, detection):
+        """Offer a frame; cheap enough to call for every frame from the control loop."""
+        self.frames.put((image, detection))
+
+    def publish_loop(self):
+        next_time = self.clock.time()
+        while not self.closed:
+            delay = next_time - self.clock.time()
+            if delay > 0:
+                self.clock.sleep(delay)
+            item = self.frames.get(timeout=0.5)
+            if item is None:
+                continue
+            next_time = self.clock.time() + 1.0 / self.fps
+            if not self.viewers:
+                continue
+            start = self.clock.time()
+            image = self.render(*item)
+            if self.scale != 1:
+                image = cv2.resize(image, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+            ok, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if not ok:
+                continue
+            with self.cond:
+                self.jpeg = jpeg.tobytes()
+                self.frame_id += 1
+                self.cond.notify_all()
+            self.sent += 1
+            self.encode_time += self.clock.time() - start
+
+    @contextmanager
+    def watching(self):
+        with self.cond:
+            self.viewers += 1
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.viewers -= 1
+
+    def wait_frame(self, last_id, timeout=1.0):
+        """(frame id, JPEG bytes) of a frame newer than last_id, or (last_id, None) on timeout."""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.frame_id != last_id or self.closed, timeout) or self.closed:
+                return last_id, None
+            return self.frame_id, self.jpeg
+
+    def handler(self):
+        stream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path in ("/", "/stream"):
+                    self.send_stream()
+                elif self.path == "/frame.jpg":
+                    self.send_snapshot()
+                else:
+                    self.send_error(404)
+
+            def send_snapshot(self):
+                with stream.watching():
+                    _, jpeg = stream.wait_frame(stream.frame_id, timeout=2.0)
+                if jpeg is None:
+                    self.send_error(503, "No frame yet")
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(jpeg)))
+                self.end_headers()
+                self.wfile.write(jpeg)
+
+            def send_stream(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                print(f"[STREAM] Viewer {self.client_address[0]} connected")
+                last_id = stream.frame_id
+                try:
+                    with stream.watching():
+                        while not stream.closed:
+                            last_id, jpeg = stream.wait_frame(last_id)
+                            if jpeg is None:
+                                continue
+                            self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n"
+                                             b"Content-Length: %d\r\n\r\n" % len(jpeg) + jpeg + b"\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                print(f"[STREAM] Viewer {self.client_address[0]} disconnected")
+
+            def log_message(self, format, *args):
+                pass  # One line per request would flood the console
+
+        return Handler
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.frames.close()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        for thread in self.threads:
+            thread.join(timeout=2.0)
+
+    def stats(self):
+        return {"sent": self.sent, "offered": self.frames.puts,
+                "encode_ms": self.encode_time / self.sent * 1000 if self.sent else 0.0}
@@ -0,0 +1,350 @@
+"""
+Puck detection for the foraging controller.
+
+PuckDetector finds the largest puck-coloured blob inside the ROI of a BGR
+frame. It gives the same result as the original full-frame path
+(detect_full_frame), with less work per frame:
+
+- Everything runs on the ROI's bounding box. The trapezoid mask is cut to
+  that box once, at startup. It is skipped entirely when it covers the whole
+  box, which is the case for a rectangular ROI.
+- The mask is applied to the one-channel threshold image instead of the
+  colour frame. Masked-out pixels are black in the original path, and black
+  is outside PUCK_HSV, so they end up 0 either way.
+- n erosions with the default 3x3 kernel equal one erosion with a
+  (2n+1)x(2n+1) rectangle, so the ten passes are a single one.
+- Intermediate images go into buffers allocated once, through OpenCV's dst
+  arguments.
+
+With a ColourTable, the HSV conversion and inRange are replaced by a single
+table lookup: the crop is packed to BGR565 (16 bits per pixel) and each
+packed value indexes a 64K-entry table that was classified against PUCK_HSV
+once. Quantizing to 5/6/5 bits moves the threshold edges slightly, so
+detections can differ from the HSV path near the edges of the range.
+
+With components=True the last step is cv2.connectedComponentsWithStats
+instead of findContours: one pass gives the area, centroid and bounding box
+of every blob. The blobs are then ranked by a weighted score (see rank())
+instead of simply taking the largest. Areas count pixels rather than contour
+polygon area, so a blob measures slightly larger than with findContours.
+
+PuckTracker wraps a PuckDetector and, once it has found a puck, searches
+only a window around where the puck should be next.
+
+vision_benchmark.py checks these paths against each other and against
+labelled frames, and times each stage.
+"""
+
+import math
+import cv2
+import numpy as np
+
+
+def fused_kernel(iterations):
+    """Structuring element equivalent to `iterations` passes of the default 3x3 kernel."""
+    size = 2 * iterations + 1
+    return cv2.getStructuringElement(cv2.MORPH_RECT, (size, size))
+
+
+class ColourTable:
+    """HSV range baked into a lookup table indexed by BGR565 pixels."""
+
+    def __init__(self, lower, upper):
+        # Centre of every BGR565 bin, laid out so that row-major position == packed value
+        packed = np.arange(65536, dtype=np.uint32)
+        self.bin_centres = np.stack([
+            ((packed & 0x1F) << 3) | 4,
+            (((packed >> 5) & 0x3F) << 2) | 2,
+            ((packed >> 11) << 3) | 4
+        ], axis=-1).astype(np.uint8).reshape(256, 256, 3)
+        self.table = np.empty(65536, dtype=np.uint8)
+        self.lower = self.upper = None
+        self.builds = 0
+        self.set_range(lower, upper)
+
+    def set_range(self, lower, upper):
+        """Classify every bin against the new range. Does nothing if the range hasn't changed."""
+        lower, upper = np.asarray(lower), np.asarray(upper)
+        if self.lower is not None and np.array_equal(lower, self.lower) and np.array_equal(upper, self.upper):
+            return
+        hsv = cv2.cvtColor(self.bin_centres, cv2.COLOR_BGR2HSV)
+        self.table[:] = cv2.inRange(hsv, lower, upper).ravel()
+        self.lower, self.upper = lower, upper
+        self.builds += 1
+
+
+class PuckDetector:
+    def __init__(self, roi_mask, roi_box, center_x, lower, upper, min_area, erode_iter, dilate_iter,
+                 colour_table=False, components=False, rank_weights=(1.0, 0.0, 0.0)):
+        """roi_mask is the full-frame ROI mask, roi_box its (x0, y0, x1, y1) crop and center_x the
+        crop column that counts as straight ahead. colour_table=True thresholds through a ColourTable;
+        components=True ranks all blobs by rank_weights (size, centre, goal) instead of taking the largest."""
+        if np.all(np.asarray(lower) <= 0):
+            raise ValueError("PUCK_HSV includes black, so masked-out pixels would count as puck")
+        self.roi_mask = roi_mask
+        self.roi_box = roi_box
+        self.center_x = center_x
+        self.lower = np.asarray(lower)
+        self.upper = np.asarray(upper)
+        self.colour_table = ColourTable(lower, upper) if colour_table else None
+        self.min_area = min_area
+        self.erode_iter = erode_iter
+        self.dilate_iter = dilate_iter
+        self.erode_kernel = fused_kernel(erode_iter)
+        self.dilate_kernel = fused_kernel(dilate_iter)
+        self.components = components
+        self.rank_weights = rank_weights
+        self.goal_bearing = None  # Goal direction as a puck_angle, set by the controller when it knows it
+        self.candidates = 0  # Blobs above min_area in the last components scan
+
+        x0, y0, x1, y1 = roi_box
+        self.crop_mask = np.ascontiguousarray(roi_mask[y0:y1, x0:x1])
+        self.apply_mask = not np.all(self.crop_mask)
+
+        # Reused for every frame; scans of a smaller window use the front of each buffer
+        height, width = y1 - y0, x1 - x0
+        self.full_window = (0, 0, width, height)
+        self.hsv = np.empty(height * width * 3, dtype=np.uint8)
+        self.packed = np.empty(height * width, dtype=np.uint16)
+        self.binary = np.empty(height * width, dtype=np.uint8)
+        self.eroded = np.empty(height * width, dtype=np.uint8)
+        self.labels = np.empty(height * width, dtype=np.int32)
+        self.centre = np.array([center_x, height / 2])
+        self.half_diagonal = math.hypot(width, height) / 2
+
+    def set_thresholds(self, lower, upper):
+        """Change the puck colour range; the colour table is rebuilt only if it actually changed."""
+        if np.all(np.asarray(lower) <= 0):
+            raise ValueError("PUCK_HSV includes black, so masked-out pixels would count as puck")
+        self.lower, self.upper = np.asarray(lower), np.asarray(upper)
+        if self.colour_table:
+            self.colour_table.set_range(lower, upper)
+
+    def detect(self, frame):
+        """Returns (has_puck, puck_angle, puck_pos) with puck_pos in crop coordinates."""
+        return self.result(self.find_blob(self.scan(frame, self.full_window), self.full_window))
+
+    def scan(self, frame, window):
+        """Threshold and clean up window, an (x0, y0, x1, y1) box in crop coordinates. Returns the mask."""
+        binary, eroded = self.buffers(window)
+        self.threshold(self.crop(frame, window), binary)
+        self.mask_roi(binary, window)
+        return self.morphology(binary, eroded)
+
+    def buffers(self, window):
+        """Threshold and erosion buffers shaped to window, taken from the front of the preallocated ones."""
+        height, width = window[3] - window[1], window[2] - window[0]
+        return (self.binary[:height * width].reshape(height, width),
+                self.eroded[:height * width].reshape(height, width))
+
+    def crop(self, frame, window):
+        x0, y0 = self.roi_box[:2]
+        return frame[y0 + window[1]:y0 + window[3], x0 + window[0]:x0 + window[2]]
+
+    def threshold(self, crop, binary):
+        """Puck-coloured pixels of crop as 255 in binary."""
+        height, width = binary.shape
+        if self.colour_table:
+            packed = self.packed[:height * width].reshape(height, width)
+            cv2.cvtColor(crop, cv2.COLOR_BGR2BGR565, dst=packed.view(np.uint8).reshape(height, width, 2))
+            np.take(self.colour_table.table, packed, out=binary)
+        else:
+            hsv = self.hsv[:height * width * 3].reshape(height, width, 3)
+            cv2.cvtColor(crop, cv2.COLOR_BGR2HSV, dst=hsv)
+            cv2.inRange(hsv, self.lower, self.upper, dst=binary)
+
+    def mask_roi(self, binary, window):
+        if self.apply_mask:
+            cv2.bitwise_and(binary, self.crop_mask[window[1]:window[3], window[0]:window[2]], dst=binary)
+
+    def morphology(self, binary, eroded):
+        mask = binary
+        if self.erode_iter:
+            cv2.erode(mask, self.erode_kernel, dst=eroded)
+            mask = eroded
+        if self.dilate_iter:
+            cv2.dilate(mask, self.dilate_kernel, dst=binary)
+            mask = binary
+        return mask
+
+    def find_blob(self, mask, window):
+        """Centroid and bounding box (x0, y0, x1, y1) of the largest blob, in crop coordinates, or None.
+        With components, of the best-ranked blob instead."""
+        if self.components:
+            return self.best_component(mask, window)
+        contours = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0]
+        if not contours:
+            return None
+        largest = max(contours, key=cv2.contourArea)
+        if cv2.contourArea(largest) <= self.min_area:
+            return None
+        M = cv2.moments(largest)
+        if M["m00"] <= 0:
+            return None
+        x, y, w, h = cv2.boundingRect(largest)
+        cx = int(M["m10"] / M["m00"]) + window[0]
+        cy = int(M["m01"] / M["m00"]) + window[1]
+        return (cx, cy), (x + window[0], y + window[1], x + w + window[0], y + h + window[1])
+
+    def best_component(self, mask, window):
+        self.candidates = 0
+        if not cv2.countNonZero(mask):
+            return None
+        height, width = mask.shape
+        # Grana's block-based labelling; the default picks a slower per-pixel algorithm for 8-connectivity
+        _, _, stats, centroids = cv2.connectedComponentsWithStatsWithAlgorithm(
+            mask, 8, cv2.CV_32S, cv2.CCL_GRANA, labels=self.labels[:height * width].reshape(height, width))
+        # Row 0 is the background
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        keep = np.flatnonzero(areas > self.min_area)
+        self.candidates = len(keep)
+        if not len(keep):
+            return None
+        centres = centroids[1:][keep] + window[:2]
+        best = keep[np.argmax(self.rank(areas[keep], centres))] + 1
+        x, y, w, h = stats[best, :4]
+        cx, cy = centroids[best]
+        return ((int(cx) + window[0], int(cy) + window[1]),
+                (x + window[0], y + window[1], x + w + window[0], y + h + window[1]))
+
+    def rank(self, areas, centres):
+        """Score of each candidate blob, higher is better.
+
+        Weighted sum of size relative to the largest candidate, closeness to
+        the ROI centre (1 at the centre, 0 at a corner) and, when goal_bearing
+        is known, the cosine between the blob's bearing and the goal's.
+        """
+        size_weight, centre_weight, goal_weight = self.rank_weights
+        score = size_weight * areas / areas.max()
+        if centre_weight:
+            offsets = centres - self.centre
+            score += centre_weight * (1 - np.hypot(offsets[:, 0], offsets[:, 1]) / self.half_diagonal)
+        if goal_weight and self.goal_bearing is not None:
+            bearings = np.arctan2(centres[:, 0] - self.center_x, self.center_x)
+            score += goal_weight * np.cos(bearings - self.goal_bearing)
+        return score
+
+    def result(self, blob):
+        """(has_puck, puck_angle, puck_pos) for a find_blob() result."""
+        if blob is None:
+            return False, 0, (0, 0)
+        (cx, cy), _ = blob
+        return True, math.atan2(cx - self.center_x, self.center_x), (cx, cy)
+
+    def detect_full_frame(self, frame):
+        """The original path: mask the whole colour frame, crop, then erode ERODE_ITER times.
+        Kept to check and benchmark detect() against."""
+        x0, y0, x1, y1 = self.roi_box
+        masked_frame = cv2.bitwise_and(frame, frame, mask=self.roi_mask)
+        roi = masked_frame[y0:y1, x0:x1]
+        hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
+        mask = cv2.inRange(hsv, self.lower, self.upper)
+        mask = cv2.erode(mask, None, iterations=self.erode_iter)
+        mask = cv2.dilate(mask, None, iterations=self.dilate_iter)
+        return self.result(self.find_blob(mask, self.full_window))
+
+
+class PuckTracker:
+    """Searches a window around the predicted puck position, and the whole ROI only when that misses.
+
+    The window is centred on the last position plus the smoothed per-frame
+    motion and sized to the blob plus a margin that grows with the motion.
+    A blob that touches an inner edge of the window may continue outside it
+    (and its erosion may differ from a full scan), so that counts as a miss.
+    Otherwise the result matches a full scan, except that the tracker keeps
+    following its puck even if a larger one appears elsewhere in the ROI.
+    """
+
+    def __init__(self, detector, margin=None, motion_gain=2.0, smoothing=0.5):
+        self.detector = detector
+        # The blob is measured after erosion, which shrank it by erode_iter on each side
+        self.margin = margin if margin is not None else detector.erode_iter + detector.dilate_iter + 8
+        self.motion_gain = motion_gain
+        self.smoothing = smoothing
+        self.position = None  # Last centroid, crop coordinates
+        self.size = (0, 0)  # Last blob width and height
+        self.velocity = (0.0, 0.0)  # Smoothed pixels per frame
+
+        # Statistics
+        self.hits = 0  # Found in the window
+        self.misses = 0  # Window searched without a usable blob
+        self.full_scans = 0
+        self.window_area = 0  # Pixels scanned in windows, for the mean window size
+
+    def window(self):
+        """Search window around the predicted position, clipped to the ROI crop."""
+        width, height = self.detector.full_window[2:]
+        px = self.position[0] + self.velocity[0]
+        py = self.position[1] + self.velocity[1]
+        half_w = self.size[0] / 2 + self.margin + self.motion_gain * abs(self.velocity[0])
+        half_h = self.size[1] / 2 + self.margin + self.motion_gain * abs(self.velocity[1])
+        return (max(0, int(px - half_w)), max(0, int(py - half_h)),
+                min(width, int(px + half_w) + 1), min(height, int(py + half_h) + 1))
+
+    def touches_edge(self, bbox, window):
+        """True if the blob reaches a window edge that is not also an edge of the ROI crop."""
+        width, height = self.detector.full_window[2:]
+        return ((bbox[0] <= window[0] and window[0] > 0) or (bbox[1] <= window[1] and window[1] > 0)
+                or (bbox[2] >= window[2] and window[2] < width) or (bbox[3] >= window[3] and window[3] < height))
+
+    def detect(self, frame):
+        """Same result as PuckDetector.detect()."""
+        if self.position is not None:
+            window = self.window()
+            blob = self.detector.find_blob(self.detector.scan(frame, window), window)
+            self.window_area += (window[2] - window[0]) * (window[3] - window[1])
+            if blob is not None and not self.touches_edge(blob[1], window):
+                self.hits += 1
+                self.follow(blob)
+                return self.detector.result(blob)
+            self.misses += 1
+
+        self.full_scans += 1
+        blob = self.detector.find_blob(self.detector.scan(frame, self.detector.full_window),
+                                       self.detector.full_window)
+        if blob is None:
+            self.position = None
+            self.velocity = (0.0, 0.0)
+        else:
+            self.follow(blob)
+        return self.detector.result(blob)
+
+    def follow(self, blob):
+        (cx, cy), (x0, y0, x1, y1) = blob
+        if self.position is not None:
+            a = self.smoothing
+            self.velocity = (a * self.velocity[0] + (1 - a) * (cx - self.position[0]),
+                             a * self.velocity[1] + (1 - a) * (cy - self.position[1]))
+        self.position = (cx, cy)
+        self.size = (x1 - x0, y1 - y0)
+
+    def stats(self):
+        searched = self.hits + self.misses
+        return {
+            "hit_rate": self.hits / searched if searched else 0.0,
+            "miss_rate": self.misses / searched if searched else 0.0,
+            "full_scans": self.full_scans,
+            "mean_window": self.window_area / searched if searched else 0.0
+        }
+
+
+def roi_polygon(resolution, top_width, bottom_width, height):
+    """Corners of the trapezoid ROI in frame pixels: top left, top right, bottom right, bottom left."""
+    width, frame_height = resolution
+    top_start_x = int(width * (0.5 - top_width / 2))
+    top_end_x = int(width * (0.5 + top_width / 2))
+    bottom_start_x = int(width * (0.5 - bottom_width / 2))
+    bottom_end_x = int(width * (0.5 + bottom_width / 2))
+    start_y = int(frame_height * (1 - height))
+    end_y = frame_height - 1
+    return np.array([[top_start_x, start_y], [top_end_x, start_y], [bottom_end_x, end_y], [bottom_start_x, end_y]])
+
+
+def roi_for(resolution, top_width, bottom_width, height):
+    """Full-frame trapezoid mask, crop box and centre column, laid out as ForagingController does it."""
+    pts = roi_polygon(resolution, top_width, bottom_width, height)
+    (top_start_x, start_y), (top_end_x, _), (bottom_end_x, end_y), (bottom_start_x, _) = pts.tolist()
+    mask = np.zeros((resolution[1], resolution[0]), dtype=np.uint8)
+    cv2.fillPoly(mask, [pts], 255)
+    box = (min(bottom_start_x, top_start_x), start_y, max(bottom_end_x, top_end_x), end_y)
+    return mask, box, (top_end_x - top_start_x) // 2
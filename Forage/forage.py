@@ -1,18 +1,45 @@
 import cv2
 import numpy as np
-from picamera import PiCamera
-from picamera.array import PiRGBArray
 import time
 import math
+import sys
+import threading
 from Zumo import Zumo
 from uwb_reader import UWBReader
+from clock import get_clock
+from pipeline import JitterStats, Mailbox, StageStats
+from detector import PuckDetector, PuckTracker, roi_for, roi_polygon
+from parallel_detector import ParallelDetector
+from frame_source import PiCameraSource, open_source
+from governor import Governor
+from debug_stream import DebugStream
+from predictor import BearingPredictor, Odometry
 
 # =============== CONFIGURATION ===============
 RESOLUTION = (320, 240)
+FRAMERATE = 30
 GOAL_POSITION = (3.4, 1.5)
 UWB_PORT = "/dev/ttyUWB"
 SHOW_VIDEO = True
+DEBUG_STREAM = False  # Serve the debug view as MJPEG over HTTP instead, e.g. on a headless robot (see debug_stream.py)
+STREAM_PORT = 8080
+STREAM_FPS = 5  # Most frames per second drawn and encoded for the stream
+STREAM_SCALE = 0.5  # Stream frames are shrunk by this factor
 DEBUG_PRINTS = True
+PIPELINE = True  # Capture, detection and motor control on separate threads; False runs them one after another
+DETECT_WORKERS = 0  # Worker processes for detection in the pipeline (0 = the pipeline's detect thread)
+GOVERNOR = False  # Trade camera resolution and framerate against LATENCY_BUDGET (see governor.py)
+LATENCY_BUDGET = 0.060  # s from frame capture to motor command
+GOVERNOR_LEVELS = [  # (resolution, framerate), cheapest first; must include (RESOLUTION, FRAMERATE)
+    ((160, 120), 15),
+    ((160, 120), 30),
+    ((320, 240), 15),
+    ((320, 240), 30),
+    ((480, 360), 15),
+    ((480, 360), 30),
+    ((640, 480), 15),
+    ((640, 480), 30)
+]
 
 # ============= TUNED PARAMETERS =============
 K0 = 150        # Empty area turn rate (positive = right, negative = left)
@@ -24,13 +51,25 @@ TURN_GAIN =100
 MAX_TURN_RATE = 100000000
 SEARCH_TURN =300
 
+# ============= MOTOR LOOP =============
+CONTROL_RATE = 0  # Hz; the pipeline steers on a predicted puck bearing between detections (0 = once per detection)
+PREDICTION_HORIZON = 0.15  # s the puck's own motion is extrapolated at most
+CAMERA_HFOV = math.radians(62.2)  # Horizontal field of view of the Pi camera v2
+TURN_ANGLE_TO_ENCODER_DELTA = 432.2648  # Encoder counts per radian turned in place (Version2/calibrate.py)
+
 # ============= VISION PARAMETERS =============
 PUCK_HSV = {
     "lower": np.array([100, 70, 50]),
     "upper": np.array([140, 255, 255])
 }
-MIN_PUCK_AREA = int(RESOLUTION[0] * RESOLUTION[1] * 0.005)
-ERODE_ITER = 10
+MIN_PUCK_FRACTION = 0.005  # Smallest puck, as a fraction of the frame area
+MIN_PUCK_AREA = int(RESOLUTION[0] * RESOLUTION[1] * MIN_PUCK_FRACTION)  # At RESOLUTION; see detector_settings()
+COLOUR_TABLE = False  # Threshold with a BGR565 lookup table instead of HSV conversion (see detector.py)
+TRACKING = True  # Search a window around the last puck position before scanning the whole ROI
+COMPONENTS = False  # Rank every blob (connectedComponentsWithStats) instead of keeping the largest contour
+RANK_WEIGHTS = (1.0, 0.3, 0.5)  # Blob size, closeness to the ROI centre, alignment with the goal direction
+HEADING_MIN_MOVE = 0.05  # m the robot must travel before its UWB heading estimate is updated
+ERODE_ITER = 10  # At RESOLUTION; scaled with the frame width at other resolutions
 DILATE_ITER = 1
 POSITION_HISTORY_LENGTH = 5
 
@@ -39,43 +78,72 @@ ROI_TOP_WIDTH = 0.4
 ROI_BOTTOM_WIDTH = 0.4   
 ROI_HEIGHT = 0.9         
 
+
+def detector_settings(resolution=RESOLUTION):
+    """PuckDetector keyword arguments for the settings above at the given resolution."""
+    roi_mask, roi_box, center_x = roi_for(resolution, ROI_TOP_WIDTH, ROI_BOTTOM_WIDTH, ROI_HEIGHT)
+    # Morphology is in pixels; scale it so a puck is filtered the same at every resolution
+    scale = resolution[0] / RESOLUTION[0]
+    return {
+        "roi_mask": roi_mask,
+        "roi_box": roi_box,
+        "center_x": center_x,
+        "lower": PUCK_HSV["lower"],
+        "upper": PUCK_HSV["upper"],
+        "min_area": int(resolution[0] * resolution[1] * MIN_PUCK_FRACTION),
+        "erode_iter": max(1, round(ERODE_ITER * scale)) if ERODE_ITER else 0,
+        "dilate_iter": max(1, round(DILATE_ITER * scale)) if DILATE_ITER else 0,
+        "colour_table": COLOUR_TABLE,
+        "components": COMPONENTS,
+        "rank_weights": RANK_WEIGHTS
+    }
+
+
 class ForagingController:
-    def __init__(self):
+    def __init__(self, clock=None, source=None):
+        """source is a frame source (see frame_source.py) at RESOLUTION; the Pi camera by default."""
+        self.clock = clock or get_clock()
         self.zumo = Zumo()
-        self.uwb = UWBReader(port=UWB_PORT)
-        self.camera = PiCamera()
-        self.camera.resolution = RESOLUTION
-        self.raw_capture = PiRGBArray(self.camera, size=RESOLUTION)
+        self.uwb = UWBReader(port=UWB_PORT, clock=self.clock)
+        self.source = source or PiCameraSource(RESOLUTION, FRAMERATE, clock=self.clock)
+        self.governor = None
+        if GOVERNOR:
+            self.governor = Governor(GOVERNOR_LEVELS, LATENCY_BUDGET, GOVERNOR_LEVELS.index((RESOLUTION, FRAMERATE)),
+                                     clock=self.clock)
         
-        # horizontalal ROI Coordinates
-        self.roi_top_start_x = int(RESOLUTION[0] * (0.5 - ROI_TOP_WIDTH/2))
-        self.roi_top_end_x = int(RESOLUTION[0] * (0.5 + ROI_TOP_WIDTH/2))
-        self.roi_bottom_start_x = int(RESOLUTION[0] * (0.5 - ROI_BOTTOM_WIDTH/2))
-        self.roi_bottom_end_x = int(RESOLUTION[0] * (0.5 + ROI_BOTTOM_WIDTH/2))
-        self.roi_start_y = int(RESOLUTION[1] * (1 - ROI_HEIGHT))
-        self.roi_end_y = RESOLUTION[1] - 1
-        
-        # ROI Mask (horizontal shape)
-        self.roi_mask = np.zeros((RESOLUTION[1], RESOLUTION[0]), dtype=np.uint8)
-        pts = np.array([
-            [self.roi_top_start_x, self.roi_start_y],
-            [self.roi_top_end_x, self.roi_start_y],
-            [self.roi_bottom_end_x, self.roi_end_y],
-            [self.roi_bottom_start_x, self.roi_end_y]
-        ])
-        cv2.fillPoly(self.roi_mask, [pts], 255)
+        # ROI mask (horizontal shape) and detection, per resolution
+        self.vision = {}  # resolution -> (detector, tracker, ROI corners), see vision_for()
+        self.goal_bearing = None  # Goal direction relative to the heading, in puck_angle terms
+        self.parallel = None  # ParallelDetector while the pipeline runs with DETECT_WORKERS
+        self.stream = None
+        if DEBUG_STREAM:
+            self.stream = DebugStream(self.render_debug, STREAM_PORT, STREAM_FPS, STREAM_SCALE, clock=self.clock)
         
         # State variables (unchanged from original)
         self.previous_distance = 0
         self.delta_d_filtered = 0
         self.position_history = []
         self.frame_count = 0
-        self.start_time = time.time()
+        self.start_time = self.clock.time()
         self.last_puck_pos = (0, 0)
+        self.heading = None  # Direction of travel from UWB, radians
+        self.heading_anchor = None  # UWB position the heading was last measured from
         self.last_phi = 0
         self.detect_time = 0
         self.control_time = 0
-        self.last_metrics_time = time.time()
+        self.last_metrics_time = self.clock.time()
+
+        # Threaded pipeline: capture -> detect -> actuate, plus the debug display
+        self.stop_event = threading.Event()
+        self.frames = Mailbox("frames")  # (seq, capture time, image)
+        self.detections = Mailbox("detections")  # (seq, capture time, has_puck, puck_angle, puck_pos, uwb_pos, distance)
+        self.debug_frames = Mailbox("debug")  # (image, detection)
+        self.stage_stats = {name: StageStats(name, self.clock) for name in ("capture", "detect", "actuate", "display")}
+        self.jitter = JitterStats("control", 1.0 / CONTROL_RATE) if CONTROL_RATE else None
+        self.serial_time = 0.0  # Zumo round trips timed by control_loop()
+        self.serial_exchanges = 0
+        self.max_serial_time = 0.0
+        self.last_command = (0, 0)
 
     def initialize_system(self):
         print("[SYSTEM] Initializing foraging controller...")
@@ -84,8 +152,10 @@ class ForagingController:
         
         if not self.uwb.start():
             raise RuntimeError("[ERROR] UWB initialization failed")
+        if self.stream:
+            self.stream.start()
         
-        time.sleep(2)
+        self.clock.sleep(2)
         print("[SYSTEM] Hardware ready")
 
     def smooth_position(self, position):
@@ -96,37 +166,51 @@ class ForagingController:
         return (sum(p[0] for p in self.position_history)/len(self.position_history),
                 sum(p[1] for p in self.position_history)/len(self.position_history))
 
+    def read_uwb(self):
+        """Smoothed UWB position and distance to the goal; (0, 0) and 0 without a fix."""
+        raw_pos = self.uwb.get_latest_position()
+        if None in raw_pos:
+            return (0, 0), 0
+        uwb_pos = self.smooth_position(raw_pos)
+        current_distance = math.hypot(GOAL_POSITION[0] - uwb_pos[0],
+                                    GOAL_POSITION[1] - uwb_pos[1])
+        self.update_goal_bearing(uwb_pos)
+        return uwb_pos, current_distance
+
+    def update_goal_bearing(self, uwb_pos):
+        """Estimate the heading from UWB travel and tell the detector where the goal is, for ranking pucks."""
+        if self.heading_anchor is None:
+            self.heading_anchor = uwb_pos
+        dx = uwb_pos[0] - self.heading_anchor[0]
+        dy = uwb_pos[1] - self.heading_anchor[1]
+        if math.hypot(dx, dy) >= HEADING_MIN_MOVE:
+            self.heading = math.atan2(dy, dx)
+            self.heading_anchor = uwb_pos
+        if self.heading is None:
+            return
+        goal = math.atan2(GOAL_POSITION[1] - uwb_pos[1], GOAL_POSITION[0] - uwb_pos[0])
+        # World angles grow to the left, puck_angle grows to the right
+        relative = (goal - self.heading + math.pi) % (2 * math.pi) - math.pi
+        self.goal_bearing = -relative
+
+    def vision_for(self, resolution):
+        """Detector, tracker (or None) and ROI corners for frames at resolution, built on first use."""
+        vision = self.vision.get(resolution)
+        if vision is None:
+            detector = PuckDetector(**detector_settings(resolution))
+            tracker = PuckTracker(detector) if TRACKING else None
+            pts = roi_polygon(resolution, ROI_TOP_WIDTH, ROI_BOTTOM_WIDTH, ROI_HEIGHT)
+            vision = self.vision[resolution] = (detector, tracker, pts)
+        return vision
+
     def detect_puck(self, frame):
-        """Modified for horizontalal ROI"""
+        """Crop-first detection in the horizontal ROI (see detector.py)"""
         detect_start = time.time()
-        
-        # Apply horizontalal mask
-        masked_frame = cv2.bitwise_and(frame, frame, mask=self.roi_mask)
-        roi = masked_frame[self.roi_start_y:self.roi_end_y, 
-                        min(self.roi_bottom_start_x, self.roi_top_start_x):
-                        max(self.roi_bottom_end_x, self.roi_top_end_x)]
-        
-        # Rest of detection remains identical
-        hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
-        mask = cv2.inRange(hsv, PUCK_HSV["lower"], PUCK_HSV["upper"])
-        mask = cv2.erode(mask, None, iterations=ERODE_ITER)
-        mask = cv2.dilate(mask, None, iterations=DILATE_ITER)
-        
-        contours = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0]
-        has_puck, puck_angle, puck_pos = False, 0, (0, 0)
-        
-        if contours:
-            largest = max(contours, key=cv2.contourArea)
-            if cv2.contourArea(largest) > MIN_PUCK_AREA:
-                M = cv2.moments(largest)
-                if M["m00"] > 0:
-                    cx = int(M["m10"] / M["m00"])
-                    cy = int(M["m01"] / M["m00"])
-                    puck_pos = (cx, cy)
-                    roi_center_x = (self.roi_top_end_x - self.roi_top_start_x) // 2
-                    puck_angle = math.atan2(cx - roi_center_x, roi_center_x)
-                    has_puck = True
-        
+        detector, tracker, _ = self.vision_for((frame.shape[1], frame.shape[0]))
+        detector.goal_bearing = self.goal_bearing
+        has_puck, puck_angle, puck_pos = (tracker or detector).detect(frame)
+        if has_puck:
+            self.last_puck_pos = puck_pos
         self.detect_time += time.time() - detect_start
         return has_puck, puck_angle, puck_pos
 
@@ -144,16 +228,28 @@ class ForagingController:
     def control_motors(self, has_puck, puck_angle, current_distance):
         """Unchanged from original (with your K-values)"""
         control_start = time.time()
-        
+        goal_phi = self.update_goal_phi(has_puck, puck_angle, current_distance)
+        left, right = self.steer(has_puck, puck_angle, goal_phi)
+        self.control_time += time.time() - control_start
+        return left, right
+
+    def update_goal_phi(self, has_puck, puck_angle, current_distance):
+        """Goal attraction for a new detection, 0 without a puck."""
         if has_puck:
             goal_phi = self.calculate_goal_attraction(current_distance)
-            turn = K1 * puck_angle + goal_phi
             if DEBUG_PRINTS:
                 print(f"[PUCK] Approaching at {math.degrees(puck_angle):.1f}°")
+            return goal_phi
+        if DEBUG_PRINTS:
+            print("[SEARCH] Circling")
+        return 0
+
+    def steer(self, has_puck, puck_angle, goal_phi):
+        """Wheel speeds towards the puck, or circling with K0 without one."""
+        if has_puck:
+            turn = K1 * puck_angle + goal_phi
         else:
             turn = K0
-            if DEBUG_PRINTS:
-                print("[SEARCH] Circling")
         
         turn = np.clip(turn, -MAX_TURN_RATE, MAX_TURN_RATE)
         left = BASE_SPEED + turn
@@ -161,26 +257,21 @@ class ForagingController:
         
         left = np.clip(left, -255, 255)
         right = np.clip(right, -255, 255)
-        
-        self.control_time += time.time() - control_start
         return int(left), int(right)
 
     def draw_debug_info(self, image, has_puck, puck_pos, puck_angle, left, right, fps, uwb_pos, current_distance):
         """Added horizontal visualization"""
         debug_img = image.copy()
+        detector, _, roi_pts = self.vision_for((image.shape[1], image.shape[0]))
         
         # Draw horizontalal ROI
-        cv2.polylines(debug_img, [np.array([
-            [self.roi_top_start_x, self.roi_start_y],
-            [self.roi_top_end_x, self.roi_start_y],
-            [self.roi_bottom_end_x, self.roi_end_y],
-            [self.roi_bottom_start_x, self.roi_end_y]
-        ])], True, (0, 255, 255), 1)
+        cv2.polylines(debug_img, [roi_pts], True, (0, 255, 255), 1)
         
         # debug drawings
         if has_puck:
-            puck_x = self.roi_top_start_x + puck_pos[0]
-            puck_y = self.roi_start_y + puck_pos[1]
+            # puck_pos is relative to the ROI crop
+            puck_x = detector.roi_box[0] + puck_pos[0]
+            puck_y = detector.roi_box[1] + puck_pos[1]
             cv2.circle(debug_img, (puck_x, puck_y), 10, (0, 255, 0), 2)
             
         font = cv2.FONT_HERSHEY_SIMPLEX
@@ -197,26 +288,51 @@ class ForagingController:
         
         return debug_img
 
+    def skip_overlay(self):
+        """True while the governor is over budget: the debug window then shows the bare frame."""
+        return self.governor is not None and self.governor.over_budget
+
+    def render_debug(self, image, detection):
+        """Debug image for a detection tuple, as shown in the window and the stream."""
+        seq, captured, has_puck, puck_angle, puck_pos, uwb_pos, current_distance = detection
+        if self.skip_overlay():
+            return image
+        left, right = self.last_command
+        if PIPELINE:
+            fps = self.stage_stats["detect"].rate()
+        else:
+            fps = self.frame_count / (self.clock.time() - self.start_time)
+        return self.draw_debug_info(
+            image, has_puck, puck_pos, puck_angle,
+            left, right, fps, uwb_pos, current_distance
+        )
+
+    def govern(self, latency):
+        """Report one frame's capture-to-command latency; switches the camera if the governor moves."""
+        if self.governor is None or self.governor.record(latency) is None:
+            return
+        resolution, framerate = self.governor.setting
+        self.source.configure(resolution, framerate)
+        print(f"[GOVERNOR] p90 latency {self.governor.p90 * 1000:.0f}ms -> "
+              f"{resolution[0]}x{resolution[1]} @ {framerate}fps")
+
     def run(self):
+        if PIPELINE:
+            self.run_pipeline()
+        else:
+            self.run_serial()
+
+    def run_serial(self):
         """Main loop with horizontalal ROI processing"""
         self.initialize_system()
         
         try:
-            for frame in self.camera.capture_continuous(
-                self.raw_capture, format="bgr", use_video_port=True):
-                
+            for image, _ in self.source.frames():
+                captured = self.clock.time()
                 self.frame_count += 1
-                image = frame.array
                 
                 # UWB positioning 
-                raw_pos = self.uwb.get_latest_position()
-                if None in raw_pos:
-                    uwb_pos = (0, 0)
-                    current_distance = 0
-                else:
-                    uwb_pos = self.smooth_position(raw_pos)
-                    current_distance = math.hypot(GOAL_POSITION[0] - uwb_pos[0], 
-                                                GOAL_POSITION[1] - uwb_pos[1])
+                uwb_pos, current_distance = self.read_uwb()
                 
                 # Detect in horizontalal ROI
                 has_puck, puck_angle, puck_pos = self.detect_puck(image)
@@ -224,36 +340,293 @@ class ForagingController:
                 
                 left, right = self.control_motors(has_puck, puck_angle, current_distance)
                 self.zumo.send_speeds(left, right)
-                
+                self.last_command = (left, right)
+                self.govern(self.clock.time() - captured)
+                detection = (self.frame_count, captured, has_puck, puck_angle, puck_pos, uwb_pos, current_distance)
+                if self.stream:
+                    self.stream.publish(image, detection)
             
                 if SHOW_VIDEO:
-                    fps = self.frame_count / (time.time() - self.start_time)
-                    debug_img = self.draw_debug_info(
-                        image, has_puck, puck_pos, puck_angle,
-                        left, right, fps, uwb_pos, current_distance
-                    )
+                    debug_img = self.render_debug(image, detection)
                     cv2.imshow("Foraging Controller", debug_img)
                     if cv2.waitKey(1) & 0xFF == ord('q'):
                         break
-                
-                self.raw_capture.truncate(0)
 
         except KeyboardInterrupt:
             print("\n[SYSTEM] Shutting down...")
         finally:
-            self.zumo.send_speeds(0, 0)
-            self.uwb.stop()
-            self.camera.close()
+            self.shutdown()
+
+    def run_pipeline(self):
+        """Capture, detection and actuation on their own threads; the debug window stays on this one."""
+        self.initialize_system()
+        if DETECT_WORKERS:
+            resolutions = {resolution for resolution, _ in GOVERNOR_LEVELS} if self.governor else {RESOLUTION}
+            settings = {resolution: detector_settings(resolution) for resolution in resolutions}
+            self.parallel = ParallelDetector(settings, DETECT_WORKERS, tracking=TRACKING)
+            self.parallel.start()
+            detect_loops = (self.dispatch_loop, self.collect_loop)
+        else:
+            detect_loops = (self.detect_loop,)
+        actuate_loop = self.control_loop if CONTROL_RATE else self.actuate_loop
+        threads = [threading.Thread(target=target, daemon=True)
+                   for target in (self.capture_loop, *detect_loops, actuate_loop)]
+        for thread in threads:
+            thread.start()
+
+        try:
             if SHOW_VIDEO:
-                cv2.destroyAllWindows()
-            
+                self.display_loop()
+            else:
+                while not self.stop_event.wait(0.5):
+                    pass
+        except KeyboardInterrupt:
+            print("\n[SYSTEM] Shutting down...")
+        finally:
+            self.stop_event.set()
+            for mailbox in (self.frames, self.detections, self.debug_frames):
+                mailbox.close()
+            for thread in threads:
+                thread.join(timeout=2.0)
+            if self.parallel:
+                self.parallel.close()
+            self.shutdown()
+
+    def capture_loop(self):
+        """Hand every camera frame to the detector; frames it hasn't taken yet are replaced."""
+        stats = self.stage_stats["capture"]
+        try:
+            for image, _ in self.source.frames():
+                captured = self.clock.time()
+                self.frame_count += 1
+                self.frames.put((self.frame_count, captured, image))
+                stats.record(0.0, self.clock.time() - captured)
+                if self.stop_event.is_set():
+                    break
+        finally:
+            self.stop_event.set()
+
+    def detect_loop(self):
+        stats = self.stage_stats["detect"]
+        while not self.stop_event.is_set():
+            item = self.frames.get(timeout=0.5)
+            if item is None:
+                continue
+            seq, captured, image = item
+            start = self.clock.time()
+            uwb_pos, current_distance = self.read_uwb()
+            has_puck, puck_angle, puck_pos = self.detect_puck(image)
+            detection = (seq, captured, has_puck, puck_angle, puck_pos, uwb_pos, current_distance)
+            self.detections.put(detection)
+            if SHOW_VIDEO:
+                self.debug_frames.put((image, detection))
+            if self.stream:
+                self.stream.publish(image, detection)
+            now = self.clock.time()
+            stats.record(now - start, now - captured)
+
+    def dispatch_loop(self):
+        """Hand the newest frame to the detection workers whenever one of their slots is free."""
+        self.parallel_frames = {}  # seq -> (capture time, image, uwb_pos, distance) until its result is back
+        while not self.stop_event.is_set():
+            slot = self.parallel.reserve(timeout=0.5)
+            if slot is None:
+                continue
+            item = None
+            while item is None and not self.stop_event.is_set():
+                item = self.frames.get(timeout=0.5)
+            if item is None:
+                return
+            seq, captured, image = item
+            uwb_pos, current_distance = self.read_uwb()
+            self.parallel_frames[seq] = (captured, image, uwb_pos, current_distance)
+            try:
+                self.parallel.submit(seq, image, slot, self.goal_bearing)
+            except ValueError as e:
+                # A frame size the workers have no settings for; submit() already freed the slot
+                del self.parallel_frames[seq]
+                print(f"[PARALLEL] Skipping frame {seq}: {e}")
+
+    def collect_loop(self):
+        """Pass worker results on in frame order."""
+        stats = self.stage_stats["detect"]
+        while not self.stop_event.is_set():
+            result = self.parallel.next_result(timeout=0.5)
+            if result is None:
+                continue
+            seq, detected, busy = result
+            captured, image, uwb_pos, current_distance = self.parallel_frames.pop(seq)
+            if detected is None:
+                continue  # Detection failed in the worker; counted in the final report
+            has_puck, puck_angle, puck_pos = detected
+            self.detect_time += busy
+            if has_puck:
+                self.last_puck_pos = puck_pos
+            detection = (seq, captured, has_puck, puck_angle, puck_pos, uwb_pos, current_distance)
+            self.detections.put(detection)
+            if SHOW_VIDEO:
+                self.debug_frames.put((image, detection))
+            if self.stream:
+                self.stream.publish(image, detection)
+            stats.record(busy, self.clock.time() - captured)
+
+    def actuate_loop(self):
+        """Drive the motors once per detection, so serial I/O never holds up the detector."""
+        stats = self.stage_stats["actuate"]
+        while not self.stop_event.is_set():
+            detection = self.detections.get(timeout=0.5)
+            if detection is None:
+                continue
+            seq, captured, has_puck, puck_angle, puck_pos, uwb_pos, current_distance = detection
+            start = self.clock.time()
+            left, right = self.control_motors(has_puck, puck_angle, current_distance)
+            self.zumo.send_speeds(left, right)
+            self.last_command = (left, right)
+            now = self.clock.time()
+            stats.record(now - start, now - captured)
+            self.govern(now - captured)
 
-            total_time = time.time() - self.start_time
-            print("\n=== FINAL REPORT ===")
-            print(f"Frames: {self.frame_count} | FPS: {self.frame_count/total_time:.1f}")
-            print(f"Avg detect: {(self.detect_time/self.frame_count)*1000:.1f}ms")
-            print(f"Avg control: {(self.control_time/self.frame_count)*1000:.1f}ms")
+    def control_loop(self):
+        """Drive the motors CONTROL_RATE times a second on the newest detection. Between detections the
+        puck bearing is predicted from its motion and the wheel encoders (see predictor.py)."""
+        period = 1.0 / CONTROL_RATE
+        stats = self.stage_stats["actuate"]
+        odometry = Odometry(TURN_ANGLE_TO_ENCODER_DELTA)
+        predictor = BearingPredictor(ROI_TOP_WIDTH * math.tan(CAMERA_HFOV / 2), PREDICTION_HORIZON)
+        detection = None
+        tracking = False
+        goal_phi = 0
+        next_tick = self.clock.time()
+        while not self.stop_event.is_set():
+            delay = next_tick - self.clock.time()
+            if delay > 0:
+                self.clock.sleep(delay)
+            tick = self.clock.time()
+            self.jitter.record(tick, tick - next_tick)
+            next_tick += period
+            if tick > next_tick:
+                # A whole period behind: skip the missed ticks rather than firing them back to back
+                missed = int((tick - next_tick) // period) + 1
+                self.jitter.overruns += missed
+                next_tick += missed * period
+
+            fresh = self.detections.get(timeout=0)
+            if fresh is not None:
+                detection = fresh
+            # Odometry is only needed while there is a puck to predict, which spares the serial link
+            was_tracking = tracking
+            tracking = detection is not None and (predictor.has_puck or detection[2])
+            if tracking:
+                if not was_tracking:
+                    # The wheels may have wrapped the counters while searching
+                    odometry.reset()
+                yaw = odometry.update(tick, self.timed_serial(self.zumo.get_encoders))
+            if fresh is not None:
+                seq, captured, has_puck, puck_angle, puck_pos, uwb_pos, current_distance = fresh
+                predictor.observe(captured, has_puck, puck_angle, odometry.yaw_at(captured))
+                goal_phi = self.update_goal_phi(has_puck, puck_angle, current_distance)
+
+            # Before the first detection this searches with K0, like the other loops without a puck
+            predicted = predictor.predict(tick, yaw) if tracking else None
+            left, right = self.steer(predicted is not None, predicted or 0, goal_phi)
+            self.timed_serial(self.zumo.send_speeds, left, right)
+            self.last_command = (left, right)
+            now = self.clock.time()
+            stats.record(now - tick, now - detection[1] if detection else 0.0)
+            if fresh is not None:
+                self.govern(now - detection[1])
+
+    def timed_serial(self, exchange, *args):
+        """Run one Zumo serial exchange and add its round trip to the final report."""
+        start = time.time()
+        result = exchange(*args)
+        elapsed = time.time() - start
+        self.serial_time += elapsed
+        self.serial_exchanges += 1
+        self.max_serial_time = max(self.max_serial_time, elapsed)
+        return result
+
+    def display_loop(self):
+        """Show the newest detected frame; runs on the main thread because imshow needs it."""
+        stats = self.stage_stats["display"]
+        while not self.stop_event.is_set():
+            item = self.debug_frames.get(timeout=0.5)
+            if item is None:
+                continue
+            image, detection = item
+            captured = detection[1]
+            start = self.clock.time()
+            debug_img = self.render_debug(image, detection)
+            cv2.imshow("Foraging Controller", debug_img)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+            now = self.clock.time()
+            stats.record(now - start, now - captured)
+
+    def shutdown(self):
+        self.zumo.send_speeds(0, 0)
+        self.uwb.stop()
+        self.source.close()
+        if self.stream:
+            self.stream.close()
+        if SHOW_VIDEO:
+            cv2.destroyAllWindows()
+
+        total_time = self.clock.time() - self.start_time
+        print("\n=== FINAL REPORT ===")
+        print(f"Frames: {self.frame_count} | FPS: {self.frame_count/total_time:.1f}")
+        processed = self.stage_stats["detect"].count if PIPELINE else self.frame_count
+        if processed:
+            print(f"Avg detect: {(self.detect_time/processed)*1000:.1f}ms")
+            print(f"Avg control: {(self.control_time/processed)*1000:.1f}ms")
+        if self.parallel:
+            stats = self.parallel.stats()
+            print(f"[PARALLEL] Workers: {stats['workers']} | Completed: {stats['completed']}/{stats['submitted']} | "
+                  f"Reordered: {stats['reordered']} | Failed: {stats['failed']}")
+            if stats["last_error"]:
+                print(f"[PARALLEL] Last error: {stats['last_error']}")
+        else:
+            for (width, height), (_, tracker, _) in sorted(self.vision.items()):
+                if tracker is None:
+                    continue
+                stats = tracker.stats()
+                print(f"[TRACKER {width}x{height}] Hit rate: {stats['hit_rate']:.1%} | "
+                      f"Miss rate: {stats['miss_rate']:.1%} | Full scans: {stats['full_scans']} | "
+                      f"Mean window: {stats['mean_window']:.0f}px")
+        if self.stream:
+            stats = self.stream.stats()
+            print(f"[STREAM] Sent {stats['sent']}/{stats['offered']} frames | Encode: {stats['encode_ms']:.1f}ms")
+        if self.governor:
+            stats = self.governor.stats()
+            (width, height), framerate = stats["setting"]
+            print(f"[GOVERNOR] Now {width}x{height} @ {framerate}fps | Last p90: {stats['p90_ms']:.1f}ms | "
+                  f"Changes: {stats['changes']}")
+            for ((width, height), framerate), seconds in zip(self.governor.levels, stats["time_at_level"]):
+                if seconds:
+                    print(f"[GOVERNOR] {width}x{height} @ {framerate}fps: {seconds:.1f}s")
+        if PIPELINE:
+            for name, stats in self.stage_stats.items():
+                summary = stats.summary()
+                print(f"[{name.upper()}] {summary['rate']:.1f}/s | busy {summary['busy_ms']:.1f}ms | "
+                      f"latency {summary['latency_ms']:.1f}ms (max {summary['max_latency_ms']:.1f}ms)")
+            for mailbox in (self.frames, self.detections, self.debug_frames):
+                print(f"[{mailbox.name.upper()}] dropped {mailbox.dropped}/{mailbox.puts}")
+            if self.jitter and self.jitter.count:
+                summary = self.jitter.summary()
+                ticks = self.stage_stats["actuate"].count
+                print(f"[CONTROL] {summary['rate']:.1f}Hz | period {summary['period_ms']:.1f}ms "
+                      f"± {summary['jitter_ms']:.2f}ms (max {summary['max_period_ms']:.1f}ms) | "
+                      f"late {summary['late_ms']:.2f}ms (max {summary['max_late_ms']:.1f}ms) | "
+                      f"overruns {summary['overruns']} | new detection on "
+                      f"{self.detections.taken / ticks if ticks else 0:.0%} of ticks")
+            if self.serial_exchanges:
+                print(f"[SERIAL] {self.serial_exchanges} exchanges | round trip "
+                      f"{self.serial_time / self.serial_exchanges * 1000:.2f}ms "
+                      f"(max {self.max_serial_time * 1000:.1f}ms) | "
+                      f"{self.serial_time / (self.clock.time() - self.start_time):.0%} of the time on the link")
 
 if __name__ == "__main__":
-    controller = ForagingController()
+    # Optional frame source: "synthetic", a video file or an image directory instead of the camera
+    source = open_source(sys.argv[1], RESOLUTION, fps=FRAMERATE) if len(sys.argv) > 1 else None
+    controller = ForagingController(source=source)
     controller.run()
@@ -0,0 +1,238 @@
+"""
+Frame sources for the foraging controller.
+
+A source yields (image, labels) pairs: a BGR frame at the source's
+resolution and the pucks known to be in it. labels is None when nobody knows
+(the camera), otherwise a list of (x, y, radius) in frame pixels, empty for
+a frame without a puck.
+
+- PiCameraSource: the Pi camera, as used on the robot.
+- RecordedSource: a video file or a directory of images, with optional
+  labels from a labels.csv next to the images.
+- SyntheticSource: generated scenes of a noisy floor and moving blue pucks,
+  labelled exactly.
+
+configure() switches resolution and framerate while frames are flowing (see
+governor.py); it takes effect from the next frame on.
+
+Only PiCameraSource needs picamera, and it imports it when created, so the
+others work on any machine with OpenCV.
+"""
+
+import csv
+import os
+import threading
+import cv2
+import numpy as np
+from clock import get_clock
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+class FrameSource:
+    def __init__(self, resolution, fps=None, clock=None):
+        """fps paces recorded and synthetic frames like a camera; None delivers them as fast as possible."""
+        self.resolution = resolution
+        self.fps = fps
+        self.clock = clock or get_clock()
+
+    def frames(self):
+        """Generator of (image, labels)."""
+        raise NotImplementedError
+
+    def configure(self, resolution, framerate):
+        """Deliver frames at resolution from now on; framerate only applies to paced sources."""
+        self.resolution = resolution
+        if self.fps is not None:
+            self.fps = framerate
+
+    def fit(self, image, labels):
+        """image resized to the current resolution, with labels scaled to match."""
+        height, width = image.shape[:2]
+        if (width, height) == tuple(self.resolution):
+            return image, labels
+        scale_x, scale_y = self.resolution[0] / width, self.resolution[1] / height
+        image = cv2.resize(image, self.resolution, interpolation=cv2.INTER_AREA)
+        if labels is not None:
+            labels = [(x * scale_x, y * scale_y, r * min(scale_x, scale_y)) for x, y, r in labels]
+        return image, labels
+
+    def paced(self, frames):
+        if self.fps is None:
+            yield from frames
+            return
+        next_time = self.clock.time()
+        for item in frames:
+            delay = next_time - self.clock.time()
+            if delay > 0:
+                self.clock.sleep(delay)
+            next_time += 1.0 / self.fps
+            yield item
+
+    def close(self):
+        pass
+
+
+class PiCameraSource(FrameSource):
+    def __init__(self, resolution, framerate=30, clock=None):
+        from picamera import PiCamera
+        from picamera.array import PiRGBArray
+        super().__init__(resolution, clock=clock)
+        self.PiRGBArray = PiRGBArray
+        self.camera = PiCamera()
+        self.camera.resolution = resolution
+        self.camera.framerate = framerate
+        self.raw_capture = PiRGBArray(self.camera, size=resolution)
+        # (resolution, framerate) to switch to before the next capture. Set from the thread that
+        # runs the governor, taken by the capture thread, so it is only touched under pending_lock
+        self.pending = None
+        self.pending_lock = threading.Lock()
+
+    def configure(self, resolution, framerate):
+        # The camera can't change mode while it's capturing; frames() restarts the capture
+        with self.pending_lock:
+            self.pending = (resolution, framerate)
+
+    def take_pending(self):
+        with self.pending_lock:
+            pending, self.pending = self.pending, None
+        return pending
+
+    def frames(self):
+        while True:
+            pending = self.take_pending()
+            if pending:
+                resolution, framerate = pending
+                self.camera.resolution = resolution
+                self.camera.framerate = framerate
+                self.resolution = resolution
+                self.raw_capture = self.PiRGBArray(self.camera, size=resolution)
+            for frame in self.camera.capture_continuous(
+                self.raw_capture, format="bgr", use_video_port=True):
+                # PiRGBArray builds a new array per capture, so consumers can keep this one
+                yield frame.array, None
+                self.raw_capture.truncate(0)
+                with self.pending_lock:
+                    if self.pending:
+                        break
+
+    def close(self):
+        self.camera.close()
+
+
+class RecordedSource(FrameSource):
+    """Frames from a video file or an image directory, resized to resolution.
+
+    Labels are read from labels.csv in the image directory (or next to the
+    video), one row per puck: frame,x,y,radius. frame is the image file name,
+    or the frame index for a video. A row with an empty x marks a frame with
+    no puck; frames without any row are unlabelled.
+    """
+
+    def __init__(self, path, resolution, fps=None, loop=False, clock=None):
+        super().__init__(resolution, fps, clock)
+        self.path = path
+        self.loop = loop
+        self.is_directory = os.path.isdir(path)
+        label_path = os.path.join(path if self.is_directory else os.path.dirname(path), "labels.csv")
+        self.labels = self.read_labels(label_path) if os.path.exists(label_path) else {}
+
+    def read_labels(self, label_path):
+        labels = {}
+        with open(label_path, newline="") as f:
+            for row in csv.DictReader(f):
+                pucks = labels.setdefault(row["frame"], [])
+                if row["x"]:
+                    pucks.append((float(row["x"]), float(row["y"]), float(row["radius"])))
+        return labels
+
+    def recorded(self):
+        """(image, key) for every recorded frame, key being the file name or index used in labels.csv."""
+        if self.is_directory:
+            for name in sorted(os.listdir(self.path)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    image = cv2.imread(os.path.join(self.path, name))
+                    if image is not None:
+                        yield image, name
+        else:
+            capture = cv2.VideoCapture(self.path)
+            if not capture.isOpened():
+                raise IOError(f"Cannot open video {self.path}")
+            index = 0
+            try:
+                while True:
+                    ok, image = capture.read()
+                    if not ok:
+                        break
+                    yield image, str(index)
+                    index += 1
+            finally:
+                capture.release()
+
+    def scaled(self):
+        while True:
+            count = 0
+            for image, key in self.recorded():
+                count += 1
+                yield self.fit(image, self.labels.get(key))
+            if not self.loop or count == 0:
+                return
+
+    def frames(self):
+        return self.paced(self.scaled())
+
+
+class SyntheticSource(FrameSource):
+    """A noisy floor with a blue puck that drifts across the view, sometimes next to a smaller one,
+    with gaps where no puck is in sight. Scenes are drawn at the resolution the source was created
+    with and resized if configure() changes it, so they stay the same scenes."""
+
+    COLOUR = (200, 60, 30)  # BGR, inside PUCK_HSV
+
+    def __init__(self, resolution, length=500, seed=1, fps=None, clock=None):
+        super().__init__(resolution, fps, clock)
+        self.length = length
+        self.seed = seed
+        self.scene_resolution = resolution
+
+    def scenes(self):
+        rng = np.random.default_rng(self.seed)
+        width, height = self.scene_resolution
+        produced = 0
+        while produced < self.length:
+            segment = int(rng.integers(30, 120))
+            visible = rng.random() > 0.2
+            x, y = rng.uniform(0.35, 0.65) * width, rng.uniform(0.3, 0.9) * height
+            vx, vy = rng.normal(0, width / 400), rng.normal(0, height / 400)
+            radius = int(rng.integers(width // 12, width // 6))
+            distractor = None
+            if rng.random() < 0.3:
+                distractor = (int(rng.integers(0, width)), int(rng.integers(0, height)), radius // 2 + 2)
+            for _ in range(min(segment, self.length - produced)):
+                image = rng.integers(40, 200, size=(height, width, 3), dtype=np.uint8)
+                image = cv2.GaussianBlur(image, (5, 5), 0)
+                labels = []
+                if visible:
+                    x = min(max(x + vx + rng.normal(0, 1), 0), width - 1)
+                    y = min(max(y + vy + rng.normal(0, 1), 0), height - 1)
+                    cv2.circle(image, (int(x), int(y)), radius, self.COLOUR, -1)
+                    labels.append((int(x), int(y), radius))
+                if distractor:
+                    cv2.circle(image, distractor[:2], distractor[2], self.COLOUR, -1)
+                    labels.append(distractor)
+                produced += 1
+                yield self.fit(image, labels)
+
+    def frames(self):
+        return self.paced(self.scenes())
+
+
+def open_source(spec, resolution, fps=None, clock=None):
+    """Source for a command-line spec: "camera", "synthetic", or a video file or image directory."""
+    if spec == "camera":
+        return PiCameraSource(resolution, fps or 30, clock=clock)
+    if spec == "synthetic":
+        return SyntheticSource(resolution, fps=fps, clock=clock)
+    if os.path.exists(spec):
+        return RecordedSource(spec, resolution, fps=fps, clock=clock)
+    raise ValueError(f"Unknown frame source: {spec}")
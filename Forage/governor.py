@@ -0,0 +1,87 @@
+"""
+Resolution and framerate governor for the foraging controller.
+
+The controller reports how long every frame took from capture to motor
+command. The governor collects those latencies in windows and moves along a
+ladder of (resolution, framerate) levels, cheapest first:
+
+- one level down as soon as a window's 90th percentile is over budget,
+- one level up after a window whose 90th percentile stayed under
+  headroom * budget.
+
+A level that was left for running over budget has to show headroom for
+twice as many windows before it is tried again, so the governor settles
+instead of bouncing between two levels. Samples from the first moments after
+a change are ignored, because those frames were captured at the old level.
+
+over_budget tells the controller to skip optional work such as the debug
+overlay until the latency is back within budget.
+"""
+
+from collections import deque
+import numpy as np
+from clock import get_clock
+
+
+class Governor:
+    def __init__(self, levels, budget, level=None, window=30, headroom=0.6, settle=0.5, clock=None):
+        """levels are (resolution, framerate) pairs, cheapest first; budget is in seconds."""
+        self.levels = levels
+        self.budget = budget
+        self.level = len(levels) - 1 if level is None else level
+        self.window = window
+        self.headroom = headroom
+        self.settle = settle
+        self.clock = clock or get_clock()
+        self.samples = deque(maxlen=window)
+        self.changed_at = self.clock.time()
+        self.up_windows = [1] * len(levels)  # Windows of headroom needed before moving up to each level
+        self.calm_windows = 0
+        self.over_budget = False
+        self.p90 = 0.0
+
+        # Statistics
+        self.changes = 0
+        self.time_at_level = [0.0] * len(levels)
+
+    @property
+    def setting(self):
+        """(resolution, framerate) of the current level."""
+        return self.levels[self.level]
+
+    def record(self, latency):
+        """Add one frame's capture-to-command latency. Returns the new level if the governor moved, else None."""
+        now = self.clock.time()
+        if now - self.changed_at < self.settle:
+            return None
+        self.samples.append(latency)
+        if len(self.samples) < self.window:
+            return None
+        self.p90 = float(np.percentile(self.samples, 90))
+        self.samples.clear()
+        self.over_budget = self.p90 > self.budget
+        if self.over_budget:
+            if self.level > 0:
+                self.up_windows[self.level] *= 2
+                return self.move(self.level - 1, now)
+        elif self.p90 < self.headroom * self.budget and self.level < len(self.levels) - 1:
+            self.calm_windows += 1
+            if self.calm_windows >= self.up_windows[self.level + 1]:
+                return self.move(self.level + 1, now)
+            return None
+        self.calm_windows = 0
+        return None
+
+    def move(self, level, now):
+        self.time_at_level[self.level] += now - self.changed_at
+        self.level = level
+        self.changed_at = now
+        self.calm_windows = 0
+        self.changes += 1
+        return level
+
+    def stats(self):
+        time_at_level = list(self.time_at_level)
+        time_at_level[self.level] += self.clock.time() - self.changed_at
+        return {"level": self.level, "setting": self.setting, "p90_ms": self.p90 * 1000,
+                "changes": self.changes, "time_at_level": time_at_level}
@@ -0,0 +1,168 @@
+"""
+Puck detection spread over worker processes.
+
+Detection holds the GIL, so threads can't run it on more than one core.
+ParallelDetector starts worker processes that each build their own
+PuckDetector. Frames travel through a ring of slots in one shared-memory
+block: reserve() waits for a free slot, submit() copies a frame into it and
+queues only the slot and sequence numbers, so frames are never pickled. A
+slot is free again once its result is back. Reserving before taking the
+frame means a caller waiting for the workers always submits its newest one.
+
+Workers are spawned rather than forked, because the controller already runs
+threads (UWB, capture) that a forked child would inherit half-copied.
+
+A task that fails in a worker (an exception in detection) still returns
+its slot, and next_result() reports it with a None result, so one bad
+frame can't stall the pool.
+
+Workers finish out of order. next_result() holds early results back and
+returns them in the order the frames were submitted.
+
+Frames may change resolution between submits (see governor.py). Slots are
+sized for the largest resolution the pool was given settings for, and each
+worker builds a detector for a resolution the first time it sees it.
+
+With tracking, each worker keeps its own PuckTracker per resolution. It then sees only the
+frames that worker happened to get, which makes its predictions worse but
+doesn't change its results.
+"""
+
+import heapq
+import multiprocessing
+import queue
+import time
+from collections import deque
+from multiprocessing import shared_memory
+import numpy as np
+from detector import PuckDetector, PuckTracker
+
+
+def detection_worker(shm_name, shape, settings, tracking, tasks, results):
+    """Worker process: detect in the frame slots named by tasks until it gets None."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    slots = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    detectors = {}  # resolution -> PuckDetector, or PuckTracker with tracking
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            seq, slot, resolution, goal_bearing = task
+            start = time.time()
+            error = None
+            try:
+                detect = detectors.get(resolution)
+                if detect is None:
+                    detect = PuckDetector(**settings[resolution])
+                    detect = detectors[resolution] = PuckTracker(detect) if tracking else detect
+                (detect.detector if tracking else detect).goal_bearing = goal_bearing
+                width, height = resolution
+                result = detect.detect(slots[slot, :height * width * 3].reshape(height, width, 3))
+            except Exception as e:
+                result, error = None, f"{type(e).__name__}: {e}"
+            results.put((seq, slot, result, time.time() - start, error))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        del slots
+        shm.close()
+
+
+class ParallelDetector:
+    def __init__(self, settings, workers, tracking=False, slots=None):
+        """settings maps each frame resolution to PuckDetector keyword arguments; slots defaults to two
+        frames per worker."""
+        self.settings = settings
+        self.workers = workers
+        self.tracking = tracking
+        self.slots = slots or 2 * workers
+        self.shape = (self.slots, max(width * height * 3 for width, height in settings))
+        self.shm = None
+        self.frames = None
+        self.processes = []
+        self.context = multiprocessing.get_context("spawn")
+        self.tasks = self.context.Queue()
+        self.results = self.context.Queue()
+        self.free_slots = queue.Queue()
+        self.pending = deque()  # Submitted sequence numbers, oldest first
+        self.ready = []  # Heap of (seq, result, busy) that came back before an older frame
+
+        # Statistics
+        self.submitted = 0
+        self.completed = 0
+        self.reordered = 0  # Results held back for an older frame
+        self.failed = 0  # Tasks whose detection raised in the worker
+        self.last_error = None
+
+    def start(self):
+        self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(self.shape)))
+        self.frames = np.ndarray(self.shape, dtype=np.uint8, buffer=self.shm.buf)
+        for slot in range(self.slots):
+            self.free_slots.put(slot)
+        for _ in range(self.workers):
+            process = self.context.Process(
+                target=detection_worker,
+                args=(self.shm.name, self.shape, self.settings, self.tracking, self.tasks, self.results),
+                daemon=True)
+            process.start()
+            self.processes.append(process)
+        print(f"[PARALLEL] {self.workers} detection workers, {self.slots} frame slots")
+
+    def reserve(self, timeout=None):
+        """A free frame slot, waiting up to timeout for one (0 = don't wait). None if none freed up."""
+        try:
+            return self.free_slots.get(timeout=timeout) if timeout != 0 else self.free_slots.get_nowait()
+        except queue.Empty:
+            return None
+
+    def submit(self, seq, frame, slot, goal_bearing=None):
+        """Queue frame for detection in a slot from reserve(). seq must increase with every call.
+        Raises ValueError, and frees the slot, for a resolution the pool has no settings for."""
+        height, width = frame.shape[:2]
+        if (width, height) not in self.settings:
+            self.free_slots.put(slot)
+            raise ValueError(f"No detector settings for {width}x{height} frames")
+        np.copyto(self.frames[slot, :frame.size].reshape(frame.shape), frame)
+        # Recorded before the task goes out, so the result can't arrive first
+        self.pending.append(seq)
+        self.tasks.put((seq, slot, (width, height), goal_bearing))
+        self.submitted += 1
+
+    def next_result(self, timeout=None):
+        """(seq, (has_puck, puck_angle, puck_pos), busy) for the oldest submitted frame, or None on timeout.
+        The result is None if detection failed in the worker (see failed and last_error)."""
+        while True:
+            if self.ready and self.ready[0][0] == self.pending[0]:
+                self.pending.popleft()
+                self.completed += 1
+                return heapq.heappop(self.ready)
+            try:
+                seq, slot, result, busy, error = self.results.get(timeout=timeout)
+            except queue.Empty:
+                return None
+            self.free_slots.put(slot)
+            if error is not None:
+                self.failed += 1
+                self.last_error = error
+            if seq != self.pending[0]:
+                self.reordered += 1
+            heapq.heappush(self.ready, (seq, result, busy))
+
+    def close(self):
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=2.0)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+        if self.shm:
+            self.frames = None
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def stats(self):
+        return {"workers": self.workers, "submitted": self.submitted, "completed": self.completed,
+                "reordered": self.reordered, "failed": self.failed, "last_error": self.last_error}
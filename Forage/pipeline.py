@@ -0,0 +1,140 @@
+"""
+Building blocks for the threaded foraging pipeline.
+
+Stages hand work to each other through single-slot Mailboxes. A mailbox
+only ever holds the newest item, so a slow consumer skips stale frames
+instead of queueing them, and the skipped items are counted as drops.
+StageStats records each stage's rate, processing time and latency since
+frame capture. JitterStats records how closely a fixed-rate loop keeps its
+period.
+"""
+
+import math
+import threading
+from clock import get_clock
+
+
+class Mailbox:
+    """Latest-value handoff between two threads."""
+
+    def __init__(self, name):
+        self.name = name
+        self.cond = threading.Condition()
+        self.item = None
+        self.full = False
+        self.closed = False
+
+        # Statistics
+        self.puts = 0
+        self.taken = 0
+        self.dropped = 0  # Items overwritten before anyone took them
+
+    def put(self, item):
+        with self.cond:
+            if self.full:
+                self.dropped += 1
+            self.item = item
+            self.full = True
+            self.puts += 1
+            self.cond.notify()
+
+    def get(self, timeout=None):
+        """Take the newest item, waiting up to timeout. Returns None on timeout or once closed."""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.full or self.closed, timeout):
+                return None
+            if not self.full:
+                return None
+            item, self.item, self.full = self.item, None, False
+            self.taken += 1
+            return item
+
+    def peek(self):
+        """The newest item without taking it, or None."""
+        with self.cond:
+            return self.item
+
+    def close(self):
+        """Wake any waiting consumer; get() returns None from now on when empty."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def stats(self):
+        return {"puts": self.puts, "taken": self.taken, "dropped": self.dropped}
+
+
+class StageStats:
+    """Rate, processing time and latency since capture for one pipeline stage."""
+
+    def __init__(self, name, clock=None):
+        self.name = name
+        self.clock = clock or get_clock()
+        self.start_time = self.clock.time()
+        self.count = 0
+        self.busy = 0.0
+        self.latency = 0.0
+        self.max_latency = 0.0
+
+    def record(self, busy, latency):
+        """busy is the time this stage spent on the item, latency the item's age when the stage finished."""
+        self.count += 1
+        self.busy += busy
+        self.latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def rate(self):
+        elapsed = self.clock.time() - self.start_time
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        return {
+            "rate": self.rate(),
+            "busy_ms": self.busy / self.count * 1000 if self.count else 0.0,
+            "latency_ms": self.latency / self.count * 1000 if self.count else 0.0,
+            "max_latency_ms": self.max_latency * 1000
+        }
+
+
+class JitterStats:
+    """Period and lateness of a loop that should tick every period seconds."""
+
+    def __init__(self, name, period):
+        self.name = name
+        self.period = period
+        self.last_tick = None
+        self.count = 0
+        self.period_sum = 0.0
+        self.period_sq_sum = 0.0
+        self.max_period = 0.0
+        self.late_sum = 0.0
+        self.max_late = 0.0
+        self.overruns = 0  # Ticks skipped because the loop fell a whole period behind
+
+    def record(self, tick, late):
+        """tick is when the loop woke, late how long after its scheduled time."""
+        if self.last_tick is not None:
+            elapsed = tick - self.last_tick
+            self.count += 1
+            self.period_sum += elapsed
+            self.period_sq_sum += elapsed * elapsed
+            self.max_period = max(self.max_period, elapsed)
+            self.late_sum += late
+            self.max_late = max(self.max_late, late)
+        self.last_tick = tick
+
+    def summary(self):
+        if not self.count:
+            return {"rate": 0.0, "period_ms": 0.0, "jitter_ms": 0.0, "max_period_ms": 0.0,
+                    "late_ms": 0.0, "max_late_ms": 0.0, "overruns": self.overruns}
+        mean = self.period_sum / self.count
+        variance = max(self.period_sq_sum / self.count - mean * mean, 0.0)
+        return {
+            "rate": 1.0 / mean if mean > 0 else 0.0,
+            "period_ms": mean * 1000,
+            "jitter_ms": math.sqrt(variance) * 1000,  # Standard deviation of the period
+            "max_period_ms": self.max_period * 1000,
+            "late_ms": self.late_sum / self.count * 1000,
+            "max_late_ms": self.max_late * 1000,
+            "overruns": self.overruns
+        }
@@ -0,0 +1,118 @@
+"""
+Puck bearing between detections, for the fixed-rate motor loop.
+
+Detections arrive at the camera rate and are already a frame or two old
+when they do. The motor loop runs faster than that and steers on a
+predicted bearing instead:
+
+- Odometry integrates the robot's yaw from the wheel encoders and keeps a
+  short history, so the yaw at any recent capture time can be looked up.
+  The motor loop only reads the encoders while it has a puck to predict,
+  and calls reset() when it starts reading them again. A search can turn
+  the wheels further than the 16-bit counters can tell apart, so the first
+  reading after a pause starts a new history segment instead of being
+  differenced against the last one.
+- BearingPredictor turns each detection into a direction relative to the
+  odometry frame (puck bearing in the image plus the yaw at capture). It
+  smooths how fast that direction moves, which is the puck's own motion
+  rather than the robot's turning. A prediction extrapolates that motion
+  for at most horizon seconds and subtracts the yaw the robot has turned
+  since, so turning towards a puck is seen right away rather than one or
+  two frames later.
+
+puck_angle from the detector is atan(offset / half ROI width), not a real
+angle. half_view, the tangent of half the ROI's field of view, converts
+between the two.
+"""
+
+import bisect
+import math
+from collections import deque
+
+
+def wrap_counts(delta):
+    """Encoder count difference across the 16-bit counter wrap."""
+    return (delta + 32768) % 65536 - 32768
+
+
+class Odometry:
+    """Yaw from the wheel encoders; positive turns right, like puck_angle."""
+
+    def __init__(self, counts_per_radian, history=100):
+        self.counts_per_radian = counts_per_radian
+        self.yaw = 0.0
+        self.counts = None
+        self.times = deque(maxlen=history)
+        self.yaws = deque(maxlen=history)
+
+    def reset(self):
+        """Forget the last reading and the history. The next update() starts a new segment at the current yaw."""
+        self.counts = None
+        self.times.clear()
+        self.yaws.clear()
+
+    def update(self, now, counts):
+        """Add an encoder reading (left, right); returns the yaw."""
+        if self.counts is not None:
+            left = wrap_counts(counts[0] - self.counts[0])
+            right = wrap_counts(counts[1] - self.counts[1])
+            self.yaw += (left - right) / 2 / self.counts_per_radian
+        self.counts = counts
+        self.times.append(now)
+        self.yaws.append(self.yaw)
+        return self.yaw
+
+    def yaw_at(self, when):
+        """Yaw at an earlier time, interpolated between readings; the oldest or newest outside them."""
+        if not self.times:
+            return self.yaw
+        index = bisect.bisect_left(self.times, when)
+        if index == 0:
+            return self.yaws[0]
+        if index == len(self.times):
+            return self.yaws[-1]
+        t0, t1 = self.times[index - 1], self.times[index]
+        y0, y1 = self.yaws[index - 1], self.yaws[index]
+        return y0 + (y1 - y0) * (when - t0) / (t1 - t0) if t1 > t0 else y1
+
+
+class BearingPredictor:
+    def __init__(self, half_view, horizon=0.15, smoothing=0.5, max_gap=0.5):
+        """half_view is tan(half the ROI's horizontal field of view). A detection more than max_gap seconds
+        after the previous puck sighting starts the motion estimate over."""
+        self.half_view = half_view
+        self.horizon = horizon
+        self.smoothing = smoothing
+        self.max_gap = max_gap
+        self.captured = None  # Capture time of the last puck sighting
+        self.direction = 0.0  # Puck direction in the odometry frame at that time, radians
+        self.rate = 0.0  # Smoothed change of direction, radians per second
+        self.has_puck = False
+
+    def to_bearing(self, puck_angle):
+        return math.atan(math.tan(puck_angle) * self.half_view)
+
+    def to_puck_angle(self, bearing):
+        bearing = min(max(bearing, -math.pi / 2 + 0.01), math.pi / 2 - 0.01)
+        return math.atan(math.tan(bearing) / self.half_view)
+
+    def observe(self, captured, has_puck, puck_angle, yaw):
+        """Add a detection of a frame captured when the robot's yaw was yaw."""
+        self.has_puck = has_puck
+        if not has_puck:
+            return
+        direction = self.to_bearing(puck_angle) + yaw
+        if self.captured is not None and 0 < captured - self.captured <= self.max_gap:
+            rate = (direction - self.direction) / (captured - self.captured)
+            self.rate = self.smoothing * self.rate + (1 - self.smoothing) * rate
+        else:
+            self.rate = 0.0
+        self.captured = captured
+        self.direction = direction
+
+    def predict(self, now, yaw):
+        """puck_angle expected at time now with the robot at yaw, or None without a puck."""
+        if not self.has_puck:
+            return None
+        ahead = min(max(now - self.captured, 0.0), self.horizon)
+        return self.to_puck_angle(self.direction + self.rate * ahead - yaw)
@@ -0,0 +1,66 @@
+import threading
+import time
+import urllib.error
+import urllib.request
+import cv2
+import numpy as np
+import pytest
+from debug_stream import DebugStream
+
+
+@pytest.fixture
+def stream():
+    rendered = []
+
+    def render(image, detection):
+        rendered.append(detection)
+        return image
+
+    stream = DebugStream(render, port=0, fps=50, scale=0.5)
+    stream.rendered = rendered
+    stream.start()
+    yield stream
+    stream.close()
+
+
+def url(stream, path):
+    return f"http://127.0.0.1:{stream.server.server_address[1]}{path}"
+
+
+def publish_until(stream, done):
+    """Keep offering frames, as the control loop does, until done is set."""
+    frame = np.full((120, 160, 3), 128, dtype=np.uint8)
+    while not done.is_set():
+        stream.publish(frame, "detection")
+        time.sleep(0.005)
+
+
+def test_nothing_is_encoded_without_viewers(stream):
+    frame = np.zeros((120, 160, 3), dtype=np.uint8)
+    for _ in range(20):
+        stream.publish(frame, None)
+        time.sleep(0.005)
+    assert stream.sent == 0 and stream.rendered == []
+    assert stream.stats()["offered"] == 20
+
+
+def test_snapshot_is_a_scaled_jpeg(stream):
+    done = threading.Event()
+    publisher = threading.Thread(target=publish_until, args=(stream, done))
+    publisher.start()
+    try:
+        with urllib.request.urlopen(url(stream, "/frame.jpg"), timeout=5) as response:
+            assert response.headers["Content-Type"] == "image/jpeg"
+            jpeg = response.read()
+    finally:
+        done.set()
+        publisher.join()
+    image = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+    assert image.shape == (60, 80, 3)
+    assert stream.rendered and set(stream.rendered) == {"detection"}
+
+
+def test_unknown_path_is_404(stream):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(url(stream, "/nothing"), timeout=5)
+    assert error.value.code == 404
@@ -0,0 +1,125 @@
+import math
+import cv2
+import numpy as np
+import pytest
+from detector import PuckDetector, PuckTracker, fused_kernel, roi_for
+
+RESOLUTION = (320, 240)
+ROI_MASK, ROI_BOX, CENTER_X = roi_for(RESOLUTION, 0.4, 0.4, 0.9)
+LOWER = np.array([100, 70, 50])
+UPPER = np.array([140, 255, 255])
+PUCK_BGR = (200, 60, 30)
+
+
+def frame_with_pucks(*pucks):
+    """Grey frame with a blue disc of radius r at each (x, y, r), in frame pixels."""
+    frame = np.full((RESOLUTION[1], RESOLUTION[0], 3), 90, dtype=np.uint8)
+    for x, y, r in pucks:
+        cv2.circle(frame, (x, y), r, PUCK_BGR, -1)
+    return frame
+
+
+def test_fused_kernel_matches_repeated_erosion():
+    rng = np.random.default_rng(1)
+    mask = (rng.random((60, 80)) > 0.3).astype(np.uint8) * 255
+    assert np.array_equal(cv2.erode(mask, fused_kernel(3)), cv2.erode(mask, None, iterations=3))
+
+
+@pytest.mark.parametrize("pucks", [
+    [],
+    [(160, 150, 15)],
+    [(110, 200, 14)],  # Partly outside the trapezoid
+    [(140, 100, 12), (190, 180, 18)],
+])
+@pytest.mark.parametrize("roi", [(0.4, 0.4, 0.9), (0.3, 0.6, 0.8)])
+def test_crop_first_matches_full_frame(pucks, roi):
+    detector = PuckDetector(*roi_for(RESOLUTION, *roi), LOWER, UPPER, 100, 2, 1)
+    frame = frame_with_pucks(*pucks)
+    assert detector.detect(frame) == detector.detect_full_frame(frame)
+
+
+def test_finds_puck_bearing():
+    detector = PuckDetector(ROI_MASK, ROI_BOX, CENTER_X, LOWER, UPPER, 100, 2, 1)
+    x0, y0 = ROI_BOX[:2]
+    has_puck, angle, (cx, cy) = detector.detect(frame_with_pucks((200, 150, 15)))
+    assert has_puck
+    assert abs(cx + x0 - 200) <= 1 and abs(cy + y0 - 150) <= 1
+    assert angle == pytest.approx(math.atan2(cx - CENTER_X, CENTER_X))
+    assert angle > 0
+
+
+def test_small_blobs_are_ignored():
+    detector = PuckDetector(ROI_MASK, ROI_BOX, CENTER_X, LOWER, UPPER, 100, 2, 1)
+    assert detector.detect(frame_with_pucks((160, 150, 4))) == (False, 0, (0, 0))
+
+
+def test_black_in_range_is_rejected():
+    with pytest.raises(ValueError):
+        PuckDetector(ROI_MASK, ROI_BOX, CENTER_X, np.array([0, 0, 0]), UPPER, 100, 2, 1)
+
+
+def test_colour_table_matches_hsv_away_from_range_edges():
+    table_detector = PuckDetector(ROI_MASK, ROI_BOX, CENTER_X, LOWER, UPPER, 100, 2, 1, colour_table=True)
+    hsv_detector = PuckDetector(ROI_MASK, ROI_BOX, CENTER_X, LOWER, UPPER, 100, 2, 1)
+    frame = frame_with_pucks((150, 120, 15), (200, 190, 10))
+    has_puck, angle, position = table_detector.detect(frame)
+    expected = hsv_detector.detect(frame)
+    assert has_puck and expected[0]
+    assert abs(position[0] - expected[2][0]) <= 1 and abs(position[1] - expected[2][1]) <= 1
+
+
+def test_colour_table_is_rebuilt_only_on_change():
+    detector = PuckDetector(ROI_MASK, ROI_BOX, CENTER_X, LOWER, UPPER, 100, 2, 1, colour_table=True)
+    table = detector.colour_table
+    assert table.builds == 1
+    detector.set_thresholds(LOWER.copy(), UPPER.copy())
+    assert table.builds == 1
+    # A range that excludes the puck's hue
+    detector.set_thresholds(np.array([0, 70, 50]), np.array([30, 255, 255]))
+    assert table.builds == 2
+    assert not detector.detect(frame_with_pucks((160, 150, 15)))[0]
+
+
+def test_tracker_matches_full_scans_on_a_moving_puck():
+    detector = PuckDetector(ROI_MASK, ROI_BOX, CENTER_X, LOWER, UPPER, 100, 2, 1)
+    tracker = PuckTracker(PuckDetector(ROI_MASK, ROI_BOX, CENTER_X, LOWER, UPPER, 100, 2, 1))
+    for step in range(15):
+        frame = frame_with_pucks((130 + 4 * step, 200 - 5 * step, 14))
+        assert tracker.detect(frame) == detector.detect(frame)
+    stats = tracker.stats()
+    assert stats["full_scans"] == 1
+    assert stats["hit_rate"] == 1.0
+    assert stats["mean_window"] < detector.full_window[2] * detector.full_window[3]
+
+
+def test_tracker_falls_back_to_full_scan():
+    tracker = PuckTracker(PuckDetector(ROI_MASK, ROI_BOX, CENTER_X, LOWER, UPPER, 100, 2, 1))
+    tracker.detect(frame_with_pucks((140, 120, 14)))
+    # The puck jumps far outside the window
+    assert tracker.detect(frame_with_pucks((200, 210, 14)))[0]
+    assert tracker.misses == 1 and tracker.full_scans == 2
+    assert not tracker.detect(frame_with_pucks())[0]
+    assert tracker.position is None
+
+
+def test_components_pick_the_largest_blob_by_default():
+    detector = PuckDetector(ROI_MASK, ROI_BOX, CENTER_X, LOWER, UPPER, 100, 2, 1, components=True)
+    contours = PuckDetector(ROI_MASK, ROI_BOX, CENTER_X, LOWER, UPPER, 100, 2, 1)
+    frame = frame_with_pucks((130, 120, 10), (190, 190, 16))
+    has_puck, _, position = detector.detect(frame)
+    assert has_puck and detector.candidates == 2
+    contour_position = contours.detect(frame)[2]
+    assert abs(position[0] - contour_position[0]) <= 1 and abs(position[1] - contour_position[1]) <= 1
+
+
+def test_rank_weights_prefer_centre_or_goal():
+    frame = frame_with_pucks((115, 130, 12), (205, 130, 13))
+    largest = PuckDetector(ROI_MASK, ROI_BOX, CENTER_X, LOWER, UPPER, 100, 2, 1, components=True)
+    assert largest.detect(frame)[1] > 0
+    towards_goal = PuckDetector(ROI_MASK, ROI_BOX, CENTER_X, LOWER, UPPER, 100, 2, 1, components=True,
+                                rank_weights=(0.1, 0.0, 1.0))
+    towards_goal.goal_bearing = -0.5
+    assert towards_goal.detect(frame)[1] < 0
+    central = PuckDetector(ROI_MASK, ROI_BOX, CENTER_X, LOWER, UPPER, 100, 2, 1, components=True,
+                           rank_weights=(0.1, 1.0, 0.0))
+    assert abs(central.detect(frame_with_pucks((160, 130, 12), (205, 200, 13)))[1]) < 0.05
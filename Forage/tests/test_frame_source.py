@@ -0,0 +1,63 @@
+import cv2
+import numpy as np
+import pytest
+from clock import VirtualClock
+from detector import PuckDetector, roi_for
+from frame_source import RecordedSource, SyntheticSource, open_source
+from vision_benchmark import accuracy
+
+
+def test_synthetic_scenes_are_reproducible_and_labelled():
+    first = list(SyntheticSource((160, 120), length=40, seed=3).frames())
+    second = list(SyntheticSource((160, 120), length=40, seed=3).frames())
+    assert len(first) == 40
+    assert all(np.array_equal(a[0], b[0]) and a[1] == b[1] for a, b in zip(first, second))
+    assert first[0][0].shape == (120, 160, 3)
+    assert all(labels is not None for _, labels in first)
+
+
+def test_configure_resizes_the_same_scenes():
+    source = SyntheticSource((160, 120), length=10, seed=3)
+    frames = source.frames()
+    image, labels = next(frames)
+    source.configure((320, 240), 30)
+    resized, resized_labels = next(frames)
+    assert resized.shape == (240, 320, 3)
+    reference = list(SyntheticSource((160, 120), length=2, seed=3).frames())[1][1]
+    assert resized_labels == [(x * 2, y * 2, r * 2) for x, y, r in reference]
+
+
+def test_paced_frames_follow_the_clock():
+    clock = VirtualClock()
+    source = SyntheticSource((80, 60), length=11, fps=10, clock=clock)
+    for _ in source.frames():
+        pass
+    assert clock.time() == pytest.approx(1.0)
+
+
+def test_recorded_directory_with_labels(tmp_path):
+    for name in ("a.png", "b.png", "c.png"):
+        cv2.imwrite(str(tmp_path / name), np.zeros((60, 80, 3), dtype=np.uint8))
+    (tmp_path / "labels.csv").write_text("frame,x,y,radius\na.png,40,30,10\nb.png,,,\n")
+    frames = list(RecordedSource(str(tmp_path), (160, 120)).frames())
+    assert [image.shape for image, _ in frames] == [(120, 160, 3)] * 3
+    assert [labels for _, labels in frames] == [[(80.0, 60.0, 20.0)], [], None]
+
+
+def test_unknown_source_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        open_source(str(tmp_path / "missing"), (160, 120))
+
+
+def test_benchmark_accuracy_against_labels():
+    roi_mask, roi_box, center_x = roi_for((320, 240), 0.4, 0.4, 0.9)
+    detector = PuckDetector(roi_mask, roi_box, center_x, np.array([100, 70, 50]), np.array([140, 255, 255]),
+                            100, 2, 1)
+    x0, y0 = roi_box[:2]
+    results = [(True, 0.0, (160 - x0, 150 - y0)), (True, 0.0, (10, 10)), (False, 0, (0, 0)), (False, 0, (0, 0))]
+    labels = [[(161, 150, 15)], [(160, 150, 15)], [(160, 150, 15)], None]
+    stats = accuracy(results, labels, detector)
+    assert stats["labelled"] == 3
+    assert stats["precision"] == 0.5
+    assert stats["recall"] == 0.5
+    assert stats["median_error"] == 1.0
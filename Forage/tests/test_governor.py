@@ -0,0 +1,74 @@
+from clock import VirtualClock
+from forage import ERODE_ITER, RESOLUTION, detector_settings
+from governor import Governor
+
+LEVELS = [((160, 120), 15), ((320, 240), 20), ((640, 480), 30)]
+
+
+def feed(governor, latency, windows=1):
+    """Record whole windows of latency after the settle time; returns the moves made."""
+    moves = []
+    for _ in range(windows):
+        governor.clock.advance(governor.settle)
+        for _ in range(governor.window):
+            moved = governor.record(latency)
+            if moved is not None:
+                moves.append(moved)
+    return moves
+
+
+def test_steps_down_when_over_budget():
+    governor = Governor(LEVELS, budget=0.1, window=5, headroom=0.6, settle=0.5, clock=VirtualClock())
+    assert feed(governor, 0.15) == [1]
+    assert governor.over_budget and governor.setting == LEVELS[1]
+    assert feed(governor, 0.15) == [0]
+    # Nowhere lower to go
+    assert feed(governor, 0.15) == []
+
+
+def test_steps_up_after_headroom():
+    governor = Governor(LEVELS, budget=0.1, level=0, window=5, headroom=0.6, settle=0.5, clock=VirtualClock())
+    assert feed(governor, 0.02) == [1]
+    assert feed(governor, 0.02) == [2]
+    assert feed(governor, 0.02) == []
+
+
+def test_no_move_between_headroom_and_budget():
+    governor = Governor(LEVELS, budget=0.1, level=1, window=5, headroom=0.6, settle=0.5, clock=VirtualClock())
+    assert feed(governor, 0.08, windows=3) == []
+    assert not governor.over_budget
+
+
+def test_level_left_for_latency_needs_longer_headroom():
+    governor = Governor(LEVELS, budget=0.1, window=5, headroom=0.6, settle=0.5, clock=VirtualClock())
+    feed(governor, 0.15)
+    assert feed(governor, 0.02) == []
+    assert feed(governor, 0.02) == [2]
+    feed(governor, 0.15)
+    assert feed(governor, 0.02, windows=3) == []
+    assert feed(governor, 0.02) == [2]
+
+
+def test_samples_during_settle_are_ignored():
+    governor = Governor(LEVELS, budget=0.1, window=5, headroom=0.6, settle=0.5, clock=VirtualClock())
+    for _ in range(20):
+        assert governor.record(0.5) is None
+    assert governor.level == 2
+    assert governor.stats()["changes"] == 0
+
+
+def test_time_at_level():
+    governor = Governor(LEVELS, budget=0.1, window=5, headroom=0.6, settle=0.5, clock=VirtualClock())
+    governor.clock.advance(2.0)
+    feed(governor, 0.15)
+    governor.clock.advance(1.0)
+    assert governor.stats()["time_at_level"] == [0.0, 1.0, 2.5]
+
+
+def test_detector_settings_scale_with_resolution():
+    base = detector_settings(RESOLUTION)
+    double = detector_settings((RESOLUTION[0] * 2, RESOLUTION[1] * 2))
+    assert base["erode_iter"] == ERODE_ITER
+    assert double["erode_iter"] == 2 * ERODE_ITER
+    assert double["min_area"] == 4 * base["min_area"]
+    assert double["roi_mask"].shape == (RESOLUTION[1] * 2, RESOLUTION[0] * 2)
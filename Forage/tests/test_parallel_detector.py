@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from detector import PuckDetector, roi_for
+from frame_source import SyntheticSource
+from parallel_detector import ParallelDetector
+
+LOWER = np.array([100, 70, 50])
+UPPER = np.array([140, 255, 255])
+
+
+def settings_for(resolution, lower=LOWER):
+    roi_mask, roi_box, center_x = roi_for(resolution, 0.4, 0.4, 0.9)
+    return {"roi_mask": roi_mask, "roi_box": roi_box, "center_x": center_x, "lower": lower, "upper": UPPER,
+            "min_area": resolution[0] * resolution[1] // 200, "erode_iter": 2, "dilate_iter": 1}
+
+
+@pytest.fixture
+def idle_pool():
+    """A pool without workers; tests play the workers' part on the results queue."""
+    pool = ParallelDetector({(80, 60): settings_for((80, 60))}, workers=0, slots=4)
+    pool.start()
+    yield pool
+    pool.close()
+
+
+def test_results_come_back_in_submit_order(idle_pool):
+    frame = np.zeros((60, 80, 3), dtype=np.uint8)
+    slots = [idle_pool.reserve(0) for _ in range(3)]
+    for seq, slot in enumerate(slots):
+        idle_pool.submit(seq, frame, slot)
+    assert idle_pool.reserve(0) is not None and idle_pool.reserve(0) is None
+    for seq in (2, 0, 1):
+        idle_pool.results.put((seq, slots[seq], (True, 0.1 * seq, (seq, seq)), 0.01, None))
+    assert [idle_pool.next_result(timeout=5)[0] for _ in range(3)] == [0, 1, 2]
+    assert idle_pool.reordered == 1
+    assert idle_pool.next_result(timeout=0.05) is None
+
+
+def test_failed_task_frees_its_slot(idle_pool):
+    slot = idle_pool.reserve(0)
+    idle_pool.submit(0, np.zeros((60, 80, 3), dtype=np.uint8), slot)
+    idle_pool.results.put((0, slot, None, 0.0, "ValueError: bad frame"))
+    assert idle_pool.next_result(timeout=5) == (0, None, 0.0)
+    assert idle_pool.stats()["failed"] == 1 and idle_pool.last_error == "ValueError: bad frame"
+    assert sorted(idle_pool.reserve(0) for _ in range(4)) == [0, 1, 2, 3]
+
+
+def test_unknown_resolution_is_rejected_and_slot_returned(idle_pool):
+    slot = idle_pool.reserve(0)
+    with pytest.raises(ValueError):
+        idle_pool.submit(0, np.zeros((120, 160, 3), dtype=np.uint8), slot)
+    assert not idle_pool.pending
+    assert sorted(idle_pool.reserve(0) for _ in range(4)) == [0, 1, 2, 3]
+
+
+def test_workers_match_serial_detection():
+    resolutions = [(160, 120), (80, 60)]
+    settings = {resolution: settings_for(resolution) for resolution in resolutions}
+    # Detector construction fails in the worker for this one
+    settings[(64, 48)] = settings_for((64, 48), lower=np.array([0, 0, 0]))
+    frames = [image for image, _ in SyntheticSource((160, 120), length=6, seed=2).frames()]
+    frames += [image for image, _ in SyntheticSource((80, 60), length=6, seed=2).frames()]
+    frames.insert(3, np.zeros((48, 64, 3), dtype=np.uint8))
+
+    pool = ParallelDetector(settings, workers=2)
+    pool.start()
+    results = []
+    try:
+        for seq, frame in enumerate(frames):
+            slot = pool.reserve(0)
+            while slot is None:
+                results.append(pool.next_result(timeout=30))
+                slot = pool.reserve(0)
+            pool.submit(seq, frame, slot)
+        while len(results) < len(frames):
+            results.append(pool.next_result(timeout=30))
+    finally:
+        pool.close()
+    assert [seq for seq, _, _ in results] == list(range(len(frames)))
+    serial = {(w, h): PuckDetector(**settings[(w, h)]) for w, h in resolutions}
+    for seq, frame in enumerate(frames):
+        height, width = frame.shape[:2]
+        if (width, height) == (64, 48):
+            assert results[seq][1] is None
+        else:
+            assert results[seq][1] == serial[(width, height)].detect(frame)
+    assert pool.failed == 1
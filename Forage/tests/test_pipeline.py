@@ -0,0 +1,48 @@
+import threading
+import pytest
+from clock import VirtualClock
+from pipeline import Mailbox, StageStats
+
+
+def test_mailbox_keeps_only_the_newest_item():
+    mailbox = Mailbox("frames")
+    for frame in range(3):
+        mailbox.put(frame)
+    assert mailbox.peek() == 2
+    assert mailbox.get(timeout=0) == 2
+    assert mailbox.get(timeout=0) is None
+    assert mailbox.stats() == {"puts": 3, "taken": 1, "dropped": 2}
+
+
+def test_mailbox_wakes_a_waiting_consumer():
+    mailbox = Mailbox("frames")
+    received = []
+    consumer = threading.Thread(target=lambda: received.append(mailbox.get(timeout=5.0)))
+    consumer.start()
+    mailbox.put("frame")
+    consumer.join()
+    assert received == ["frame"]
+
+
+def test_closed_mailbox_releases_consumer():
+    mailbox = Mailbox("frames")
+    received = []
+    consumer = threading.Thread(target=lambda: received.append(mailbox.get()))
+    consumer.start()
+    mailbox.close()
+    consumer.join(timeout=5.0)
+    assert not consumer.is_alive()
+    assert received == [None]
+
+
+def test_stage_stats():
+    clock = VirtualClock()
+    stats = StageStats("detect", clock)
+    stats.record(0.01, 0.03)
+    stats.record(0.03, 0.05)
+    clock.advance(1.0)
+    summary = stats.summary()
+    assert summary["rate"] == 2.0
+    assert summary["busy_ms"] == pytest.approx(20)
+    assert summary["latency_ms"] == pytest.approx(40)
+    assert summary["max_latency_ms"] == pytest.approx(50)
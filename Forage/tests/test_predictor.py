@@ -0,0 +1,89 @@
+import math
+import pytest
+from pipeline import JitterStats
+from predictor import BearingPredictor, Odometry, wrap_counts
+
+HALF_VIEW = math.tan(math.radians(62.2) / 2)
+
+
+def test_wrap_counts():
+    assert wrap_counts(10) == 10
+    assert wrap_counts(-10) == -10
+    # 65530 -> 4 across the 16-bit wrap is +10
+    assert wrap_counts(4 - 65530) == 10
+    assert wrap_counts(65530 - 4) == -10
+
+
+def test_odometry_yaw_across_the_wrap():
+    odometry = Odometry(counts_per_radian=100)
+    odometry.update(0.0, (65500, 36))
+    # Left forward 100, right back 100: a right turn of one radian
+    assert odometry.update(0.1, (64, 65472)) == pytest.approx(1.0)
+
+
+def test_odometry_interpolates_yaw_history():
+    odometry = Odometry(counts_per_radian=100)
+    odometry.update(0.0, (0, 0))
+    odometry.update(1.0, (100, -100))
+    assert odometry.yaw_at(0.25) == pytest.approx(0.25)
+    assert odometry.yaw_at(-1.0) == 0.0
+    assert odometry.yaw_at(5.0) == pytest.approx(1.0)
+
+
+def test_reset_starts_a_new_segment_after_a_long_gap():
+    odometry = Odometry(counts_per_radian=100)
+    odometry.update(0.0, (0, 0))
+    odometry.update(0.1, (100, -100))
+    # Searching in a circle for longer than one 16-bit wrap of either wheel
+    counts = ((100 + 90000) % 65536, (-100 + 40000) % 65536)
+    odometry.reset()
+    assert odometry.update(5.0, counts) == pytest.approx(1.0)
+    # Nothing is interpolated across the gap
+    assert odometry.yaw_at(2.0) == pytest.approx(1.0)
+    assert odometry.update(5.1, ((counts[0] + 50) % 65536, (counts[1] - 50) % 65536)) == pytest.approx(1.5)
+    assert odometry.yaw_at(5.05) == pytest.approx(1.25)
+
+
+def test_prediction_accounts_for_the_robot_turning():
+    predictor = BearingPredictor(HALF_VIEW)
+    angle = predictor.to_puck_angle(0.2)
+    predictor.observe(0.0, True, angle, yaw=0.0)
+    assert predictor.predict(0.0, 0.0) == pytest.approx(angle)
+    # Having turned 0.2 rad towards the puck, it is straight ahead
+    assert predictor.predict(0.05, 0.2) == pytest.approx(0.0, abs=1e-9)
+
+
+def test_puck_motion_is_extrapolated_up_to_the_horizon():
+    predictor = BearingPredictor(HALF_VIEW, horizon=0.1, smoothing=0.0)
+    predictor.observe(0.0, True, predictor.to_puck_angle(0.0), yaw=0.0)
+    predictor.observe(0.1, True, predictor.to_puck_angle(0.05), yaw=0.0)
+    assert predictor.rate == pytest.approx(0.5)
+    assert predictor.to_bearing(predictor.predict(0.15, 0.0)) == pytest.approx(0.075)
+    assert predictor.to_bearing(predictor.predict(1.0, 0.0)) == pytest.approx(0.1)
+
+
+def test_long_gap_restarts_the_motion_estimate():
+    predictor = BearingPredictor(HALF_VIEW, max_gap=0.5, smoothing=0.0)
+    predictor.observe(0.0, True, predictor.to_puck_angle(0.0), yaw=0.0)
+    predictor.observe(0.1, True, predictor.to_puck_angle(0.05), yaw=0.0)
+    predictor.observe(2.0, True, predictor.to_puck_angle(0.3), yaw=0.0)
+    assert predictor.rate == 0.0
+
+
+def test_no_puck_no_prediction():
+    predictor = BearingPredictor(HALF_VIEW)
+    assert predictor.predict(0.0, 0.0) is None
+    predictor.observe(0.0, True, 0.1, 0.0)
+    predictor.observe(0.1, False, 0, 0.0)
+    assert predictor.predict(0.1, 0.0) is None
+
+
+def test_jitter_stats():
+    jitter = JitterStats("control", 0.02)
+    for tick, late in [(0.0, 0.0), (0.02, 0.001), (0.04, 0.0), (0.07, 0.01)]:
+        jitter.record(tick, late)
+    summary = jitter.summary()
+    assert summary["period_ms"] == pytest.approx(70 / 3)
+    assert summary["max_period_ms"] == pytest.approx(30)
+    assert summary["max_late_ms"] == pytest.approx(10)
+    assert summary["jitter_ms"] > 0
@@ -1,9 +1,11 @@
 import serial
-import time
 import threading
+import time
+from clock import get_clock
 
 class UWBReader:
-    def __init__(self, port="/dev/ttyACM1"):
+    def __init__(self, port="/dev/ttyACM1", clock=None):
+        self.clock = clock or get_clock()
         self.ser = None
         self.latest_position = (None, None)
         self.running = False
@@ -28,7 +30,7 @@ class UWBReader:
         # Reset the UWB module (send a break signal)
         print("Resetting UWB module...")
         self.ser.send_break()
-        time.sleep(1)  # Wait for the module to reset
+        self.clock.sleep(1)  # Wait for the module to reset
 
         # Enter shell mode
         if not self.enter_shell_mode():
@@ -39,7 +41,7 @@ class UWBReader:
         # Start continuous streaming
         print("Starting continuous streaming...")
         self.ser.write(b"lep\n")
-        time.sleep(1)  # Wait for the module to start streaming
+        self.clock.sleep(1)  # Wait for the module to start streaming
 
         # Flush the input buffer to discard any old data
         self.ser.reset_input_buffer()
@@ -68,7 +70,7 @@ class UWBReader:
 
         while attempt < max_attempts:
             self.ser.write(b"\n\n")  # Send double Enter
-            time.sleep(0.5)  # Wait for the module to respond
+            self.clock.sleep(0.5)  # Wait for the module to respond
 
             # Read the response
             if self.ser.in_waiting > 0:
@@ -82,7 +84,7 @@ class UWBReader:
 
             attempt += 1
             print(f"Attempt {attempt} failed. Retrying...")
-            time.sleep(0.5)  # Small delay before retrying
+            self.clock.sleep(0.5)  # Small delay before retrying
 
         print("Failed to enter shell mode after multiple attempts.")
         return False
@@ -104,6 +106,8 @@ class UWBReader:
                         print(f"Latest position: ({x}, {y})")  # Debugging: Print latest position
                 except (ValueError, IndexError) as e:
                     print(f"Failed to parse UWB data: {data}. Error: {e}")
+            # Serial polling runs on wall time: under a VirtualClock this thread would otherwise
+            # spin and push the shared virtual time forward on its own
             time.sleep(0.01)  # Small delay to avoid busy-waiting
 
     def get_latest_position(self):
@@ -0,0 +1,227 @@
+"""
+Offline benchmark for puck detection.
+
+Runs every detection path over frames from a frame source (see
+frame_source.py) with the vision settings in forage.py, and reports:
+
+- time per frame and agreement with the original full-frame path,
+- time per stage: ROI mask, colour threshold, morphology and contours (or
+  connected components),
+- accuracy against the source's labels. A detection is correct when its
+  centroid lies inside a labelled puck, a miss when a labelled puck centre is
+  inside the ROI but nothing was detected.
+
+With --workers it also measures how detection throughput scales over
+worker processes (see parallel_detector.py), at each of --resolutions.
+
+Needs OpenCV and NumPy but no camera or robot, so detection changes can be
+evaluated on any machine.
+
+Usage:
+    python3 vision_benchmark.py                           # synthetic scenes
+    python3 vision_benchmark.py --source recordings/      # image directory or video, labels.csv optional
+    python3 vision_benchmark.py --workers 1 2 3 4         # FPS with 1-4 detection processes
+"""
+
+import argparse
+import math
+import time
+import cv2
+import numpy as np
+from detector import PuckDetector, PuckTracker
+from frame_source import SyntheticSource, open_source
+from parallel_detector import ParallelDetector
+from forage import RESOLUTION, detector_settings
+
+STAGES = ("mask", "threshold", "morphology", "contours")
+
+
+def profile_full_frame(detector, frame, times):
+    """The original path, one timed stage at a time."""
+    x0, y0, x1, y1 = detector.roi_box
+    start = time.perf_counter()
+    masked_frame = cv2.bitwise_and(frame, frame, mask=detector.roi_mask)
+    masked = time.perf_counter()
+    hsv = cv2.cvtColor(masked_frame[y0:y1, x0:x1], cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv, detector.lower, detector.upper)
+    thresholded = time.perf_counter()
+    mask = cv2.erode(mask, None, iterations=detector.erode_iter)
+    mask = cv2.dilate(mask, None, iterations=detector.dilate_iter)
+    cleaned = time.perf_counter()
+    detector.find_blob(mask, detector.full_window)
+    done = time.perf_counter()
+    for stage, seconds in zip(STAGES, (masked - start, thresholded - masked, cleaned - thresholded, done - cleaned)):
+        times[stage].append(seconds)
+
+
+def profile_crop_first(detector, frame, times):
+    """PuckDetector.detect(), one timed stage at a time."""
+    window = detector.full_window
+    binary, eroded = detector.buffers(window)
+    start = time.perf_counter()
+    detector.threshold(detector.crop(frame, window), binary)
+    thresholded = time.perf_counter()
+    detector.mask_roi(binary, window)
+    masked = time.perf_counter()
+    mask = detector.morphology(binary, eroded)
+    cleaned = time.perf_counter()
+    detector.find_blob(mask, window)
+    done = time.perf_counter()
+    for stage, seconds in zip(STAGES, (masked - thresholded, thresholded - start, cleaned - masked, done - cleaned)):
+        times[stage].append(seconds)
+
+
+def accuracy(results, labels, detector):
+    """Precision, recall and centroid error of results against labels; unlabelled frames are skipped."""
+    x0, y0 = detector.roi_box[:2]
+    height, width = detector.roi_mask.shape
+    correct = false_positives = missed = labelled = 0
+    errors = []
+    for (has_puck, _, puck_pos), pucks in zip(results, labels):
+        if pucks is None:
+            continue
+        labelled += 1
+        if has_puck:
+            x, y = puck_pos[0] + x0, puck_pos[1] + y0
+            distances = [(math.hypot(x - px, y - py), r) for px, py, r in pucks]
+            hits = [distance for distance, r in distances if distance <= r]
+            if hits:
+                correct += 1
+                errors.append(min(hits))
+            else:
+                false_positives += 1
+        elif any(0 <= int(py) < height and 0 <= int(px) < width and detector.roi_mask[int(py), int(px)]
+                 for px, py, _ in pucks):
+            missed += 1
+    return {
+        "labelled": labelled,
+        "precision": correct / (correct + false_positives) if correct + false_positives else 0.0,
+        "recall": correct / (correct + missed) if correct + missed else 0.0,
+        "median_error": float(np.median(errors)) if errors else 0.0
+    }
+
+
+def run_parallel(pool, frames):
+    """Push frames through pool as fast as it takes them; returns the results in frame order."""
+    results = []
+    for frame in frames:
+        slot = pool.reserve(timeout=0)
+        while slot is None:
+            results.append(pool.next_result()[1])
+            slot = pool.reserve(timeout=0)
+        pool.submit(pool.submitted, frame, slot)
+    while len(results) < len(frames):
+        results.append(pool.next_result()[1])
+    return results
+
+
+def scaling(worker_counts, resolutions, length):
+    """Detection FPS in-process and with each number of worker processes, at each resolution."""
+    print(f"\n{'resolution':>10} {'workers':>10} {'fps':>8} {'speedup':>8} {'mismatches':>11} {'reordered':>10}")
+    for resolution in resolutions:
+        frames = [image for image, _ in SyntheticSource(resolution, length=length).frames()]
+        settings = detector_settings(resolution)
+        detector = PuckDetector(**settings)
+        start = time.perf_counter()
+        reference = [detector.detect(frame) for frame in frames]
+        base_fps = len(frames) / (time.perf_counter() - start)
+        label = f"{resolution[0]}x{resolution[1]}"
+        print(f"{label:>10} {'in-process':>10} {base_fps:>8.0f} {1:>7.2f}x {0:>11} {0:>10}")
+        for workers in worker_counts:
+            pool = ParallelDetector({resolution: settings}, workers)
+            pool.start()
+            try:
+                run_parallel(pool, frames[:4 * workers])  # Workers are up and their detectors built
+                pool.reordered = 0
+                start = time.perf_counter()
+                results = run_parallel(pool, frames)
+                fps = len(frames) / (time.perf_counter() - start)
+            finally:
+                pool.close()
+            mismatches = sum(a != b for a, b in zip(reference, results))
+            print(f"{label:>10} {workers:>10} {fps:>8.0f} {fps / base_fps:>7.2f}x {mismatches:>11} "
+                  f"{pool.reordered:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time and score the puck detection paths offline.")
+    parser.add_argument("--source", default="synthetic", help="synthetic, a video file or an image directory")
+    parser.add_argument("--frames", type=int, default=500, help="maximum number of frames to use")
+    parser.add_argument("--repeat", type=int, default=3, help="timing runs per path; the fastest counts")
+    parser.add_argument("--workers", type=int, nargs="*", help="detection process counts to measure FPS for")
+    parser.add_argument("--resolutions", nargs="*", default=["320x240", "640x480"],
+                        help="resolutions for --workers, as WIDTHxHEIGHT")
+    parser.add_argument("--scaling-frames", type=int, default=200, help="synthetic frames per resolution for --workers")
+    args = parser.parse_args()
+
+    if args.source == "synthetic":
+        source = SyntheticSource(RESOLUTION, length=args.frames)
+    else:
+        source = open_source(args.source, RESOLUTION)
+    frames, labels = [], []
+    for image, pucks in source.frames():
+        frames.append(image)
+        labels.append(pucks)
+        if len(frames) >= args.frames:
+            break
+    source.close()
+    if not frames:
+        raise SystemExit(f"No frames from {args.source}")
+
+    settings = dict(detector_settings(), colour_table=False, components=False)
+    box = settings["roi_box"]
+    detector = PuckDetector(**settings)
+    table_detector = PuckDetector(**dict(settings, colour_table=True))
+    components_detector = PuckDetector(**dict(settings, components=True))
+
+    # Each timing run gets a fresh detect function, so the tracker starts from scratch every time
+    trackers = []
+    paths = (("full frame", lambda: detector.detect_full_frame), ("crop first", lambda: detector.detect),
+             ("colour table", lambda: table_detector.detect), ("components", lambda: components_detector.detect),
+             ("tracker", lambda: (trackers.append(PuckTracker(detector)) or trackers[-1].detect)))
+    timings = {}
+    results = {}
+    for name, make_detect in paths:
+        best = None
+        for _ in range(args.repeat):
+            detect = make_detect()
+            start = time.perf_counter()
+            results[name] = [detect(frame) for frame in frames]
+            elapsed = (time.perf_counter() - start) / len(frames)
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+
+    reference = results["full frame"]
+    print(f"{len(frames)} frames from {args.source} at {RESOLUTION[0]}x{RESOLUTION[1]}, "
+          f"puck found in {sum(result[0] for result in reference)}")
+    print(f"\n{'path':>12} {'ms/frame':>9} {'speedup':>8} {'mismatches':>11} {'precision':>10} {'recall':>7} "
+          f"{'error':>6}")
+    for name, seconds in timings.items():
+        mismatches = sum(a != b for a, b in zip(reference, results[name]))
+        scores = accuracy(results[name], labels, detector)
+        score_text = (f"{scores['precision']:>9.1%} {scores['recall']:>7.1%} {scores['median_error']:>4.1f}px"
+                      if scores["labelled"] else f"{'-':>10} {'-':>7} {'-':>6}")
+        print(f"{name:>12} {seconds * 1000:>9.3f} {timings['full frame'] / seconds:>7.2f}x {mismatches:>11} "
+              f"{score_text}")
+    stats = trackers[-1].stats()
+    print(f"tracker: hit rate {stats['hit_rate']:.1%}, miss rate {stats['miss_rate']:.1%}, "
+          f"{stats['full_scans']} full scans, mean window {stats['mean_window']:.0f} px "
+          f"of {box[2] - box[0]}x{box[3] - box[1]}")
+
+    print(f"\n{'stage (ms)':>12} " + " ".join(f"{stage:>10}" for stage in STAGES))
+    for name, profile, stage_detector in (("full frame", profile_full_frame, detector),
+                                          ("crop first", profile_crop_first, detector),
+                                          ("colour table", profile_crop_first, table_detector),
+                                          ("components", profile_crop_first, components_detector)):
+        times = {stage: [] for stage in STAGES}
+        for frame in frames:
+            profile(stage_detector, frame, times)
+        print(f"{name:>12} " + " ".join(f"{np.mean(times[stage]) * 1000:>10.3f}" for stage in STAGES))
+
+    if args.workers:
+        resolutions = [tuple(int(value) for value in spec.split("x")) for spec in args.resolutions]
+        scaling(args.workers, resolutions, args.scaling_frames)
+
+
+if __name__ == "__main__":
+    main()
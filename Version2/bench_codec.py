@@ -0,0 +1,45 @@
+"""
+Benchmark the swarm payload codecs: encode/decode throughput and bytes on the wire.
+
+Usage:
+    python bench_codec.py [iterations]
+"""
+
+import sys
+import time
+from codec import FORMAT_JSON, FORMAT_BINARY, encode_position, decode_position, encode_target, decode_target
+
+
+def to_wire(payload):
+    """paho sends str payloads as UTF-8, so measure them the same way."""
+    return payload.encode("utf-8") if isinstance(payload, str) else payload
+
+
+def bench(name, encode, decode, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        payload = encode()
+    encode_time = time.perf_counter() - start
+
+    wire = to_wire(payload)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        decode(wire)
+    decode_time = time.perf_counter() - start
+
+    print(f"{name:<18} {len(wire):>6} B  "
+          f"encode {iterations / encode_time:>11,.0f} msg/s  "
+          f"decode {iterations / decode_time:>11,.0f} msg/s")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    print(f"{iterations} iterations per case")
+    for fmt in (FORMAT_JSON, FORMAT_BINARY):
+        bench(f"position/{fmt}", lambda: encode_position("robot_12", 1.2345, 2.3456, -0.7854, fmt),
+              decode_position, iterations)
+        bench(f"target/{fmt}", lambda: encode_target(3.4, 1.5, fmt), decode_target, iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
-import time
 import math
 from Zumo import Zumo  
+from clock import get_clock
 
 # Constants for calibration
 MOTOR_SPEED = 350  # Speed for calibration 
@@ -22,7 +22,7 @@ def calibrate_distance(zumo, distance):
     while left_count < distance * 10000 or right_count < distance * 10000:  # Adjust scaling factor as needed
         left_count, right_count = zumo.get_encoders()
         print(f"Encoder counts: Left={left_count}, Right={right_count}")
-        time.sleep(0.1)
+        get_clock().sleep(0.1)
 
     # Stop the robot
     zumo.send_speeds(0, 0)
@@ -57,7 +57,7 @@ def calibrate_turning(zumo, angle):
     while abs(left_count) < abs(angle_rad * 300) or abs(right_count) < abs(angle_rad * 300):  # Adjust scaling factor as needed
         left_count, right_count = zumo.get_encoders()
         print(f"Encoder counts: Left={left_count}, Right={right_count}")
-        time.sleep(0.1)
+        get_clock().sleep(0.1)
 
     # Stop the robot
     zumo.send_speeds(0, 0)
@@ -0,0 +1,257 @@
+"""
+NTP-style clock synchronization between each robot and the controller.
+
+The controller's clock is the reference. A robot sends a request stamped
+with its send time t0. The controller stamps receipt t1 and reply t2, and
+the robot stamps the reply's arrival t3. Each exchange gives
+
+    offset = ((t1 - t0) + (t2 - t3)) / 2    controller minus robot time
+    delay  = (t3 - t0) - (t2 - t1)          network round trip
+
+Network jitter mostly inflates the delay, so the estimator trusts only
+samples whose delay is close to the window's minimum. It fits offset
+against time over those samples, which also tracks the rate difference
+(drift) between the two clocks. Robots turn local timestamps into controller
+time with reference_time() / to_reference().
+
+Run this file to check the estimator against a LocalBroker and a deliberately
+skewed clock:
+    python clock_sync.py --offset 0.25 --drift 50 --jitter 0.002
+"""
+
+import argparse
+import json
+import threading
+from collections import deque
+from transport import LocalBroker, LocalClient
+from clock import SkewedClock, get_clock
+from config import ROBOT_ID, MQTT_TOPIC_TIME, CLOCK_SYNC_INTERVAL, CLOCK_SYNC_WINDOW
+
+MQTT_TOPIC_TIME_REQUEST = f"{MQTT_TOPIC_TIME}/request"
+MAX_DRIFT = 500e-6  # Rate differences beyond this (500 ppm) are treated as noise
+INITIAL_REQUESTS = 4  # Quick requests at startup so the first estimate arrives within a second
+
+
+class ClockSyncEstimator:
+    def __init__(self, window=CLOCK_SYNC_WINDOW):
+        self.samples = deque(maxlen=window)  # (local time, offset, delay)
+        self.synced = False
+        self.time0 = 0.0  # Local time the estimate is anchored at
+        self.offset0 = 0.0
+        self.drift = 0.0
+        self.delay = None  # Smallest round trip in the window
+
+    def add_sample(self, t0, t1, t2, t3):
+        """Add one exchange. Returns its (offset, delay)."""
+        delay = (t3 - t0) - (t2 - t1)
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+        self.samples.append(((t0 + t3) / 2, offset, delay))
+        self.update()
+        return offset, delay
+
+    def update(self):
+        self.delay = min(sample[2] for sample in self.samples)
+        # Samples delayed well past the minimum were queued somewhere; their offsets are skewed
+        good = [sample for sample in self.samples if sample[2] <= 2 * self.delay + 0.001]
+        mean_t = sum(sample[0] for sample in good) / len(good)
+        mean_offset = sum(sample[1] for sample in good) / len(good)
+        drift = 0.0
+        if len(good) >= 3:
+            variance = sum((sample[0] - mean_t) ** 2 for sample in good)
+            if variance > 0:
+                covariance = sum((sample[0] - mean_t) * (sample[1] - mean_offset) for sample in good)
+                drift = max(-MAX_DRIFT, min(MAX_DRIFT, covariance / variance))
+        self.time0, self.offset0, self.drift = mean_t, mean_offset, drift
+        self.synced = True
+
+    def offset(self, local_time):
+        """Controller time minus local time at local_time. 0 until the first sample."""
+        return self.offset0 + self.drift * (local_time - self.time0)
+
+    def to_reference(self, local_time):
+        """Convert a local timestamp to controller time."""
+        return local_time + self.offset(local_time)
+
+
+class ClockSyncClient:
+    """Robot side: sends time requests over the robot's MQTT session and keeps the estimate current.
+
+    client must already be connected with its network loop running. Replies are routed to on_message
+    with message_callback_add, so the owner's on_message never sees them; the owner should call
+    subscribe() again from its on_connect so the subscription survives a reconnect.
+    """
+
+    def __init__(self, client, robot_id=ROBOT_ID, interval=CLOCK_SYNC_INTERVAL, clock=None):
+        self.robot_id = robot_id
+        self.interval = interval
+        self.clock = clock or get_clock()
+        self.estimator = ClockSyncEstimator()
+        self.reply_topic = f"{MQTT_TOPIC_TIME}/{robot_id}"
+        self.client = client
+        self.client.message_callback_add(self.reply_topic, self.on_message)
+        self.seq = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        # Statistics
+        self.requests = 0
+        self.replies = 0
+        self.stale = 0  # Replies to an older request than the last one sent
+
+    def subscribe(self):
+        self.client.subscribe(self.reply_topic)
+        print(f"Clock sync subscribed to {self.reply_topic}")
+
+    def on_message(self, client, userdata, msg):
+        t3 = self.clock.time()
+        try:
+            reply = json.loads(msg.payload.decode("utf-8"))
+        except json.JSONDecodeError as e:
+            print(f"Failed to decode JSON payload: {e}")
+            return
+        if reply["seq"] != self.seq:
+            # A late reply spent extra time in the network; its offset is unreliable
+            self.stale += 1
+            return
+        self.estimator.add_sample(reply["t0"], reply["t1"], reply["t2"], t3)
+        self.replies += 1
+
+    def send_request(self):
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        t0 = self.clock.time()
+        request = {"id": self.robot_id, "seq": self.seq, "t0": t0}
+        if self.estimator.synced:
+            # Reported so the controller can see every robot's offset
+            request["offset"] = self.estimator.offset(t0)
+            request["drift"] = self.estimator.drift
+        self.client.publish(MQTT_TOPIC_TIME_REQUEST, json.dumps(request))
+        self.requests += 1
+
+    def run(self):
+        for _ in range(INITIAL_REQUESTS):
+            if self.stop_event.is_set():
+                return
+            self.send_request()
+            self.stop_event.wait(0.1)
+        while not self.stop_event.is_set():
+            self.send_request()
+            self.stop_event.wait(self.interval)
+
+    def start(self):
+        self.subscribe()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        print(f"Clock sync started every {self.interval} s")
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        # The session belongs to the owner; only stop listening on it
+        self.client.message_callback_remove(self.reply_topic)
+        self.client.unsubscribe(self.reply_topic)
+        print(f"Clock sync stopped: {self.stats()}")
+
+    def reference_time(self):
+        """Current time on the controller's clock."""
+        return self.estimator.to_reference(self.clock.time())
+
+    def stats(self):
+        return {
+            "offset": self.estimator.offset(self.clock.time()),
+            "drift_ppm": self.estimator.drift * 1e6,
+            "delay": self.estimator.delay,
+            "requests": self.requests,
+            "replies": self.replies,
+            "stale": self.stale
+        }
+
+
+class ClockSyncServer:
+    """Controller side: answers time requests. Call handle_request() from the network thread as soon as
+    a request arrives, with the receive time taken first, so event loop queueing doesn't add to the delay."""
+
+    def __init__(self, client, clock=None):
+        self.client = client
+        self.clock = clock or get_clock()
+        self.offsets = {}  # robot_id -> (offset, drift) last reported by the robot
+        self.requests = 0
+
+    def handle_request(self, msg, received):
+        try:
+            request = json.loads(msg.payload.decode("utf-8"))
+        except json.JSONDecodeError as e:
+            print(f"Failed to decode JSON payload: {e}")
+            return
+        reply = {"seq": request["seq"], "t0": request["t0"], "t1": received, "t2": self.clock.time()}
+        self.client.publish(f"{MQTT_TOPIC_TIME}/{request['id']}", json.dumps(reply))
+        if "offset" in request:
+            self.offsets[request["id"]] = (request["offset"], request["drift"])
+        self.requests += 1
+
+
+_sync = None
+
+
+def get_clock_sync():
+    """Return the process-wide ClockSyncClient, or None on the controller and in unsynchronized runs."""
+    return _sync
+
+
+def set_clock_sync(sync):
+    global _sync
+    _sync = sync
+
+
+def to_reference(local_time):
+    """Convert a timestamp from get_clock() to controller time."""
+    if _sync is None:
+        return local_time
+    return _sync.estimator.to_reference(local_time)
+
+
+def reference_time():
+    """Current controller time: get_clock().time() corrected by the process-wide ClockSyncClient, if any."""
+    return to_reference(get_clock().time())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check clock sync accuracy over the in-process broker.")
+    parser.add_argument("--offset", type=float, default=0.25, help="robot clock offset in seconds")
+    parser.add_argument("--drift", type=float, default=50.0, help="robot clock rate error in ppm")
+    parser.add_argument("--latency", type=float, default=0.002, help="one-way broker latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.002, help="extra random one-way delay in seconds")
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between requests")
+    parser.add_argument("--duration", type=float, default=20.0)
+    args = parser.parse_args()
+
+    controller_clock = get_clock()
+    broker = LocalBroker(latency=args.latency, jitter=args.jitter, seed=1)
+    server_client = LocalClient(broker)
+    server = ClockSyncServer(server_client)
+    server_client.on_message = lambda client, userdata, msg: server.handle_request(msg, controller_clock.time())
+    server_client.connect()
+    server_client.subscribe(MQTT_TOPIC_TIME_REQUEST)
+    server_client.loop_start()
+
+    robot_clock = SkewedClock(controller_clock, -args.offset, args.drift * 1e-6)
+    robot_client = LocalClient(broker)
+    robot_client.connect()
+    robot_client.loop_start()
+    sync = ClockSyncClient(robot_client, "robot_1", args.interval, clock=robot_clock)
+    sync.start()
+
+    print(f"{'time':>6} {'error':>10} {'drift':>10} {'min delay':>10}")
+    start = controller_clock.time()
+    while controller_clock.time() - start < args.duration:
+        controller_clock.sleep(1.0)
+        error = sync.reference_time() - controller_clock.time()
+        print(f"{controller_clock.time() - start:>5.0f}s {error * 1000:>8.3f}ms "
+              f"{sync.estimator.drift * 1e6:>7.1f}ppm {sync.estimator.delay * 1000:>8.3f}ms")
+    sync.stop()
+    robot_client.loop_stop()
+    server_client.loop_stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Compact binary payloads for the swarm MQTT topics.
+
+Every binary payload starts with a schema byte that names its layout and
+version. JSON payloads always start with '{', which never collides with a
+schema byte, so receivers can accept either format on the same topic.
+
+The V2 layouts add latency trace fields (see latency.py): the UWB fix
+sequence number, the fix time and the send time. Encoders emit them only
+when given a trace, and decoders accept both versions.
+"""
+
+import json
+import struct
+
+FORMAT_JSON = "json"
+FORMAT_BINARY = "binary"
+
+# Schema bytes (layout + version)
+SCHEMA_POSITION_V1 = 0x01
+SCHEMA_TARGET_V1 = 0x02
+SCHEMA_SNAPSHOT_V1 = 0x03
+SCHEMA_POSITION_V2 = 0x04
+SCHEMA_TARGET_V2 = 0x05
+SCHEMA_SNAPSHOT_V2 = 0x06
+SCHEMAS = (SCHEMA_POSITION_V1, SCHEMA_TARGET_V1, SCHEMA_SNAPSHOT_V1, SCHEMA_POSITION_V2, SCHEMA_TARGET_V2,
+           SCHEMA_SNAPSHOT_V2)
+
+# Formation modes are sent as their index in this tuple
+FORMATION_MODES = ("single", "line", "triangle", "square", "circle")
+SNAPSHOT_FLAG_KEYFRAME = 0x01
+
+ROBOT_ID_SIZE = 16  # Robot IDs are stored as fixed-width, NUL-padded UTF-8
+
+# schema, robot id, x, y, heading
+POSITION_V1 = struct.Struct(f"<B{ROBOT_ID_SIZE}sfff")
+# schema, x, y
+TARGET_V1 = struct.Struct("<Bff")
+# schema, flags, sequence, formation mode, target count, removed count
+SNAPSHOT_V1_HEADER = struct.Struct("<BBIBHH")
+# robot id, x, y
+SNAPSHOT_V1_TARGET = struct.Struct(f"<{ROBOT_ID_SIZE}sff")
+SNAPSHOT_V1_REMOVED = struct.Struct(f"<{ROBOT_ID_SIZE}s")
+# V1 fields followed by fix sequence, fix time and send time
+POSITION_V2 = struct.Struct(f"<B{ROBOT_ID_SIZE}sfffIdd")
+# V1 fields followed by the echoed fix sequence and fix time, and the send time
+TARGET_V2 = struct.Struct("<BffIdd")
+# V1 header followed by the send time
+SNAPSHOT_V2_HEADER = struct.Struct("<BBIBHHd")
+
+
+def detect_format(payload):
+    """Return FORMAT_BINARY or FORMAT_JSON depending on the payload's first byte."""
+    if isinstance(payload, str):
+        return FORMAT_JSON
+    if payload and payload[0] in SCHEMAS:
+        return FORMAT_BINARY
+    return FORMAT_JSON
+
+
+def _decode_json(payload):
+    if isinstance(payload, (bytes, bytearray)):
+        payload = payload.decode("utf-8")
+    return json.loads(payload)
+
+
+def _encode_robot_id(robot_id):
+    encoded_id = robot_id.encode("utf-8")
+    if len(encoded_id) > ROBOT_ID_SIZE:
+        raise ValueError(f"Robot ID '{robot_id}' is longer than {ROBOT_ID_SIZE} bytes")
+    return encoded_id
+
+
+def _decode_robot_id(raw):
+    return raw.rstrip(b"\0").decode("utf-8")
+
+
+def _trace_fields(trace):
+    seq, t_fix, t_sent = trace
+    return {"seq": seq, "t_fix": t_fix, "t_sent": t_sent}
+
+
+def encode_position(robot_id, x, y, heading, fmt=FORMAT_JSON, trace=None):
+    """Encode a robot position report. trace is an optional (fix seq, fix time, send time)."""
+    if fmt == FORMAT_BINARY:
+        if trace is not None:
+            return POSITION_V2.pack(SCHEMA_POSITION_V2, _encode_robot_id(robot_id), x, y, heading, *trace)
+        return POSITION_V1.pack(SCHEMA_POSITION_V1, _encode_robot_id(robot_id), x, y, heading)
+    payload = {"id": robot_id, "x": x, "y": y, "heading": heading}
+    if trace is not None:
+        payload.update(_trace_fields(trace))
+    return json.dumps(payload)
+
+
+def decode_position(payload):
+    """Decode a position report into a dict with id, x, y and heading, plus seq, t_fix and t_sent if traced."""
+    if detect_format(payload) == FORMAT_JSON:
+        return _decode_json(payload)
+    if payload[0] == SCHEMA_POSITION_V2 and len(payload) == POSITION_V2.size:
+        _, robot_id, x, y, heading, *trace = POSITION_V2.unpack(payload)
+        return {"id": _decode_robot_id(robot_id), "x": x, "y": y, "heading": heading, **_trace_fields(trace)}
+    if payload[0] != SCHEMA_POSITION_V1 or len(payload) != POSITION_V1.size:
+        raise ValueError(f"Unexpected position payload (schema {payload[0]}, {len(payload)} bytes)")
+    _, robot_id, x, y, heading = POSITION_V1.unpack(payload)
+    return {"id": _decode_robot_id(robot_id), "x": x, "y": y, "heading": heading}
+
+
+def encode_target(x, y, fmt=FORMAT_JSON, trace=None):
+    """Encode a target position for one robot. trace is an optional (echoed fix seq, fix time, send time)."""
+    if fmt == FORMAT_BINARY:
+        if trace is not None:
+            return TARGET_V2.pack(SCHEMA_TARGET_V2, x, y, *trace)
+        return TARGET_V1.pack(SCHEMA_TARGET_V1, x, y)
+    payload = {"x": x, "y": y}
+    if trace is not None:
+        payload.update(_trace_fields(trace))
+    return json.dumps(payload)
+
+
+def decode_target(payload):
+    """Decode a target position into a dict with x and y, plus seq, t_fix and t_sent if traced."""
+    if detect_format(payload) == FORMAT_JSON:
+        return _decode_json(payload)
+    if payload[0] == SCHEMA_TARGET_V2 and len(payload) == TARGET_V2.size:
+        _, x, y, *trace = TARGET_V2.unpack(payload)
+        return {"x": x, "y": y, **_trace_fields(trace)}
+    if payload[0] != SCHEMA_TARGET_V1 or len(payload) != TARGET_V1.size:
+        raise ValueError(f"Unexpected target payload (schema {payload[0]}, {len(payload)} bytes)")
+    _, x, y = TARGET_V1.unpack(payload)
+    return {"x": x, "y": y}
+
+
+def encode_snapshot(seq, keyframe, mode, targets, removed=(), fmt=FORMAT_JSON, sent_time=None):
+    """Encode a swarm snapshot.
+
+    targets maps robot ID to an (x, y) target. A keyframe holds every robot;
+    a delta holds only the robots whose target changed, plus the IDs of
+    robots that left since the previous snapshot. sent_time, if given, is
+    carried for latency tracing.
+    """
+    if fmt == FORMAT_BINARY:
+        flags = SNAPSHOT_FLAG_KEYFRAME if keyframe else 0
+        if sent_time is not None:
+            header = SNAPSHOT_V2_HEADER.pack(SCHEMA_SNAPSHOT_V2, flags, seq, FORMATION_MODES.index(mode),
+                                             len(targets), len(removed), sent_time)
+        else:
+            header = SNAPSHOT_V1_HEADER.pack(SCHEMA_SNAPSHOT_V1, flags, seq, FORMATION_MODES.index(mode),
+                                             len(targets), len(removed))
+        parts = [header]
+        for robot_id, (x, y) in targets.items():
+            parts.append(SNAPSHOT_V1_TARGET.pack(_encode_robot_id(robot_id), x, y))
+        for robot_id in removed:
+            parts.append(SNAPSHOT_V1_REMOVED.pack(_encode_robot_id(robot_id)))
+        return b"".join(parts)
+    snapshot = {
+        "seq": seq,
+        "keyframe": keyframe,
+        "mode": mode,
+        "targets": {robot_id: [x, y] for robot_id, (x, y) in targets.items()},
+        "removed": list(removed)
+    }
+    if sent_time is not None:
+        snapshot["t_sent"] = sent_time
+    return json.dumps(snapshot)
+
+
+def decode_snapshot(payload):
+    """Decode a swarm snapshot into a dict with seq, keyframe, mode, targets and removed, plus t_sent if traced."""
+    if detect_format(payload) == FORMAT_JSON:
+        snapshot = _decode_json(payload)
+        snapshot["targets"] = {robot_id: tuple(target) for robot_id, target in snapshot["targets"].items()}
+        return snapshot
+    sent_time = None
+    if payload[0] == SCHEMA_SNAPSHOT_V2 and len(payload) >= SNAPSHOT_V2_HEADER.size:
+        header_size = SNAPSHOT_V2_HEADER.size
+        _, flags, seq, mode, n_targets, n_removed, sent_time = SNAPSHOT_V2_HEADER.unpack_from(payload)
+    elif payload[0] == SCHEMA_SNAPSHOT_V1 and len(payload) >= SNAPSHOT_V1_HEADER.size:
+        header_size = SNAPSHOT_V1_HEADER.size
+        _, flags, seq, mode, n_targets, n_removed = SNAPSHOT_V1_HEADER.unpack_from(payload)
+    else:
+        raise ValueError(f"Unexpected snapshot payload (schema {payload[0]}, {len(payload)} bytes)")
+    expected_size = header_size + n_targets * SNAPSHOT_V1_TARGET.size + n_removed * SNAPSHOT_V1_REMOVED.size
+    if len(payload) != expected_size or mode >= len(FORMATION_MODES):
+        raise ValueError(f"Malformed snapshot payload ({len(payload)} bytes, expected {expected_size})")
+
+    targets = {}
+    offset = header_size
+    for _ in range(n_targets):
+        robot_id, x, y = SNAPSHOT_V1_TARGET.unpack_from(payload, offset)
+        targets[_decode_robot_id(robot_id)] = (x, y)
+        offset += SNAPSHOT_V1_TARGET.size
+    removed = []
+    for _ in range(n_removed):
+        removed.append(_decode_robot_id(SNAPSHOT_V1_REMOVED.unpack_from(payload, offset)[0]))
+        offset += SNAPSHOT_V1_REMOVED.size
+    snapshot = {
+        "seq": seq,
+        "keyframe": bool(flags & SNAPSHOT_FLAG_KEYFRAME),
+        "mode": FORMATION_MODES[mode],
+        "targets": targets,
+        "removed": removed
+    }
+    if sent_time is not None:
+        snapshot["t_sent"] = sent_time
+    return snapshot
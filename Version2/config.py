@@ -1,6 +1,7 @@
 ROBOT_ID = "robot_1"
 
 # MQTT Configuration
+MQTT_TRANSPORT = "paho"  # "paho" for a real broker, "local" for the in-process broker in transport.py
 MQTT_BROKER = "192.168.1.5"  # Replace with your MQTT broker IP
 MQTT_PORT = 1883
 MQTT_TOPIC_LEADER_POSITION = "swarm/leader/position"
@@ -8,6 +9,55 @@ MQTT_TOPIC_FOLLOWER_POSITION = "swarm/follower/position"
 MQTT_TOPIC_TARGET = "swarm/target"
 MQTT_TOPIC_FORMATION = "swarm/formation"
 MQTT_TOPIC_ROBOT_COUNT = "swarm/robot_count"
+MQTT_TOPIC_HEARTBEAT = "swarm/heartbeat"
+MQTT_TOPIC_SNAPSHOT = "swarm/snapshot"
+PAYLOAD_FORMAT = "binary"  # "binary" (codec.py structs) or "json"; the controller answers each robot in its format
+
+# Latency Tracing (latency.py)
+LATENCY_TRACE = True  # Carry fix sequence numbers and timestamps in messages and record per-stage latency histograms
+
+# Clock Synchronization (clock_sync.py)
+CLOCK_SYNC = True  # Robots estimate their clock offset to the controller and stamp traced messages in controller time
+MQTT_TOPIC_TIME = "swarm/time"  # Requests on swarm/time/request, replies on swarm/time/<robot_id>
+CLOCK_SYNC_INTERVAL = 2.0  # Seconds between time requests once synchronized
+CLOCK_SYNC_WINDOW = 16  # Recent samples used for the offset and drift estimate
+
+# Liveness Parameters
+HEARTBEAT_INTERVAL = 1.0  # Seconds between robot heartbeats
+HEARTBEAT_TIMEOUT = 5.0  # Seconds without a heartbeat before a robot is dropped
+STARTUP_TIMEOUT = 30.0  # Seconds the controller waits for the expected robot count
+
+# Telemetry Parameters
+TELEMETRY_RATE = 5.0  # Pose publishes per second while the robot is moving
+TELEMETRY_MIN_DISTANCE = 0.02  # Poses that moved less than this (meters)...
+TELEMETRY_MIN_HEADING = 0.035  # ...and turned less than this (radians, ~2 degrees) are not published
+
+# Snapshot Parameters
+USE_SNAPSHOT_TOPIC = True  # Send every robot's target in one swarm/snapshot message instead of one swarm/target/<id> each
+SNAPSHOT_INTERVAL = 0.5  # Seconds between snapshots, on a timer of their own independent of controller ticks
+SNAPSHOT_KEYFRAME_INTERVAL = 10  # Snapshots between full ones; the snapshots in between carry only robots whose target changed
+
+# Target Publish Budget (per-robot swarm/target/<id> messages, when the snapshot topic is off)
+TARGET_PUBLISH_RATE = 50.0  # Messages per second across all robots
+TARGET_PUBLISH_BURST = 10  # Messages that may go out back-to-back
+
+# Controller Sharding (sharded_controller.py)
+CONTROLLER_SHARDS = 1  # Worker processes sharing the robot traffic; 1 keeps the plain swarm/follower/position topics
+SHARD_PARTITION = "hash"  # "hash" splits robots by ID, "region" by which strip of the arena they are in
+ARENA_X_RANGE = (0.0, 4.0)  # Arena extent along x in meters; region mode cuts it into CONTROLLER_SHARDS strips
+SHARD_SUMMARY_INTERVAL = 0.2  # Seconds between batched updates from each worker to the coordinator
+SHARD_FORWARD_DISTANCE = 0.05  # Workers hold back positions that moved less than this (meters) since the last forwarded one...
+SHARD_FORWARD_INTERVAL = 1.0  # ...until they have been held this many seconds
+MQTT_TOPIC_SHARD = "swarm/shard"  # Per-shard topics are swarm/shard/<n>/position, /heartbeat and /summary
+
+# Mission Parameters
+MISSION_BLEND_DISTANCE = 0.25  # Meters from an intermediate waypoint at which the next one is sent
+
+# Pose Prediction (pose_predictor.py)
+POSE_PREDICTION = True  # Plan with poses extrapolated to the current time instead of the last report
+PREDICTION_ALPHA = 0.5  # Alpha-beta tracker position gain: share of each report's surprise taken at face value
+PREDICTION_BETA = 0.1  # Alpha-beta tracker velocity gain
+PREDICTION_MAX_HORIZON = 0.5  # Seconds past the last report to extrapolate; quiet robots have usually stopped
 
 # Formation Parameters
 FORMATION_DISTANCE = 0.3  # Distance between robots in meters (12 inches)
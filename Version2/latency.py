@@ -0,0 +1,158 @@
+"""
+Latency histograms for the swarm message pipeline.
+
+Messages carry a UWB fix sequence number and timestamps (see codec.py), and
+each stage records how long its leg took into a named LatencyHistogram:
+
+    uwb_to_publish       robot: UWB fix parsed -> position published
+    position_network     position published -> received by the controller
+    controller_queue     controller: received -> handled on the event loop
+    target_queue         controller: target queued -> published
+    target_network       target published -> received by the robot
+    snapshot_network     snapshot published -> received by the robot
+    fix_to_target        robot: UWB fix parsed -> target based on it received
+
+All timestamps are in controller time: robots convert theirs with
+clock_sync.to_reference(), so the network legs are as accurate as the clock
+sync (about a millisecond on a LAN). fix_to_target starts and ends on the
+same robot and does not depend on it.
+"""
+
+import atexit
+import math
+import threading
+from clock_sync import reference_time
+
+
+class LatencyHistogram:
+    """HDR-style histogram: log-spaced buckets with a fixed relative precision and constant memory.
+
+    Values are stored as integer multiples of resolution (seconds). Each
+    power-of-two range is split into equal sub-buckets, so any recorded value
+    is reported to within 10**-significant_digits of itself.
+    """
+
+    def __init__(self, resolution=1e-6, highest=60.0, significant_digits=2):
+        self.resolution = resolution
+        self.highest = int(highest / resolution)
+        self.sub_bucket_bits = math.ceil(math.log2(2 * 10 ** significant_digits))
+        self.sub_bucket_count = 1 << self.sub_bucket_bits
+        self.sub_bucket_half = self.sub_bucket_count // 2
+        buckets = max(1, self.highest.bit_length() - self.sub_bucket_bits + 1)
+        self.counts = [0] * (self.sub_bucket_count + (buckets - 1) * self.sub_bucket_half)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def index_of(self, units):
+        bucket = max(0, units.bit_length() - self.sub_bucket_bits)
+        return bucket * self.sub_bucket_half + (units >> bucket)
+
+    def value_at(self, index):
+        """Midpoint of the bucket at index, in seconds."""
+        if index < self.sub_bucket_count:
+            bucket, sub_bucket = 0, index
+        else:
+            offset = index - self.sub_bucket_count
+            bucket = offset // self.sub_bucket_half + 1
+            sub_bucket = offset % self.sub_bucket_half + self.sub_bucket_half
+        return ((sub_bucket << bucket) + (1 << bucket) / 2) * self.resolution
+
+    def record(self, seconds):
+        seconds = max(0.0, seconds)
+        units = min(int(seconds / self.resolution), self.highest)
+        self.counts[min(self.index_of(units), len(self.counts) - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percent):
+        """Value in seconds below which percent of the recorded values fall."""
+        if self.count == 0:
+            return 0.0
+        rank = max(1, math.ceil(self.count * percent / 100.0))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(self.value_at(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.mean(),
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "p99.9": self.percentile(99.9),
+            "max": self.max
+        }
+
+
+class LatencyRecorder:
+    """Named histograms, one per pipeline stage. Safe to record from any thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.negative = {}  # Stage -> samples below zero, i.e. clock skew between machines
+
+    def record(self, stage, seconds):
+        with self.lock:
+            if seconds < 0:
+                self.negative[stage] = self.negative.get(stage, 0) + 1
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def summary(self):
+        """Per-stage count, mean, percentiles and max in seconds."""
+        with self.lock:
+            return {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+
+    def dump(self):
+        summary = self.summary()
+        if not summary:
+            return
+        print(f"{'stage':<18} {'count':>8} {'mean':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'p99.9':>9} {'max':>9}")
+        for stage, stats in summary.items():
+            print(f"{stage:<18} {stats['count']:>8} " + " ".join(
+                f"{stats[key] * 1000:>7.2f}ms" for key in ("mean", "p50", "p90", "p99", "p99.9", "max")))
+        for stage, count in self.negative.items():
+            print(f"{stage}: {count} negative samples (clocks out of sync)")
+
+
+_recorder = LatencyRecorder()
+_dump_registered = False
+
+
+def get_recorder():
+    """Return the process-wide latency recorder."""
+    return _recorder
+
+
+def dump_on_exit():
+    """Print the latency histograms when the process exits."""
+    global _dump_registered
+    if not _dump_registered:
+        atexit.register(_recorder.dump)
+        _dump_registered = True
+
+
+def record_trace(payload, network_stage, loop_stage=None, now=None):
+    """Record latencies from the trace fields of a decoded payload, if it has them.
+
+    network_stage gets now - t_sent and loop_stage, if given, now - t_fix.
+    now defaults to the current controller time.
+    """
+    if now is None:
+        now = reference_time()
+    if payload.get("t_sent") is not None:
+        _recorder.record(network_stage, now - payload["t_sent"])
+    if loop_stage is not None and payload.get("t_fix") is not None:
+        _recorder.record(loop_stage, now - payload["t_fix"])
@@ -1,12 +1,19 @@
-import time
 import json
 import threading
 import math
-import paho.mqtt.client as mqtt
+from transport import create_client
+from clock import get_clock
 from uwb_reader import UWBReader
 from Zumo import Zumo
+from codec import encode_position, decode_target, decode_snapshot
+from telemetry import TelemetryPublisher
+from sharding import position_topic, heartbeat_topic
+from latency import get_recorder, dump_on_exit, record_trace
+from clock_sync import ClockSyncClient, set_clock_sync, reference_time, to_reference
 from navigation import calculate_turn_angle, is_within_target, normalize_angle, calculate_heading
-from config import ROBOT_ID, MQTT_BROKER, MQTT_PORT, MQTT_TOPIC_LEADER_POSITION, MQTT_TOPIC_FOLLOWER_POSITION, MQTT_TOPIC_TARGET, MQTT_TOPIC_FORMATION
+from config import (ROBOT_ID, MQTT_BROKER, MQTT_PORT, MQTT_TOPIC_LEADER_POSITION, MQTT_TOPIC_FOLLOWER_POSITION, MQTT_TOPIC_TARGET,
+                    MQTT_TOPIC_FORMATION, MQTT_TOPIC_HEARTBEAT, HEARTBEAT_INTERVAL, PAYLOAD_FORMAT,
+                    MQTT_TOPIC_SNAPSHOT, USE_SNAPSHOT_TOPIC, LATENCY_TRACE, CLOCK_SYNC)
 
 # Constants for movement
 MOTOR_SPEED_FORWARD = 350
@@ -25,11 +32,31 @@ role = "follower"
 leader_position = None
 follower_positions = {}
 formation_mode = "line"
+heartbeat_status = "alive"  # "done" once this robot holds its final target; "offline" is only for disconnects
 num_robots = 1
+stop_requested = threading.Event()  # Set by stop() to end the hold after the final target
 
 
-def turn_in_place(zumo, motor_speed, desired_turn_angle):
-    """Turn the robot in place using encoder-based logic."""
+def stop():
+    """Leave the swarm: ends main()'s hold as Ctrl-C does."""
+    stop_requested.set()
+
+
+def hold_until_stopped():
+    """Block until stop() is called.
+
+    Waits on stop_requested without a timeout, so a VirtualClock is not
+    advanced in a busy loop while nothing happens.
+    """
+    get_clock().wait(stop_requested)
+
+
+def turn_in_place(zumo, motor_speed, desired_turn_angle, preempt=None):
+    """Turn the robot in place using encoder-based logic.
+
+    If preempt (a threading.Event) is set mid-turn the robot stops early.
+    Returns the angle actually turned, in radians.
+    """
     assert(motor_speed > 0 and motor_speed <= 400)
 
     # Reset encoders
@@ -44,20 +71,31 @@ def turn_in_place(zumo, motor_speed, desired_turn_angle):
         zumo.send_speeds(-motor_speed, motor_speed)
         print(f"Turning right at speed {motor_speed}")
         while right_count < desired_right_count:
+            if preempt is not None and preempt.is_set():
+                break
             left_count, right_count = zumo.get_encoders()
+        turned_count = right_count
     else:
         # Turn left
         zumo.send_speeds(motor_speed, -motor_speed)
         print(f"Turning left at speed {motor_speed}")
         while left_count < desired_right_count:
+            if preempt is not None and preempt.is_set():
+                break
             left_count, right_count = zumo.get_encoders()
+        turned_count = left_count
 
     # Stop the robot after turning
     zumo.send_speeds(0, 0)
     print("Turn complete.")
+    return math.copysign(turned_count / TURN_ANGLE_TO_ENCODER_DELTA, desired_turn_angle)
+
+def move_forward(zumo, distance, base_speed=MOTOR_SPEED_FORWARD, preempt=None, coast=False):
+    """Move the robot forward with proportional control to keep it straight.
 
-def move_forward(zumo, distance, base_speed=MOTOR_SPEED_FORWARD):
-    """Move the robot forward with proportional control to keep it straight."""
+    If preempt (a threading.Event) is set mid-move the robot stops early, or
+    with coast=True keeps its motors running so the next leg starts without a stop.
+    """
     # Reset encoders
     zumo.reset_encoders()
     left_count, right_count = 0, 0
@@ -67,6 +105,12 @@ def move_forward(zumo, distance, base_speed=MOTOR_SPEED_FORWARD):
 
     print(f"Moving forward by {distance:.2f} meters at speed {base_speed}")
     while left_count < desired_count or right_count < desired_count:
+        if preempt is not None and preempt.is_set():
+            print("Move preempted.")
+            if coast:
+                return
+            break
+
         # Get current encoder counts
         left_count, right_count = zumo.get_encoders()
 
@@ -90,33 +134,87 @@ def move_forward(zumo, distance, base_speed=MOTOR_SPEED_FORWARD):
 
 
 
-def publish_position(client, position, heading):
-    """Publish the robot's current position and heading."""
-    payload = {
-        "id": ROBOT_ID,
-        "x": position[0],
-        "y": position[1],
-        "heading": heading
-    }
-    client.publish(MQTT_TOPIC_FOLLOWER_POSITION, json.dumps(payload))
-    print(f"Published position: {payload}")
+def publish_position(client, position, heading, fix=None):
+    """Publish the robot's current position and heading.
+
+    fix is the (sequence number, parse time) of the UWB fix behind position;
+    with LATENCY_TRACE it travels with the message, in controller time.
+    """
+    trace = None
+    if LATENCY_TRACE and fix is not None:
+        now = reference_time()
+        fix_time = to_reference(fix[1])
+        trace = (fix[0], fix_time, now)
+        get_recorder().record("uwb_to_publish", now - fix_time)
+    payload = encode_position(ROBOT_ID, position[0], position[1], heading, PAYLOAD_FORMAT, trace)
+    client.publish(position_topic(ROBOT_ID, position), payload)
+    print(f"Published position: {position}, heading {heading} ({PAYLOAD_FORMAT})")
+
 
 
+def set_offline_will(client):
+    """Have the broker announce this robot "offline" if client's connection drops. Call before connect()."""
+    client.will_set(heartbeat_topic(ROBOT_ID), json.dumps({"id": ROBOT_ID, "status": "offline"}))
+
+
+def start_heartbeat(client, interval=HEARTBEAT_INTERVAL):
+    """Publish periodic heartbeats on client so the controller can track liveness.
+
+    client must already be connected with its network loop running, and should
+    carry the offline will (set_offline_will) so a dropped connection is
+    reported too. Each heartbeat carries heartbeat_status; the thread publishes
+    "offline" itself when stopped, so stop it only when the process exits and
+    join it before disconnecting client.
+    Returns the heartbeat thread and the event that stops it.
+    """
+    topic = heartbeat_topic(ROBOT_ID)
+    stop_event = threading.Event()
+
+    def heartbeat_loop():
+        while not stop_event.is_set():
+            client.publish(topic, json.dumps({"id": ROBOT_ID, "status": heartbeat_status}))
+            stop_event.wait(interval)
+        # Announce a clean exit; a clean disconnect discards the will
+        info = client.publish(topic, json.dumps({"id": ROBOT_ID, "status": "offline"}))
+        info.wait_for_publish(1.0)
+
+    thread = threading.Thread(target=heartbeat_loop, daemon=True)
+    thread.start()
+    print(f"Heartbeat started on {topic} every {interval} s")
+    return thread, stop_event
+
 
 def subscribe_to_target(client):
-    """Subscribe to the target position topic and wait for a valid message."""
-    global target_position
+    """Subscribe to the target position topic and wait for a valid message.
+
+    client must already be connected with its network loop running; it stays
+    connected so later targets keep updating target_position.
+    """
+    target_received = threading.Event()
 
     def on_message(client, userdata, msg):
-        global target_position
+        global target_position, formation_mode
         try:
-            payload = json.loads(msg.payload.decode("utf-8"))
+            if msg.topic == MQTT_TOPIC_SNAPSHOT:
+                # The snapshot carries every robot's target; only our own entry matters
+                snapshot = decode_snapshot(msg.payload)
+                record_trace(snapshot, "snapshot_network")
+                formation_mode = snapshot["mode"]
+                if ROBOT_ID in snapshot["targets"]:
+                    target_position = tuple(float(v) for v in snapshot["targets"][ROBOT_ID])
+                    print(f"Updated target position from snapshot {snapshot['seq']}: {target_position}")
+                    target_received.set()
+                return
+
+            payload = decode_target(msg.payload)
+            record_trace(payload, "target_network", "fix_to_target")
             print(f"Received message on topic {msg.topic}: {payload}")
 
             # Validate the message format
             if "x" in payload and "y" in payload:
                 target_position = (float(payload["x"]), float(payload["y"]))
                 print(f"Updated target position: {target_position}")
+                target_received.set()
             else:
                 print("Invalid message format: 'x' and 'y' keys are required.")
         except json.JSONDecodeError as e:
@@ -127,23 +225,19 @@ def subscribe_to_target(client):
     client.on_message = on_message
     client.subscribe(f"swarm/target/{ROBOT_ID}")
     print(f"Subscribed to topic: swarm/target/{ROBOT_ID}")
+    if USE_SNAPSHOT_TOPIC:
+        client.subscribe(MQTT_TOPIC_SNAPSHOT)
+        print(f"Subscribed to topic: {MQTT_TOPIC_SNAPSHOT}")
 
-    # Wait for a valid target position
-    while target_position is None:
+    # Wait for a valid target position. The network thread delivers it, so this is I/O and stays on wall time
+    while not target_received.wait(timeout=1.0):
         print("Waiting for target position...")
-        client.loop(timeout=1.0)  # Process MQTT messages
-
-    # Disconnect after receiving a valid target position
-    client.disconnect()
-    print("Disconnected after receiving target position.")
 
-def main():
-    # Initialize UWB reader and Zumo robot
-    uwb_reader = UWBReader()
-    if not uwb_reader.start():
-        return
-    zumo = Zumo()
+def establish_heading(uwb_reader, zumo, initial_move_distance=0.4):
+    """Drive a short straight line and set zumo.heading from the UWB displacement.
 
+    Returns the position after the move, or None if UWB lost the fix.
+    """
     # Get initial position and heading
     previous_pos = (None, None)
     while True:
@@ -152,33 +246,65 @@ def main():
             previous_pos = pos
             print(f"Initial position acquired: {previous_pos}")
             break
-        time.sleep(0.1)
+        get_clock().sleep(0.1)
 
     # Move forward to establish heading
-    initial_move_distance = 0.4
     print(f"Performing an initial move of {initial_move_distance} m to establish heading.")
     move_forward(zumo, initial_move_distance)
 
     # Compute initial heading
-    time.sleep(0.2)
+    get_clock().sleep(0.2)
     current_pos = uwb_reader.get_latest_position()
     if current_pos == (None, None):
         print("Could not get position after initial move.")
-        uwb_reader.stop()
-        return
+        return None
     zumo.heading = calculate_heading(current_pos, previous_pos)
     print(f"Initial heading: {math.degrees(zumo.heading):.2f} degrees")
+    return current_pos
 
-    # Publish initial position
-    client = mqtt.Client()
+
+def main():
+    global heartbeat_status
+    if LATENCY_TRACE:
+        dump_on_exit()
+
+    # Initialize UWB reader and Zumo robot
+    uwb_reader = UWBReader()
+    if not uwb_reader.start():
+        return
+    zumo = Zumo()
+
+    current_pos = establish_heading(uwb_reader, zumo)
+    if current_pos is None:
+        uwb_reader.stop()
+        return
+
+    # One session for the whole run. It carries the offline will, so the controller
+    # hears about a drop on the same connection that carries everything else
+    client = create_client()
+    set_offline_will(client)
     client.connect(MQTT_BROKER, MQTT_PORT, 60)
-    publish_position(client, current_pos, zumo.heading)
-    client.disconnect()
-    print("Disconnected after publishing initial position.")
+    client.loop_start()
+
+    # Keep heartbeats going for the rest of the run
+    heartbeat_thread, heartbeat_stop = start_heartbeat(client)
+
+    # Track the controller's clock so traced timestamps are comparable across machines
+    clock_sync = None
+    if CLOCK_SYNC:
+        clock_sync = ClockSyncClient(client)
+        clock_sync.start()
+        set_clock_sync(clock_sync)
+
+    # Publish initial position
+    publish_position(client, current_pos, zumo.heading, uwb_reader.get_latest_fix())
+
+    # Stream pose updates for the rest of the run
+    telemetry = TelemetryPublisher(client, lambda: (uwb_reader.get_latest_position(), zumo.heading),
+                                   get_fix=uwb_reader.get_latest_fix)
+    telemetry.start()
 
     # Subscribe to target position
-    client = mqtt.Client()
-    client.connect(MQTT_BROKER, MQTT_PORT, 60)
     subscribe_to_target(client)
 
     # Main navigation loop
@@ -187,7 +313,7 @@ def main():
             current_pos = uwb_reader.get_latest_position()
             if current_pos == (None, None):
                 print("No valid UWB data received. Retrying...")
-                time.sleep(0.1)
+                get_clock().sleep(0.1)
                 continue
 
             print(f"Current position: {current_pos}")
@@ -215,13 +341,27 @@ def main():
                 print(f"Moving forward by {distance_to_target:.2f} meters.")
                 move_forward(zumo, distance=distance_to_target)
 
-            time.sleep(0.1)
+            get_clock().sleep(0.1)
+
+        # Hold the slot: the robot is still part of the formation, so keep heartbeating
+        # (as "done") until the process is stopped
+        zumo.send_speeds(0, 0)
+        heartbeat_status = "done"
+        print("Holding position; press Ctrl-C to leave the swarm.")
+        hold_until_stopped()
 
     except KeyboardInterrupt:
         print("Exiting...")
     finally:
         zumo.send_speeds(0, 0)
         uwb_reader.stop()
+        telemetry.stop()
+        if clock_sync:
+            clock_sync.stop()
+        heartbeat_stop.set()
+        heartbeat_thread.join(timeout=2.0)
+        client.disconnect()
+        client.loop_stop()
 
 
 if __name__ == "__main__":
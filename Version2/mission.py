@@ -0,0 +1,83 @@
+"""
+Waypoint missions for the swarm controller.
+
+A MissionQueue holds ordered waypoints per robot, plus one list for the whole
+formation under the FORMATION key. Each key has at most one waypoint in
+flight. Once the robot (or every robot of the formation) is within the blend
+distance of an intermediate waypoint, it counts as completed and the next one
+goes out. The robot then turns into the next leg without stopping at the
+waypoint. The last waypoint must be reached within the normal target
+tolerance, and it stays as the target afterwards.
+"""
+
+from collections import deque
+from clock import get_clock
+from config import MISSION_BLEND_DISTANCE
+
+FORMATION = "formation"  # Key of the waypoints the formation centre follows
+
+
+class MissionQueue:
+    def __init__(self, blend_distance=MISSION_BLEND_DISTANCE, clock=None):
+        self.blend_distance = blend_distance
+        self.clock = clock or get_clock()
+        self.queues = {}  # key -> deque of waypoints not yet sent
+        self.current = {}  # key -> waypoint in flight, or the final one once finished
+        self.finished = set()  # Keys whose last waypoint was reached
+
+        # Statistics
+        self.completed = 0
+        self.started_at = None  # Time the first waypoint went out
+
+    def add(self, key, waypoints):
+        """Append waypoints for a robot ID or FORMATION. Returns True if the key's current waypoint changed."""
+        queue = self.queues.setdefault(key, deque())
+        queue.extend((float(x), float(y)) for x, y in waypoints)
+        if key in self.current and key not in self.finished:
+            return False
+        self.finished.discard(key)
+        return self.dispatch(key)
+
+    def dispatch(self, key):
+        """Move the key's next waypoint in flight. Returns False if there is none."""
+        queue = self.queues.get(key)
+        if not queue:
+            return False
+        self.current[key] = queue.popleft()
+        if self.started_at is None:
+            self.started_at = self.clock.time()
+        return True
+
+    def has_next(self, key):
+        return bool(self.queues.get(key))
+
+    def active(self, key):
+        """Whether key has a waypoint in flight."""
+        return key in self.current and key not in self.finished
+
+    def completion_radius(self, key, tolerance):
+        """Distance at which the current waypoint counts as done: the blend distance unless it is the last one."""
+        if self.has_next(key):
+            return max(self.blend_distance, tolerance)
+        return tolerance
+
+    def complete(self, key):
+        """Mark the current waypoint done. Returns True if a new waypoint went in flight."""
+        if not self.active(key):
+            return False
+        self.completed += 1
+        if self.dispatch(key):
+            return True
+        # Hold the last waypoint as the target
+        self.finished.add(key)
+        return False
+
+    def stats(self):
+        """Pending, in-flight and completed waypoints, and waypoints completed per minute."""
+        elapsed = self.clock.time() - self.started_at if self.started_at is not None else 0.0
+        return {
+            "pending": sum(len(queue) for queue in self.queues.values()),
+            "in_flight": len(self.current) - len(self.finished),
+            "completed": self.completed,
+            "waypoints_per_minute": self.completed * 60.0 / elapsed if elapsed > 0 else 0.0
+        }
@@ -0,0 +1,174 @@
+"""
+Constant-velocity pose prediction for the swarm controller.
+
+Robots report their pose a few times a second at most, and not at all while
+standing still (see telemetry.py). PosePredictor runs an alpha-beta
+(constant-velocity) tracker per robot, which filters UWB noise out of both
+the position and the velocity estimate. It extrapolates every robot to the
+planning time in one vectorized step. Extrapolation stops max_horizon
+seconds after the last report, because a robot that has gone quiet has
+usually stopped.
+
+Each new report is compared with what the predictor would have said for
+that moment. The residuals are kept, along with the error of simply using
+the previous report, to show whether prediction helps.
+
+With the sharded controller the tracking runs in the shard workers, which
+see every report; the coordinator takes their state with set_state().
+"""
+
+from collections import deque
+import numpy as np
+from navigation import normalize_angle
+from config import PREDICTION_ALPHA, PREDICTION_BETA, PREDICTION_MAX_HORIZON
+
+
+class PosePredictor:
+    def __init__(self, alpha=PREDICTION_ALPHA, beta=PREDICTION_BETA, max_horizon=PREDICTION_MAX_HORIZON,
+                 capacity=16):
+        """alpha and beta are the tracker's position and velocity gains (1.0 and 1.0 = trust each report fully)."""
+        self.alpha = alpha
+        self.beta = beta
+        self.max_horizon = max_horizon
+
+        # One row per robot; rows are packed, robot_ids[i] owns row i
+        self.robot_ids = []
+        self.rows = {}
+        self.positions = np.zeros((capacity, 2))
+        self.velocities = np.zeros((capacity, 2))
+        self.headings = np.zeros(capacity)
+        self.turn_rates = np.zeros(capacity)
+        self.times = np.zeros(capacity)
+
+        # Residuals of recent reports, in meters
+        self.residuals = deque(maxlen=1000)
+        self.stale_residuals = deque(maxlen=1000)  # Distance from the previous report instead
+        self.last_reports = {}  # robot_id -> previous reported (x, y), for stale_residuals
+
+    def __len__(self):
+        return len(self.robot_ids)
+
+    def grow(self):
+        capacity = 2 * len(self.times)
+        for name in ("positions", "velocities"):
+            grown = np.zeros((capacity, 2))
+            grown[:len(self.times)] = getattr(self, name)
+            setattr(self, name, grown)
+        for name in ("headings", "turn_rates", "times"):
+            grown = np.zeros(capacity)
+            grown[:len(self.times)] = getattr(self, name)
+            setattr(self, name, grown)
+
+    def add(self, robot_id):
+        """Give a new robot a row. Returns the row."""
+        row = len(self.robot_ids)
+        if row == len(self.times):
+            self.grow()
+        self.rows[robot_id] = row
+        self.robot_ids.append(robot_id)
+        return row
+
+    def update(self, robot_id, position, heading, t):
+        """Record a pose report received at time t."""
+        row = self.rows.get(robot_id)
+        if row is None:
+            row = self.add(robot_id)
+            self.positions[row] = position
+            self.velocities[row] = 0.0
+            self.headings[row] = heading
+            self.turn_rates[row] = 0.0
+            self.times[row] = t
+            self.last_reports[robot_id] = position
+            return
+
+        dt = t - self.times[row]
+        if dt > self.max_horizon:
+            # The robot was quiet long enough to have stopped; start again from rest
+            self.velocities[row] = 0.0
+            self.turn_rates[row] = 0.0
+        horizon = min(max(dt, 0.0), self.max_horizon)
+        predicted = self.positions[row] + self.velocities[row] * horizon
+        measured = np.asarray(position, dtype=float)
+        residual = measured - predicted
+        self.residuals.append(float(np.hypot(*residual)))
+        self.stale_residuals.append(float(np.hypot(*(measured - self.last_reports[robot_id]))))
+        self.last_reports[robot_id] = position
+
+        heading_residual = normalize_angle(heading - (self.headings[row] + self.turn_rates[row] * horizon))
+        self.positions[row] = predicted + self.alpha * residual
+        self.headings[row] = normalize_angle(self.headings[row] + self.turn_rates[row] * horizon
+                                             + self.alpha * heading_residual)
+        if dt > 0:
+            self.velocities[row] += self.beta * residual / dt
+            self.turn_rates[row] += self.beta * heading_residual / dt
+        self.times[row] = t
+
+    def state(self, robot_id):
+        """Tracked (x, y, heading, vx, vy, turn rate, time) of a robot, as plain floats for set_state()."""
+        row = self.rows[robot_id]
+        return (*self.positions[row].tolist(), float(self.headings[row]), *self.velocities[row].tolist(),
+                float(self.turn_rates[row]), float(self.times[row]))
+
+    def set_state(self, robot_id, x, y, heading, vx, vy, turn_rate, t):
+        """Take a robot's state as tracked by another predictor, without filtering it again."""
+        row = self.rows.get(robot_id)
+        if row is None:
+            row = self.add(robot_id)
+            self.last_reports[robot_id] = (x, y)
+        self.positions[row] = (x, y)
+        self.velocities[row] = (vx, vy)
+        self.headings[row] = heading
+        self.turn_rates[row] = turn_rate
+        self.times[row] = t
+
+    def remove(self, robot_id):
+        """Forget a robot; the last row moves into its place."""
+        row = self.rows.pop(robot_id, None)
+        if row is None:
+            return
+        del self.last_reports[robot_id]
+        last = len(self.robot_ids) - 1
+        if row != last:
+            moved_id = self.robot_ids[last]
+            self.robot_ids[row] = moved_id
+            self.rows[moved_id] = row
+            for array in (self.positions, self.velocities, self.headings, self.turn_rates, self.times):
+                array[row] = array[last]
+        self.robot_ids.pop()
+
+    def predict(self, t):
+        """Poses of every robot at time t: (robot_ids, positions (n, 2), headings (n,))."""
+        n = len(self.robot_ids)
+        horizon = np.clip(t - self.times[:n], 0.0, self.max_horizon)
+        positions = self.positions[:n] + self.velocities[:n] * horizon[:, None]
+        headings = self.headings[:n] + self.turn_rates[:n] * horizon
+        headings = (headings + np.pi) % (2 * np.pi) - np.pi
+        return list(self.robot_ids), positions, headings
+
+    def predict_positions(self, t):
+        """Predicted positions at time t as {robot_id: (x, y)}."""
+        robot_ids, positions, _ = self.predict(t)
+        return {robot_id: (float(x), float(y)) for robot_id, (x, y) in zip(robot_ids, positions)}
+
+    def close_pairs(self, t, threshold):
+        """Pairs of robots predicted to be closer than threshold at time t, as (id_a, id_b, distance)."""
+        robot_ids, positions, _ = self.predict(t)
+        if len(robot_ids) < 2:
+            return []
+        deltas = positions[:, None, :] - positions[None, :, :]
+        distances = np.hypot(deltas[..., 0], deltas[..., 1])
+        first, second = np.nonzero(np.triu(distances < threshold, k=1))
+        return [(robot_ids[a], robot_ids[b], float(distances[a, b])) for a, b in zip(first, second)]
+
+    def residual_stats(self):
+        """Mean, p95 and max prediction error of recent reports, and the mean error without prediction."""
+        if not self.residuals:
+            return {"count": 0, "mean": 0.0, "p95": 0.0, "max": 0.0, "stale_mean": 0.0}
+        residuals = np.fromiter(self.residuals, dtype=float)
+        return {
+            "count": len(residuals),
+            "mean": float(residuals.mean()),
+            "p95": float(np.percentile(residuals, 95)),
+            "max": float(residuals.max()),
+            "stale_mean": float(np.mean(np.fromiter(self.stale_residuals, dtype=float)))
+        }
@@ -0,0 +1,87 @@
+"""
+Outbound publish scheduling for the swarm controller.
+
+Holds at most one pending message per key (robot). A newer message for a
+robot replaces the pending one, so a slow link never delivers stale targets.
+Messages leave in first-queued order under a global token-bucket budget.
+"""
+
+import asyncio
+from collections import OrderedDict
+from clock import get_clock
+from latency import get_recorder
+from config import LATENCY_TRACE
+
+
+class PublishScheduler:
+    def __init__(self, client, rate, burst=None, clock=None):
+        """rate is the global budget in messages per second; burst is the bucket size."""
+        self.client = client
+        self.clock = clock or get_clock()
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate / 10)
+        self.tokens = self.burst
+        self.last_refill = self.clock.monotonic()
+        self.pending = OrderedDict()  # key -> (topic, payload, qos, time queued)
+        self.wakeup = None  # asyncio.Event set by submit(), created by run()
+
+        # Statistics
+        self.submitted = 0
+        self.published = 0
+        self.coalesced = 0  # Pending messages replaced by a newer one before they went out
+        self.max_depth = 0
+
+    def submit(self, key, topic, payload, qos=0):
+        """Queue a message, replacing any message still pending for key."""
+        self.submitted += 1
+        if key in self.pending:
+            self.coalesced += 1
+        # Keep the original queue position so a busy robot can't starve the others
+        self.pending[key] = (topic, payload, qos, self.clock.monotonic())
+        self.max_depth = max(self.max_depth, len(self.pending))
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def cancel(self, key):
+        """Drop the message still pending for key, if any. Returns True if one was dropped."""
+        return self.pending.pop(key, None) is not None
+
+    def refill(self):
+        now = self.clock.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def drain(self):
+        """Publish as many pending messages as the budget allows. Returns the number sent."""
+        self.refill()
+        sent = 0
+        while self.pending and self.tokens >= 1.0:
+            key, (topic, payload, qos, queued_at) = self.pending.popitem(last=False)
+            self.client.publish(topic, payload, qos=qos)
+            if LATENCY_TRACE:
+                get_recorder().record("target_queue", self.clock.monotonic() - queued_at)
+            self.tokens -= 1.0
+            self.published += 1
+            sent += 1
+        return sent
+
+    async def run(self):
+        """Drain continuously on the event loop: on new submissions, or when the next token is due."""
+        self.wakeup = asyncio.Event()
+        while True:
+            self.wakeup.clear()
+            self.drain()
+            if self.pending:
+                await self.clock.async_sleep((1.0 - self.tokens) / self.rate)
+            else:
+                # Nothing is due until submit() sets the event, so no clock is involved
+                await self.wakeup.wait()
+
+    def stats(self):
+        return {
+            "depth": len(self.pending),
+            "max_depth": self.max_depth,
+            "submitted": self.submitted,
+            "published": self.published,
+            "coalesced": self.coalesced
+        }
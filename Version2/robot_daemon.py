@@ -0,0 +1,204 @@
+"""
+Long-lived robot process that keeps UWB, the Zumo and one MQTT session open
+and drives to each new target as it arrives. Targets, telemetry, heartbeats
+and clock sync all share that session, and it carries the offline will, so
+the controller hears about a dropped robot from the connection that matters.
+
+A new target preempts the current one: the motion primitives stop at the
+next encoder poll and navigation restarts toward the new target, so
+retargeting costs milliseconds instead of a full process restart.
+"""
+
+import json
+import threading
+import math
+from transport import create_client
+from clock import get_clock
+from uwb_reader import UWBReader
+from Zumo import Zumo
+from codec import decode_target, decode_snapshot
+from telemetry import TelemetryPublisher
+from latency import dump_on_exit, record_trace
+from clock_sync import ClockSyncClient, set_clock_sync
+from navigation import is_within_target, normalize_angle
+from main import (turn_in_place, move_forward, publish_position, establish_heading, set_offline_will,
+                  start_heartbeat, MOTOR_SPEED_TURN, ANGLE_TOLERANCE, TARGET_TOLERANCE)
+from config import ROBOT_ID, MQTT_BROKER, MQTT_PORT, MQTT_TOPIC_SNAPSHOT, USE_SNAPSHOT_TOPIC, LATENCY_TRACE, CLOCK_SYNC
+
+
+class RobotDaemon:
+    def __init__(self, client=None, clock=None):
+        self.clock = clock or get_clock()
+        self.uwb_reader = UWBReader(clock=self.clock)
+        self.zumo = None
+        self.client = client or create_client()
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+
+        # Target shared with the MQTT network thread
+        self.target_lock = threading.Lock()
+        self.target_position = None
+        self.target_received_at = None
+        self.new_target = threading.Event()  # Set when a new target arrives; preempts the current move
+        self.running = False
+        self.telemetry = TelemetryPublisher(self.client, self.get_pose, get_fix=self.uwb_reader.get_latest_fix,
+                                            clock=self.clock)
+        self.clock_sync = ClockSyncClient(self.client, clock=self.clock) if CLOCK_SYNC else None
+        self.heartbeat_thread = None
+
+        # Statistics
+        self.targets_received = 0
+        self.targets_reached = 0
+        self.preemptions = 0
+
+    def on_connect(self, client, userdata, flags, rc):
+        print(f"Connected to MQTT broker with result code {rc}")
+        if rc == 0:
+            # Resubscribe on every (re)connect so the session survives broker restarts
+            self.client.subscribe(f"swarm/target/{ROBOT_ID}")
+            print(f"Subscribed to topic: swarm/target/{ROBOT_ID}")
+            if USE_SNAPSHOT_TOPIC:
+                self.client.subscribe(MQTT_TOPIC_SNAPSHOT)
+                print(f"Subscribed to topic: {MQTT_TOPIC_SNAPSHOT}")
+            if self.clock_sync:
+                self.clock_sync.subscribe()
+        else:
+            print(f"Failed to connect to MQTT broker. Result code: {rc}")
+
+    def on_message(self, client, userdata, msg):
+        try:
+            if msg.topic == MQTT_TOPIC_SNAPSHOT:
+                snapshot = decode_snapshot(msg.payload)
+                record_trace(snapshot, "snapshot_network")
+                if ROBOT_ID in snapshot["targets"]:
+                    self.set_target(snapshot["targets"][ROBOT_ID])
+                return
+
+            payload = decode_target(msg.payload)
+            record_trace(payload, "target_network", "fix_to_target")
+            if "x" in payload and "y" in payload:
+                self.set_target((payload["x"], payload["y"]))
+            else:
+                print("Invalid message format: 'x' and 'y' keys are required.")
+        except json.JSONDecodeError as e:
+            print(f"Failed to decode JSON payload: {e}")
+        except ValueError as e:
+            print(f"Invalid value in payload: {e}")
+
+    def set_target(self, target):
+        """Replace the current target. Repeats of the current target are ignored."""
+        target = (float(target[0]), float(target[1]))
+        with self.target_lock:
+            if target == self.target_position:
+                return
+            self.target_position = target
+            self.target_received_at = self.clock.time()
+            self.targets_received += 1
+        print(f"New target position: {target}")
+        self.new_target.set()
+
+    def start(self):
+        """Open UWB and the Zumo, establish heading and connect to the broker."""
+        if not self.uwb_reader.start():
+            return False
+        self.zumo = Zumo()
+
+        current_pos = establish_heading(self.uwb_reader, self.zumo)
+        if current_pos is None:
+            self.uwb_reader.stop()
+            return False
+
+        set_offline_will(self.client)
+        self.client.connect(MQTT_BROKER, MQTT_PORT, 60)
+        self.client.loop_start()
+        self.heartbeat_thread, self.heartbeat_stop = start_heartbeat(self.client)
+        if self.clock_sync:
+            self.clock_sync.start()
+            set_clock_sync(self.clock_sync)
+        publish_position(self.client, current_pos, self.zumo.heading, self.uwb_reader.get_latest_fix())
+        self.telemetry.start()
+        self.running = True
+        return True
+
+    def get_pose(self):
+        return self.uwb_reader.get_latest_position(), self.zumo.heading
+
+    def stop(self):
+        self.running = False
+        self.new_target.set()
+        if self.zumo:
+            self.zumo.send_speeds(0, 0)
+        self.telemetry.stop()
+        if self.clock_sync:
+            self.clock_sync.stop()
+        if self.heartbeat_thread:
+            # The final "offline" heartbeat goes out before the session closes
+            self.heartbeat_stop.set()
+            self.heartbeat_thread.join(timeout=2.0)
+        self.client.disconnect()
+        self.client.loop_stop()
+        self.uwb_reader.stop()
+        print(f"Daemon stopped. Targets received: {self.targets_received}, "
+              f"reached: {self.targets_reached}, preempted: {self.preemptions}")
+
+    def navigate(self, target):
+        """Drive to target. Returns True when reached, False if a new target preempted it."""
+        while self.running:
+            if self.new_target.is_set():
+                self.preemptions += 1
+                print(f"Target {target} preempted.")
+                return False
+
+            current_pos = self.uwb_reader.get_latest_position()
+            if current_pos == (None, None):
+                print("No valid UWB data received. Retrying...")
+                self.clock.sleep(0.1)
+                continue
+
+            if is_within_target(current_pos, target, TARGET_TOLERANCE):
+                print(f"Target position {target} reached!")
+                publish_position(self.client, current_pos, self.zumo.heading, self.uwb_reader.get_latest_fix())
+                return True
+
+            dx_target = target[0] - current_pos[0]
+            dy_target = target[1] - current_pos[1]
+            theta_target = math.atan2(dy_target, dx_target)
+            gamma = normalize_angle(theta_target - self.zumo.heading)
+
+            if abs(gamma) > ANGLE_TOLERANCE:
+                turned = turn_in_place(self.zumo, MOTOR_SPEED_TURN, gamma, preempt=self.new_target)
+                self.zumo.heading = normalize_angle(self.zumo.heading + turned)
+            else:
+                # Coast through a preemption: the next waypoint usually arrives while we're still moving
+                move_forward(self.zumo, math.sqrt(dx_target**2 + dy_target**2), preempt=self.new_target, coast=True)
+
+            self.clock.sleep(0.1)
+        return False
+
+    def run(self):
+        """Serve targets until interrupted."""
+        if not self.start():
+            return
+        try:
+            while self.running:
+                # Waiting on the MQTT network thread is I/O, like the UWB serial poll, so it stays on
+                # wall time; the timeout only bounds how long stop() takes to be noticed
+                if not self.new_target.wait(timeout=1.0):
+                    continue
+                with self.target_lock:
+                    self.new_target.clear()
+                    target = self.target_position
+                    received_at = self.target_received_at
+                print(f"Starting toward {target} {(self.clock.time() - received_at) * 1000:.1f} ms after it arrived")
+                if self.navigate(target):
+                    self.targets_reached += 1
+        except KeyboardInterrupt:
+            print("Exiting...")
+        finally:
+            self.stop()
+
+
+if __name__ == "__main__":
+    if LATENCY_TRACE:
+        dump_on_exit()
+    RobotDaemon().run()
@@ -0,0 +1,306 @@
+"""
+Swarm controller split across processes.
+
+Each ShardWorker process subscribes to one shard's position and heartbeat
+topics (see sharding.py), decodes the messages and sends the coordinator one
+batched summary every SHARD_SUMMARY_INTERVAL seconds. Workers also own
+liveness: they absorb the steady stream of heartbeats and only report robots
+that joined, went stale or left. A position that moved less than
+SHARD_FORWARD_DISTANCE from the last one forwarded is held back for up to
+SHARD_FORWARD_INTERVAL seconds, so the coordinator's per-robot updates follow
+how far robots move rather than how often they report. With POSE_PREDICTION
+each worker also runs the pose tracker on every report and forwards its
+state, which the coordinator copies instead of filtering again. The
+ShardCoordinator is a SwarmController that reads those summaries instead of
+the raw robot traffic, so decoding, heartbeats, pose tracking and most
+position updates spread over the worker processes while formation
+assignment and the snapshot stay in one place.
+
+Robots that cross a region boundary start publishing to another shard. The
+coordinator keeps the newest position by receive time, tracks which shard
+owns each robot and counts the handoffs; the robot stays in the swarm
+throughout.
+
+Latency trace fields (seq, t_fix, t_sent) ride along in the summary. The
+worker stamps when it received each position, so the coordinator records
+position_network for the same leg as the single-process controller and
+echoes the fix back in the robot's targets.
+
+Worker processes need a real broker, so this requires MQTT_TRANSPORT = "paho".
+
+Usage:
+    python sharded_controller.py
+
+simulate_swarm.py --shards runs the same workers in-process and reports the
+CPU load of the coordinator and of the busiest worker.
+"""
+
+import asyncio
+import json
+import math
+import multiprocessing
+import threading
+from transport import TRANSPORT_LOCAL, create_client, topic_matches
+from clock import get_clock
+from codec import detect_format, decode_position
+from sharding import shard_topic
+from clock_sync import MQTT_TOPIC_TIME_REQUEST
+from latency import record_trace
+from pose_predictor import PosePredictor
+from swarm_controller import SwarmController
+from config import (MQTT_BROKER, MQTT_PORT, MQTT_TRANSPORT, MQTT_TOPIC_SHARD, CONTROLLER_SHARDS, SHARD_PARTITION,
+                    SHARD_SUMMARY_INTERVAL, SHARD_FORWARD_DISTANCE, SHARD_FORWARD_INTERVAL, HEARTBEAT_TIMEOUT,
+                    POSE_PREDICTION)
+
+
+class ShardWorker:
+    """Decodes one shard's robot traffic and forwards it to the coordinator in batches."""
+
+    def __init__(self, shard, summary_interval=SHARD_SUMMARY_INTERVAL, heartbeat_timeout=HEARTBEAT_TIMEOUT,
+                 forward_distance=SHARD_FORWARD_DISTANCE, forward_interval=SHARD_FORWARD_INTERVAL, client=None,
+                 clock=None):
+        self.shard = shard
+        self.summary_interval = summary_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.forward_distance = forward_distance
+        self.forward_interval = forward_interval
+        self.client = client or create_client()
+        self.clock = clock or get_clock()
+        self.client.on_connect = self.on_connect
+        self.client.on_message = self.on_message
+        self.position_topic = shard_topic(shard, "position")
+        self.heartbeat_topic = shard_topic(shard, "heartbeat")
+        self.summary_topic = shard_topic(shard, "summary")
+
+        # Filled by the network thread, swapped out by publish_summary()
+        self.lock = threading.Lock()
+        # robot_id -> [x, y, heading, format, receive time, seq, t_fix, t_sent, tracked], newest only;
+        # the trace fields are None for untraced messages, tracked (PosePredictor.state()) without prediction
+        self.positions = {}
+        self.held = {}  # Newest positions within forward_distance of the last forwarded one, same entries
+        self.forwarded = {}  # robot_id -> (x, y, time) of the last position sent to the coordinator
+        self.alive = set()  # Robots whose heartbeats started (or resumed) since the last summary
+        self.left = set()
+        # Heartbeats always reach the robot's ID shard, so this worker alone decides when its robots go stale
+        self.last_seen = {}  # robot_id -> time of its last heartbeat
+        self.predictor = PosePredictor() if POSE_PREDICTION else None
+
+        # Statistics
+        self.messages = 0
+        self.summaries = 0
+        self.errors = 0
+        self.positions_forwarded = 0
+
+    def on_connect(self, client, userdata, flags, rc):
+        print(f"Shard {self.shard} connected to MQTT broker with result code {rc}")
+        if rc == 0:
+            self.client.subscribe([(self.position_topic, 0), (self.heartbeat_topic, 0)])
+            print(f"Subscribed to topics: {self.position_topic}, {self.heartbeat_topic}")
+        else:
+            print(f"Failed to connect to MQTT broker. Result code: {rc}")
+
+    def on_message(self, client, userdata, msg):
+        try:
+            if msg.topic == self.position_topic:
+                payload = decode_position(msg.payload)
+                received = self.clock.time()
+                entry = [payload["x"], payload["y"], payload["heading"], detect_format(msg.payload),
+                         received, payload.get("seq"), payload.get("t_fix"), payload.get("t_sent"), None]
+                robot_id = payload["id"]
+                with self.lock:
+                    if self.predictor is not None:
+                        # Every report feeds the tracker, including the ones held back below
+                        self.predictor.update(robot_id, (entry[0], entry[1]), entry[2], received)
+                    last = self.forwarded.get(robot_id)
+                    if (last is None or robot_id in self.positions
+                            or math.hypot(entry[0] - last[0], entry[1] - last[1]) >= self.forward_distance):
+                        self.positions[robot_id] = entry
+                        self.held.pop(robot_id, None)
+                    else:
+                        self.held[robot_id] = entry
+            elif msg.topic == self.heartbeat_topic:
+                payload = json.loads(msg.payload.decode("utf-8"))
+                robot_id = payload["id"]
+                with self.lock:
+                    if payload.get("status") == "offline":
+                        self.left.add(robot_id)
+                        self.alive.discard(robot_id)
+                        self.forget(robot_id)
+                    else:
+                        # Only the first heartbeat is news to the coordinator; the rest just keep the robot fresh
+                        if robot_id not in self.last_seen:
+                            self.alive.add(robot_id)
+                        self.last_seen[robot_id] = self.clock.time()
+        except json.JSONDecodeError as e:
+            self.errors += 1
+            print(f"Shard {self.shard}: failed to decode JSON payload: {e}")
+        except ValueError as e:
+            self.errors += 1
+            print(f"Shard {self.shard}: failed to decode payload: {e}")
+        self.messages += 1
+
+    def forget(self, robot_id):
+        """Drop everything kept about a robot that left or went stale. Call with lock held."""
+        self.last_seen.pop(robot_id, None)
+        self.held.pop(robot_id, None)
+        self.forwarded.pop(robot_id, None)
+        if self.predictor is not None:
+            self.predictor.remove(robot_id)
+
+    def expire(self, now):
+        """Forget robots whose last heartbeat is older than the timeout. Returns their IDs. Call with lock held."""
+        stale = [robot_id for robot_id, seen in self.last_seen.items() if now - seen > self.heartbeat_timeout]
+        for robot_id in stale:
+            self.forget(robot_id)
+        return stale
+
+    def release_held(self, now):
+        """Move held positions whose robot hasn't been forwarded for forward_interval into positions.
+        Call with lock held."""
+        due = [robot_id for robot_id in self.held if now - self.forwarded[robot_id][2] >= self.forward_interval]
+        for robot_id in due:
+            self.positions[robot_id] = self.held.pop(robot_id)
+
+    def publish_summary(self):
+        """Send everything received since the last summary as one message. Returns False if there was nothing."""
+        with self.lock:
+            now = self.clock.time()
+            stale = self.expire(now)
+            self.release_held(now)
+            positions, alive, left = self.positions, self.alive, self.left
+            self.positions, self.alive, self.left = {}, set(), set()
+            for robot_id, entry in positions.items():
+                self.forwarded[robot_id] = (entry[0], entry[1], now)
+                if self.predictor is not None and robot_id in self.predictor.rows:
+                    entry[8] = self.predictor.state(robot_id)
+        if not (positions or alive or left or stale):
+            return False
+        summary = {"shard": self.shard, "robots": positions, "alive": sorted(alive), "left": sorted(left),
+                   "stale": sorted(stale)}
+        self.client.publish(self.summary_topic, json.dumps(summary))
+        self.summaries += 1
+        self.positions_forwarded += len(positions)
+        return True
+
+    def run(self):
+        self.client.connect(MQTT_BROKER, MQTT_PORT, 60)
+        self.client.loop_start()
+        print(f"Shard {self.shard} forwarding to {self.summary_topic} every {self.summary_interval} s")
+        try:
+            while True:
+                self.clock.sleep(self.summary_interval)
+                self.publish_summary()
+        finally:
+            self.client.loop_stop()
+            print(f"Shard {self.shard} stopped: {self.messages} messages, {self.summaries} summaries, "
+                  f"{self.positions_forwarded} positions forwarded, {self.errors} errors")
+
+
+class ShardCoordinator(SwarmController):
+    """SwarmController fed by shard summaries instead of per-robot messages.
+
+    The workers decide liveness, so the coordinator never expires robots itself.
+    """
+
+    def __init__(self, num_shards=CONTROLLER_SHARDS, **kwargs):
+        super().__init__(**kwargs)
+        self.num_shards = num_shards
+        self.summary_filter = f"{MQTT_TOPIC_SHARD}/+/summary"
+        self.robot_shard = {}  # robot_id -> shard whose position was applied last
+        self.robot_updated = {}  # robot_id -> receive time of that position
+        self.handoffs = 0  # Robots that moved to another shard
+        self.summaries = 0
+
+    def on_connect(self, client, userdata, flags, rc):
+        print(f"Connected to MQTT broker with result code {rc}")
+        if rc == 0:
+            self.client.subscribe([(self.summary_filter, 0), (MQTT_TOPIC_TIME_REQUEST, 0)])
+            print(f"Subscribed to topics: {self.summary_filter}, {MQTT_TOPIC_TIME_REQUEST}")
+        else:
+            print(f"Failed to connect to MQTT broker. Result code: {rc}")
+
+    def apply_message(self, msg):
+        if topic_matches(self.summary_filter, msg.topic):
+            self.apply_summary(json.loads(msg.payload.decode("utf-8")))
+        else:
+            super().apply_message(msg)
+
+    def apply_summary(self, summary):
+        shard = summary["shard"]
+        for robot_id, (x, y, heading, fmt, received, seq, t_fix, t_sent, tracked) in summary["robots"].items():
+            # A summary from the robot's previous shard can arrive after one from its new shard
+            if received < self.robot_updated.get(robot_id, received):
+                continue
+            previous = self.robot_shard.get(robot_id)
+            if previous is not None and previous != shard:
+                self.handoffs += 1
+                if self.verbose:
+                    print(f"Robot {robot_id} moved from shard {previous} to shard {shard}")
+            self.robot_shard[robot_id] = shard
+            self.robot_updated[robot_id] = received
+            if seq is not None:
+                # Timed to when the worker received it, like the single-process controller
+                record_trace({"t_sent": t_sent}, "position_network", now=received)
+                self.robot_fixes[robot_id] = (seq, t_fix)
+            self.update_robot(robot_id, (x, y), heading, fmt, tracked)
+        for robot_id in summary["alive"]:
+            self.mark_alive(robot_id)
+        for robot_id in summary["left"]:
+            self.remove_robot(robot_id, "leave")
+        for robot_id in summary["stale"]:
+            self.remove_robot(robot_id, "stale")
+        self.summaries += 1
+
+    def check_liveness(self):
+        # Robots that only heartbeat are never refreshed here; their worker reports them stale instead
+        pass
+
+    def remove_robot(self, robot_id, reason):
+        super().remove_robot(robot_id, reason)
+        if robot_id not in self.last_seen:
+            self.robot_shard.pop(robot_id, None)
+            self.robot_updated.pop(robot_id, None)
+
+    def shard_counts(self):
+        """Number of robots currently owned by each shard."""
+        counts = [0] * self.num_shards
+        for shard in self.robot_shard.values():
+            counts[shard] += 1
+        return counts
+
+
+def run_worker(shard):
+    """Process entry point for one shard."""
+    try:
+        ShardWorker(shard).run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    if MQTT_TRANSPORT == TRANSPORT_LOCAL:
+        raise SystemExit("The sharded controller runs workers in separate processes and needs MQTT_TRANSPORT = 'paho'")
+
+    workers = [multiprocessing.Process(target=run_worker, args=(shard,), daemon=True)
+               for shard in range(CONTROLLER_SHARDS)]
+    for worker in workers:
+        worker.start()
+    print(f"Started {CONTROLLER_SHARDS} shard workers ({SHARD_PARTITION} partition)")
+
+    controller = ShardCoordinator(verbose=False)
+    controller.num_robots = int(input("Enter the number of robots: "))
+
+    # Set target position
+    target_x = float(input("Enter target X coordinate: "))
+    target_y = float(input("Enter target Y coordinate: "))
+    controller.target_position = (target_x, target_y)
+
+    try:
+        asyncio.run(controller.run())
+    except KeyboardInterrupt:
+        print(f"Stopping: {controller.summaries} summaries, {controller.handoffs} handoffs, "
+              f"robots per shard {controller.shard_counts()}")
+    finally:
+        for worker in workers:
+            worker.terminate()
+            worker.join()
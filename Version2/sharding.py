@@ -0,0 +1,57 @@
+"""
+Robot-to-shard partitioning for the sharded controller.
+
+With CONTROLLER_SHARDS > 1 robots publish on per-shard topics instead of the
+shared ones, so each controller worker only receives its own robots' traffic.
+Heartbeats and the offline will always go to the shard picked by robot ID,
+because the will topic is fixed when the robot connects. Positions go to the
+ID shard too, or in "region" mode to the shard owning the arena strip the
+robot is in, so a robot moves to another worker when it crosses a boundary.
+"""
+
+import zlib
+from config import (CONTROLLER_SHARDS, SHARD_PARTITION, ARENA_X_RANGE, MQTT_TOPIC_SHARD, MQTT_TOPIC_FOLLOWER_POSITION,
+                    MQTT_TOPIC_HEARTBEAT)
+
+PARTITION_HASH = "hash"
+PARTITION_REGION = "region"
+
+
+def shard_for_id(robot_id, num_shards=CONTROLLER_SHARDS):
+    """Stable shard for a robot ID (crc32, so every process agrees, unlike hash())."""
+    return zlib.crc32(robot_id.encode("utf-8")) % num_shards
+
+
+def shard_for_position(x, num_shards=CONTROLLER_SHARDS, x_range=ARENA_X_RANGE):
+    """Shard owning the arena strip containing x. Positions outside the arena go to the edge strips."""
+    low, high = x_range
+    index = int((x - low) / (high - low) * num_shards)
+    return max(0, min(num_shards - 1, index))
+
+
+def robot_shard(robot_id, position=None, num_shards=CONTROLLER_SHARDS, partition=SHARD_PARTITION):
+    """Shard that should receive this robot's position messages."""
+    if partition not in (PARTITION_HASH, PARTITION_REGION):
+        raise ValueError(f"Unknown shard partition '{partition}'")
+    if partition == PARTITION_REGION and position is not None and position[0] is not None:
+        return shard_for_position(position[0], num_shards)
+    return shard_for_id(robot_id, num_shards)
+
+
+def shard_topic(shard, kind):
+    """Topic of one shard, e.g. swarm/shard/2/position."""
+    return f"{MQTT_TOPIC_SHARD}/{shard}/{kind}"
+
+
+def position_topic(robot_id, position=None):
+    """Where a robot publishes its position."""
+    if CONTROLLER_SHARDS <= 1:
+        return MQTT_TOPIC_FOLLOWER_POSITION
+    return shard_topic(robot_shard(robot_id, position), "position")
+
+
+def heartbeat_topic(robot_id):
+    """Where a robot publishes heartbeats and sets its offline will."""
+    if CONTROLLER_SHARDS <= 1:
+        return MQTT_TOPIC_HEARTBEAT
+    return shard_topic(shard_for_id(robot_id), "heartbeat")
@@ -0,0 +1,363 @@
+"""
+Headless large-swarm simulation for SwarmController.
+
+Spawns N virtual robots with unicycle kinematics and noisy UWB fixes. They
+talk to the real SwarmController through the in-process LocalBroker from
+transport.py. Reports assignment latency, broker message rates, controller
+CPU time per tick and time-to-formation for each swarm size. With --waypoints
+the formation flies a mission of random waypoints and mission throughput is
+reported.
+
+With --virtual-time the whole run is driven from one thread on a
+VirtualClock, so simulated seconds cost only the CPU needed to compute them.
+
+With --shards the robots publish on per-shard topics and the controller is a
+ShardCoordinator fed by in-process ShardWorkers. In production each of those
+is its own process, so the run reports each one's CPU load (CPU seconds per
+simulated second) and the robot message rate the busiest of them could
+sustain. Comparing shard counts shows how far sharding raises that ceiling.
+
+Usage:
+    python simulate_swarm.py --robots 10 100 1000 --duration 60
+    python simulate_swarm.py --robots 1000 --shards 1 2 4 8 --virtual-time
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+from clock import SystemClock, VirtualClock, get_clock, set_clock
+from transport import LocalBroker, LocalClient
+from swarm_controller import SwarmController
+from sharded_controller import ShardCoordinator, ShardWorker
+from sharding import robot_shard, shard_for_id, shard_topic
+from pose_predictor import PosePredictor
+from mission import FORMATION
+from latency import get_recorder, record_trace
+from codec import FORMAT_BINARY, encode_position, decode_snapshot, decode_target
+from navigation import normalize_angle
+from config import (MQTT_TOPIC_FOLLOWER_POSITION, MQTT_TOPIC_HEARTBEAT, MQTT_TOPIC_SNAPSHOT, HEARTBEAT_INTERVAL,
+                    TARGET_TOLERANCE, TELEMETRY_RATE, TELEMETRY_MIN_DISTANCE, SHARD_PARTITION, SHARD_SUMMARY_INTERVAL)
+
+# Simulation parameters
+SIM_STEP = 0.05  # Seconds between physics updates
+MAX_SPEED = 0.2  # Forward speed in m/s
+MAX_TURN_RATE = 2.0  # rad/s
+TURN_GAIN = 3.0  # Proportional heading gain
+UWB_RATE = 10.0  # UWB fixes per second (DWM1001 streams at about 10 Hz)
+UWB_NOISE = 0.03  # Standard deviation of UWB position noise in meters
+
+
+class SimRobot:
+    """A virtual Zumo: unicycle kinematics, noisy UWB, and the robot side of the MQTT protocol."""
+
+    def __init__(self, robot_id, broker, x, y, heading, rng, shards=1):
+        self.robot_id = robot_id
+        self.rng = rng
+        self.shards = shards
+        self.heartbeat_topic = (shard_topic(shard_for_id(robot_id, shards), "heartbeat") if shards > 1
+                                else MQTT_TOPIC_HEARTBEAT)
+        self.published = 0
+        self.x, self.y, self.heading = x, y, heading
+        self.fix = (None, None)
+        self.fix_seq = 0
+        self.fix_time = None
+        self.next_fix = 0.0
+        self.next_heartbeat = 0.0
+        self.next_telemetry = 0.0
+        self.last_published = None
+
+        self.target = None
+        self.target_received_at = None  # Time the first target arrived
+
+        self.client = LocalClient(broker)
+        self.client.on_message = self.on_message
+        self.client.connect()
+        self.client.subscribe(f"swarm/target/{robot_id}")
+        self.client.subscribe(MQTT_TOPIC_SNAPSHOT)
+
+    def on_message(self, client, userdata, msg):
+        if msg.topic == MQTT_TOPIC_SNAPSHOT:
+            snapshot = decode_snapshot(msg.payload)
+            record_trace(snapshot, "snapshot_network")
+            entry = snapshot["targets"].get(self.robot_id)
+        else:
+            payload = decode_target(msg.payload)
+            record_trace(payload, "target_network", "fix_to_target")
+            entry = (payload["x"], payload["y"])
+        if entry is not None:
+            self.target = entry
+            if self.target_received_at is None:
+                self.target_received_at = get_clock().time()
+
+    def communicate(self, now):
+        """Deliver due messages, then send heartbeats and position telemetry."""
+        self.client.loop(timeout=0)
+        if now >= self.next_fix:
+            self.fix = (self.x + self.rng.gauss(0, UWB_NOISE), self.y + self.rng.gauss(0, UWB_NOISE))
+            self.fix_seq += 1
+            self.fix_time = now
+            self.next_fix = now + 1.0 / UWB_RATE
+        if now >= self.next_heartbeat:
+            self.client.publish(self.heartbeat_topic, json.dumps({"id": self.robot_id, "status": "alive"}))
+            self.published += 1
+            self.next_heartbeat = now + HEARTBEAT_INTERVAL
+        if now >= self.next_telemetry:
+            self.next_telemetry = now + 1.0 / TELEMETRY_RATE
+            if self.last_published is None or math.dist(self.fix, self.last_published) >= TELEMETRY_MIN_DISTANCE:
+                trace = (self.fix_seq, self.fix_time, now)
+                get_recorder().record("uwb_to_publish", now - self.fix_time)
+                self.client.publish(self.position_topic(),
+                                    encode_position(self.robot_id, self.fix[0], self.fix[1], self.heading,
+                                                    FORMAT_BINARY, trace))
+                self.published += 1
+                self.last_published = self.fix
+
+    def position_topic(self):
+        if self.shards <= 1:
+            return MQTT_TOPIC_FOLLOWER_POSITION
+        return shard_topic(robot_shard(self.robot_id, self.fix, self.shards, SHARD_PARTITION), "position")
+
+    def step(self, dt):
+        """Drive toward the target using the noisy UWB fix, like the real robot does."""
+        if self.target is None or self.fix == (None, None):
+            return
+        dx = self.target[0] - self.fix[0]
+        dy = self.target[1] - self.fix[1]
+        if math.hypot(dx, dy) <= TARGET_TOLERANCE:
+            return
+        gamma = normalize_angle(math.atan2(dy, dx) - self.heading)
+        turn_rate = max(-MAX_TURN_RATE, min(MAX_TURN_RATE, TURN_GAIN * gamma))
+        speed = MAX_SPEED * max(0.0, math.cos(gamma))
+        self.heading = normalize_angle(self.heading + turn_rate * dt)
+        self.x += speed * math.cos(self.heading) * dt
+        self.y += speed * math.sin(self.heading) * dt
+
+    def at_target(self):
+        return self.target is not None and math.hypot(self.target[0] - self.x, self.target[1] - self.y) <= TARGET_TOLERANCE
+
+
+def timed_handler(handler, samples):
+    """Wrap a message handler to record the CPU time each call spends."""
+    def wrapper(*args):
+        start = time.thread_time()
+        handler(*args)
+        samples.append(time.thread_time() - start)
+    return wrapper
+
+
+def prediction_stats(predictors):
+    """Residual stats over several predictors (one per shard worker when sharded), or None without prediction."""
+    if predictors[0] is None:
+        return None
+    if len(predictors) == 1:
+        return predictors[0].residual_stats()
+    combined = PosePredictor()
+    combined.residuals = [residual for predictor in predictors for residual in predictor.residuals]
+    combined.stale_residuals = [residual for predictor in predictors for residual in predictor.stale_residuals]
+    return combined.residual_stats()
+
+
+def timed_call(function, samples):
+    """Call function and record the CPU time it spent."""
+    start = time.thread_time()
+    function()
+    samples.append(time.thread_time() - start)
+
+
+async def simulate(num_robots, duration, tick_period, arena, latency, seed, virtual=False, waypoints=0, shards=1):
+    clock = VirtualClock() if virtual else SystemClock()
+    set_clock(clock)
+    rng = random.Random(seed)
+    broker = LocalBroker(latency=latency, seed=seed)
+
+    workers = []
+    worker_cpu = []  # Per worker: CPU time of each message handled and each summary sent
+    if shards > 1:
+        controller = ShardCoordinator(num_shards=shards, client=LocalClient(broker), verbose=False)
+        for shard in range(shards):
+            worker = ShardWorker(shard, client=LocalClient(broker))
+            worker_cpu.append([])
+            worker.client.on_message = timed_handler(worker.on_message, worker_cpu[-1])
+            worker.client.connect()
+            if not virtual:
+                worker.client.loop_start()
+            workers.append(worker)
+    else:
+        controller = SwarmController(client=LocalClient(broker), verbose=False)
+    controller.num_robots = num_robots
+    controller.target_position = (0.0, 0.0)
+    message_cpu = []
+    controller.handle_message = timed_handler(controller.handle_message, message_cpu)
+    controller.bind_loop()
+    controller.client.connect()
+    if not virtual:
+        controller.client.loop_start()
+
+    robots = [SimRobot(f"robot_{i + 1}", broker, rng.uniform(-arena / 2, arena / 2),
+                       rng.uniform(-arena / 2, arena / 2), rng.uniform(-math.pi, math.pi), rng, shards)
+              for i in range(num_robots)]
+    if waypoints:
+        legs = [(rng.uniform(-arena / 2, arena / 2), rng.uniform(-arena / 2, arena / 2)) for _ in range(waypoints)]
+        controller.mission.add(FORMATION, [controller.target_position] + legs)
+
+    wall_start = time.perf_counter()
+    start = clock.time()
+    last_step = start
+    next_tick = start
+    next_snapshot = start
+    next_summary = start
+    tick_cpu = []
+    controller_cpu = []  # Tick and snapshot CPU time, without the message handling tick_cpu folds in
+    messages_at_last_tick = 0
+    all_joined_at = None
+    formation_at = None
+
+    while clock.time() - start < duration:
+        now = clock.time()
+        dt = now - last_step
+        last_step = now
+        for robot in robots:
+            robot.communicate(now)
+            robot.step(dt)
+        if virtual:
+            # Single-threaded: the workers and the controller handle their messages here instead of in network threads
+            for worker in workers:
+                worker.client.loop(timeout=0)
+            controller.client.loop(timeout=0)
+            # Let the handed-over messages run on the event loop
+            await asyncio.sleep(0)
+
+        if all_joined_at is None and len(controller.follower_positions) == num_robots:
+            all_joined_at = now
+        mission_done = not waypoints or FORMATION in controller.mission.finished
+        if formation_at is None and mission_done and all(robot.at_target() for robot in robots):
+            formation_at = now - start
+            break
+
+        if workers and now >= next_summary:
+            # Summaries run on their own timer, as in ShardWorker.run()
+            for worker, samples in zip(workers, worker_cpu):
+                timed_call(worker.publish_summary, samples)
+            next_summary += SHARD_SUMMARY_INTERVAL
+        if now >= next_tick:
+            cpu_start = time.thread_time()
+            await controller.tick()
+            controller_cpu.append(time.thread_time() - cpu_start)
+            # Per-tick cost includes the message handling done since the previous tick
+            handled = len(message_cpu)
+            tick_cpu.append(controller_cpu[-1] + sum(message_cpu[messages_at_last_tick:handled]))
+            messages_at_last_tick = handled
+            next_tick += tick_period
+        if controller.use_snapshot and now >= next_snapshot:
+            # Snapshots run on their own timer, as in SwarmController.snapshot_loop()
+            timed_call(controller.publish_snapshot, controller_cpu)
+            next_snapshot += controller.snapshot_interval
+
+        if virtual:
+            clock.advance(SIM_STEP)
+        else:
+            await asyncio.sleep(max(0.0, SIM_STEP - (clock.time() - now)))
+
+    elapsed = clock.time() - start
+    wall_time = time.perf_counter() - wall_start
+    if not virtual:
+        controller.client.loop_stop()
+        for worker in workers:
+            worker.client.loop_stop()
+    set_clock(SystemClock())
+
+    # CPU seconds per simulated second for each process. Message handling grows with the robot message rate,
+    # ticks and snapshots don't; the process that saturates first caps the sustainable rate
+    robot_messages_per_s = sum(robot.published for robot in robots) / elapsed
+    fixed_load = sum(controller_cpu) / elapsed
+    controller_load = fixed_load + sum(message_cpu) / elapsed
+    worker_load = max(sum(samples) for samples in worker_cpu) / elapsed if workers else None
+    capacities = []
+    if controller_load > fixed_load:
+        capacities.append(robot_messages_per_s * max(0.0, 1.0 - fixed_load) / (controller_load - fixed_load))
+    if worker_load:
+        capacities.append(robot_messages_per_s / worker_load)
+
+    received = [robot.target_received_at for robot in robots if robot.target_received_at is not None]
+    assignment_latency = None
+    if all_joined_at is not None and len(received) == num_robots:
+        assignment_latency = max(max(received) - all_joined_at, 0.0)
+
+    return {
+        "robots": num_robots,
+        "elapsed": elapsed,
+        "wall_time": wall_time,
+        "assignment_latency": assignment_latency,
+        "published_per_s": broker.published / elapsed,
+        "delivered_per_s": broker.delivered / elapsed,
+        "tick_cpu_mean": sum(tick_cpu) / len(tick_cpu) if tick_cpu else 0.0,
+        "tick_cpu_max": max(tick_cpu) if tick_cpu else 0.0,
+        "message_cpu_mean": sum(message_cpu) / len(message_cpu) if message_cpu else 0.0,
+        "handling_latency_p99": controller.handling_latency_stats()["p99"],
+        "shards": shards,
+        "controller_messages": controller.messages_handled,
+        "robot_messages_per_s": robot_messages_per_s,
+        "controller_load": controller_load,
+        "worker_load": worker_load,
+        "capacity_per_s": min(capacities) if capacities else None,
+        "time_to_formation": formation_at,
+        "in_formation": sum(robot.at_target() for robot in robots),
+        "waypoints_per_minute": controller.mission.completed * 60.0 / elapsed,
+        "prediction": prediction_stats([worker.predictor for worker in workers] if workers else [controller.predictor])
+    }
+
+
+def format_seconds(value, scale=1.0, unit="s"):
+    return "-" if value is None else f"{value * scale:.2f}{unit}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a large swarm against SwarmController.")
+    parser.add_argument("--robots", type=int, nargs="+", default=[10, 100, 1000], help="swarm sizes to simulate")
+    parser.add_argument("--duration", type=float, default=60.0, help="maximum seconds per run")
+    parser.add_argument("--tick", type=float, default=1.0, help="controller tick period in seconds")
+    parser.add_argument("--arena", type=float, default=4.0, help="side of the square spawn area in meters")
+    parser.add_argument("--latency", type=float, default=0.002, help="broker delivery latency in seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--virtual-time", action="store_true", help="run on a virtual clock, as fast as possible")
+    parser.add_argument("--waypoints", type=int, default=0, help="random formation waypoints after the first target")
+    parser.add_argument("--latency-report", action="store_true", help="print per-stage latency histograms")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1],
+                        help="shard counts to compare; 1 runs the single-process controller")
+    args = parser.parse_args()
+
+    print(f"{'robots':>7} {'assign':>9} {'pub/s':>9} {'deliv/s':>10} {'tick cpu':>10} {'tick max':>10} "
+          f"{'msg cpu':>9} {'msg p99':>9} {'formation':>10} {'in place':>9} {'wp/min':>7} {'wall':>8}")
+    for num_robots in args.robots:
+        for shards in args.shards:
+            result = asyncio.run(simulate(num_robots, args.duration, args.tick, args.arena, args.latency, args.seed,
+                                          args.virtual_time, args.waypoints, shards))
+            print(f"{result['robots']:>7} {format_seconds(result['assignment_latency']):>9} "
+                  f"{result['published_per_s']:>9.0f} {result['delivered_per_s']:>10.0f} "
+                  f"{format_seconds(result['tick_cpu_mean'], 1000, 'ms'):>10} "
+                  f"{format_seconds(result['tick_cpu_max'], 1000, 'ms'):>10} "
+                  f"{format_seconds(result['message_cpu_mean'], 1e6, 'us'):>9} "
+                  f"{format_seconds(result['handling_latency_p99'], 1000, 'ms'):>9} "
+                  f"{format_seconds(result['time_to_formation']):>10} "
+                  f"{result['in_formation']:>5}/{result['robots']} {result['waypoints_per_minute']:>7.1f} "
+                  f"{format_seconds(result['wall_time']):>8}")
+            if result["prediction"] is not None:
+                stats = result["prediction"]
+                print(f"        pose prediction residual mean {stats['mean'] * 100:.1f} cm, p95 {stats['p95'] * 100:.1f} cm "
+                      f"(last report as-is: {stats['stale_mean'] * 100:.1f} cm)")
+            if len(args.shards) > 1 or shards > 1:
+                worker_load = "-" if result["worker_load"] is None else f"{result['worker_load']:.3f}"
+                capacity = "-" if result["capacity_per_s"] is None else f"{result['capacity_per_s']:.0f}"
+                print(f"        {shards} shard(s): controller load {result['controller_load']:.3f}, "
+                      f"busiest worker load {worker_load}, {result['controller_messages']} controller messages; "
+                      f"sustains {capacity} robot msg/s (offered {result['robot_messages_per_s']:.0f})")
+    if args.latency_report:
+        # Summed over every run
+        get_recorder().dump()
+
+
+if __name__ == "__main__":
+    main()
@@ -136,12 +136,27 @@
 import asyncio
 import json
 import math
-import paho.mqtt.client as mqtt
-from config import MQTT_BROKER, MQTT_PORT, MQTT_TOPIC_LEADER_POSITION, MQTT_TOPIC_FOLLOWER_POSITION, MQTT_TOPIC_TARGET, MQTT_TOPIC_FORMATION
+import time
+from collections import deque
+from transport import create_client
+from clock import get_clock
+from publish_scheduler import PublishScheduler
+from mission import FORMATION, MissionQueue
+from latency import get_recorder, dump_on_exit, record_trace
+from clock_sync import MQTT_TOPIC_TIME_REQUEST, ClockSyncServer
+from pose_predictor import PosePredictor
+from codec import FORMAT_JSON, FORMAT_BINARY, detect_format, decode_position, encode_target, encode_snapshot
+from config import (MQTT_BROKER, MQTT_PORT, MQTT_TOPIC_LEADER_POSITION, MQTT_TOPIC_FOLLOWER_POSITION, MQTT_TOPIC_TARGET,
+                    MQTT_TOPIC_FORMATION, MQTT_TOPIC_HEARTBEAT, MQTT_TOPIC_SNAPSHOT, HEARTBEAT_TIMEOUT, STARTUP_TIMEOUT,
+                    USE_SNAPSHOT_TOPIC, SNAPSHOT_INTERVAL, SNAPSHOT_KEYFRAME_INTERVAL, TARGET_TOLERANCE, TARGET_PUBLISH_RATE,
+                    TARGET_PUBLISH_BURST, LATENCY_TRACE, POSE_PREDICTION)
 
 class SwarmController:
-    def __init__(self):
-        self.client = mqtt.Client()
+    def __init__(self, heartbeat_timeout=HEARTBEAT_TIMEOUT, use_snapshot=USE_SNAPSHOT_TOPIC,
+                 keyframe_interval=SNAPSHOT_KEYFRAME_INTERVAL, client=None, verbose=True, clock=None,
+                 snapshot_interval=SNAPSHOT_INTERVAL):
+        self.client = client or create_client()
+        self.clock = clock or get_clock()
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
 
@@ -153,34 +168,282 @@ class SwarmController:
         self.formation_mode = "single"
         self.robot_headings = {}
         self.formation_spacing = 0.2  # meters between robots in formation
+        self.verbose = verbose  # Per-message logging; turn off for large swarms
+
+        # Liveness tracking
+        self.heartbeat_timeout = heartbeat_timeout
+        self.last_seen = {}
+        self.membership_changed = False
+        self.membership_events = {"join": 0, "leave": 0, "stale": 0}
+        self.stale_robots = {}  # robot_id -> (position, heading, fmt) when dropped as stale, so a heartbeat can bring it back
+
+        # Last target and formation sent, so reassignment only publishes what changed
+        self.assigned_targets = {}
+        self.assigned_formation = None
+
+        # Payload format each robot reported in; targets are sent back in the same format
+        self.robot_formats = {}
+
+        # Aggregated snapshot topic: one message every snapshot_interval seconds, keyframes plus deltas
+        self.use_snapshot = use_snapshot
+        self.snapshot_interval = snapshot_interval
+        self.keyframe_interval = keyframe_interval
+        self.snapshot_seq = 0
+        self.snapshot_targets = {}  # Targets as of the last snapshot sent
+
+        # Per-robot targets go through a latest-wins queue under a global rate budget
+        self.scheduler = PublishScheduler(self.client, TARGET_PUBLISH_RATE, TARGET_PUBLISH_BURST, self.clock)
+
+        # Waypoint missions; the formation centre follows the FORMATION waypoints
+        self.mission = MissionQueue(clock=self.clock)
+        self.mission_changed = False  # Formation waypoint advanced: reassign every robot
+        self.formation_near = set()  # Formation robots within the completion radius of their slot
+
+        # All state is owned by the asyncio event loop. paho callbacks run on the
+        # network thread and only hand messages over; see bind_loop().
+        self.loop = None
+        self.all_reported = None  # asyncio.Event: num_robots robots have reported
+        self.membership_event = None  # asyncio.Event: wakes run() on join/leave
+        self.reached_events = {}  # robot_id -> asyncio.Event set when it reaches its target
+        self.handling_latency = deque(maxlen=1000)  # Seconds from receipt to handled, most recent messages
+        self.robot_fixes = {}  # robot_id -> (fix seq, fix time) of its latest traced position, echoed in its targets
+
+        # Robots' poses extrapolated to planning time
+        self.predictor = PosePredictor() if POSE_PREDICTION else None
+
+        # Answers robots' clock sync requests; this controller's clock is the swarm's reference time
+        self.clock_sync = ClockSyncServer(self.client, self.clock)
+        self.messages_handled = 0
+
+    def bind_loop(self, loop=None):
+        """Attach to the running event loop; from now on messages are handled on it."""
+        self.loop = loop or asyncio.get_running_loop()
+        self.all_reported = asyncio.Event()
+        self.membership_event = asyncio.Event()
+        self.reached_events = {robot_id: asyncio.Event() for robot_id in self.follower_positions}
+        for robot_id in self.robots_reached_target:
+            self.reached_events[robot_id].set()
+        self.update_events()
 
     def on_connect(self, client, userdata, flags, rc):
         print(f"Connected to MQTT broker with result code {rc}")
         if rc == 0:
             self.client.subscribe(MQTT_TOPIC_FOLLOWER_POSITION)
             print(f"Subscribed to topic: {MQTT_TOPIC_FOLLOWER_POSITION}")
+            self.client.subscribe(MQTT_TOPIC_HEARTBEAT)
+            print(f"Subscribed to topic: {MQTT_TOPIC_HEARTBEAT}")
+            self.client.subscribe(MQTT_TOPIC_TIME_REQUEST)
+            print(f"Subscribed to topic: {MQTT_TOPIC_TIME_REQUEST}")
         else:
             print(f"Failed to connect to MQTT broker. Result code: {rc}")
 
     def on_message(self, client, userdata, msg):
-        try:
-            payload = json.loads(msg.payload.decode("utf-8"))
-            print(f"Received message on topic {msg.topic}: {payload}")
+        """paho callback: hand the message to the event loop so handling is serialized there."""
+        if msg.topic == MQTT_TOPIC_TIME_REQUEST:
+            # Answered right here: time spent queued for the event loop would count as network delay
+            self.clock_sync.handle_request(msg, self.clock.time())
+            return
+        received = time.perf_counter()
+        if self.loop is None:
+            self.handle_message(msg, received)
+        else:
+            self.loop.call_soon_threadsafe(self.handle_message, msg, received)
 
-            if msg.topic == MQTT_TOPIC_FOLLOWER_POSITION:
-                self.follower_positions[payload["id"]] = (payload["x"], payload["y"])
-                self.robot_headings[payload["id"]] = payload["heading"]
-                print(f"Updated positions: {self.follower_positions}")
+    def handle_message(self, msg, received=None):
+        """Apply one MQTT message to the controller state. Runs on the event loop."""
+        try:
+            self.apply_message(msg)
         except json.JSONDecodeError as e:
             print(f"Failed to decode JSON payload: {e}")
+        except ValueError as e:
+            print(f"Failed to decode payload: {e}")
+        self.update_events()
+        if received is not None:
+            self.handling_latency.append(time.perf_counter() - received)
+            if LATENCY_TRACE:
+                get_recorder().record("controller_queue", self.handling_latency[-1])
+        self.messages_handled += 1
+
+    def apply_message(self, msg):
+        """Update positions and liveness from a position or heartbeat message."""
+        if msg.topic == MQTT_TOPIC_FOLLOWER_POSITION:
+            payload = decode_position(msg.payload)
+            if self.verbose:
+                print(f"Received message on topic {msg.topic}: {payload}")
+            if payload.get("seq") is not None:
+                record_trace(payload, "position_network")
+                self.robot_fixes[payload["id"]] = (payload["seq"], payload["t_fix"])
+            self.update_robot(payload["id"], (payload["x"], payload["y"]), payload["heading"],
+                              detect_format(msg.payload))
+            if self.verbose:
+                print(f"Updated positions: {self.follower_positions}")
+        elif msg.topic == MQTT_TOPIC_HEARTBEAT:
+            payload = json.loads(msg.payload.decode("utf-8"))
+            # "alive" and "done" (holding its final target) both keep a robot in the swarm
+            if payload.get("status") == "offline":
+                self.remove_robot(payload["id"], "leave")
+            else:
+                self.mark_alive(payload["id"])
+
+    def update_robot(self, robot_id, position, heading, fmt, tracked=None):
+        """Record a reported pose; the robot counts as alive and may have reached its target.
+
+        tracked is the predictor state already estimated upstream (PosePredictor.state()), if any.
+        """
+        self.robot_formats[robot_id] = fmt
+        self.follower_positions[robot_id] = position
+        self.robot_headings[robot_id] = heading
+        if self.predictor is not None:
+            if tracked is None:
+                self.predictor.update(robot_id, position, heading, self.clock.time())
+            else:
+                self.predictor.set_state(robot_id, *tracked)
+        self.mark_alive(robot_id)
+        self.check_reached(robot_id)
+        self.check_mission(robot_id)
+
+    def handling_latency_stats(self):
+        """Mean, p99 and max per-message handling latency (receipt to handled) in seconds."""
+        samples = sorted(self.handling_latency)
+        if not samples:
+            return {"count": self.messages_handled, "mean": 0.0, "p99": 0.0, "max": 0.0}
+        return {
+            "count": self.messages_handled,
+            "mean": sum(samples) / len(samples),
+            "p99": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+            "max": samples[-1]
+        }
+
+    def update_events(self):
+        """Set the asyncio events that match the current state."""
+        if self.loop is None:
+            return
+        if self.num_robots and len(self.follower_positions) >= self.num_robots:
+            self.all_reported.set()
+        if self.membership_changed or self.mission_changed:
+            self.membership_event.set()
+
+    def check_reached(self, robot_id):
+        """Mark a robot as at its target once its reported position is within tolerance."""
+        target = self.assigned_targets.get(robot_id)
+        if target is None or robot_id in self.robots_reached_target:
+            return
+        if self.calculate_distance(self.follower_positions[robot_id], target) <= TARGET_TOLERANCE:
+            self.robots_reached_target.add(robot_id)
+            if self.loop is not None:
+                self.reached_events.setdefault(robot_id, asyncio.Event()).set()
+            if self.verbose:
+                print(f"Robot {robot_id} reached its target {target}")
+
+    def check_mission(self, robot_id):
+        """Send the next waypoint once a robot, or the whole formation, is close enough to the current one."""
+        if self.mission.active(robot_id):
+            target = self.mission.current[robot_id]
+            radius = self.mission.completion_radius(robot_id, TARGET_TOLERANCE)
+            if self.calculate_distance(self.follower_positions[robot_id], target) <= radius:
+                if self.mission.complete(robot_id):
+                    self.send_target(robot_id, self.mission.current[robot_id])
+            return
+
+        target = self.assigned_targets.get(robot_id)
+        if not self.mission.active(FORMATION) or target is None or robot_id in self.mission.current:
+            return
+        radius = self.mission.completion_radius(FORMATION, TARGET_TOLERANCE)
+        if self.calculate_distance(self.follower_positions[robot_id], target) > radius:
+            self.formation_near.discard(robot_id)
+            return
+        self.formation_near.add(robot_id)
+        # Robots on their own mission don't hold up the formation
+        own_missions = len(self.mission.current) - (FORMATION in self.mission.current)
+        if len(self.formation_near) >= len(self.follower_positions) - own_missions:
+            self.formation_near.clear()
+            if self.mission.complete(FORMATION):
+                self.target_position = self.mission.current[FORMATION]
+                self.mission_changed = True
+                if self.verbose:
+                    print(f"Formation moving on to waypoint {self.target_position}")
+
+    async def wait_for_robots(self, timeout=None):
+        """Wait until num_robots robots have reported. Returns False on timeout."""
+        return await self.clock.async_wait(self.all_reported, timeout)
+
+    async def wait_for_target_reached(self, robot_id, timeout=None):
+        """Wait until robot_id reports a position within tolerance of its target. Returns False on timeout."""
+        event = self.reached_events.setdefault(robot_id, asyncio.Event())
+        return await self.clock.async_wait(event, timeout)
+
+    def mark_alive(self, robot_id):
+        """Record a heartbeat. A robot joins once it has reported a position; one dropped as stale
+        rejoins at its last reported position."""
+        rejoined = self.stale_robots.pop(robot_id, None)
+        if robot_id not in self.follower_positions:
+            if rejoined is None:
+                return
+            # A robot holding its final target only heartbeats, so its last report is all there will be
+            position, heading, fmt = rejoined
+            self.robot_formats[robot_id] = fmt
+            self.follower_positions[robot_id] = position
+            self.robot_headings[robot_id] = heading
+            if self.predictor is not None:
+                self.predictor.update(robot_id, position, heading, self.clock.time())
+        if robot_id not in self.last_seen:
+            self.membership_events["join"] += 1
+            self.membership_changed = True
+            if self.verbose:
+                print(f"Robot {robot_id} joined the swarm")
+        self.last_seen[robot_id] = self.clock.time()
+
+    def remove_robot(self, robot_id, reason):
+        """Drop a robot from the swarm. reason is 'leave' or 'stale'."""
+        self.stale_robots.pop(robot_id, None)
+        if robot_id not in self.last_seen:
+            return
+        if reason == "stale" and robot_id in self.follower_positions:
+            self.stale_robots[robot_id] = (self.follower_positions[robot_id], self.robot_headings[robot_id],
+                                           self.robot_formats[robot_id])
+        del self.last_seen[robot_id]
+        self.follower_positions.pop(robot_id, None)
+        self.robot_headings.pop(robot_id, None)
+        self.assigned_targets.pop(robot_id, None)
+        self.robot_formats.pop(robot_id, None)
+        self.robots_reached_target.discard(robot_id)
+        self.reached_events.pop(robot_id, None)
+        self.scheduler.cancel(robot_id)
+        self.formation_near.discard(robot_id)
+        self.robot_fixes.pop(robot_id, None)
+        if self.predictor is not None:
+            self.predictor.remove(robot_id)
+        self.membership_events[reason] += 1
+        self.membership_changed = True
+        print(f"Robot {robot_id} removed from the swarm ({reason})")
+
+    def check_liveness(self):
+        """Remove robots whose last heartbeat is older than the timeout."""
+        now = self.clock.time()
+        for robot_id, seen in list(self.last_seen.items()):
+            if now - seen > self.heartbeat_timeout:
+                self.remove_robot(robot_id, "stale")
+
+    def planning_positions(self):
+        """Robot positions to plan with: predicted to now when prediction is on, else the last reports."""
+        if self.predictor is None:
+            return self.follower_positions
+        return self.predictor.predict_positions(self.clock.time())
 
     async def assign_roles(self):
         """Assign roles (leader/follower) and send target positions."""
+        if FORMATION in self.mission.current:
+            self.target_position = self.mission.current[FORMATION]
         if self.target_position:
+            self.membership_changed = False
+            self.mission_changed = False
+            self.num_robots = len(self.follower_positions)
+            self.get_formation_mode()
+
             # Assign the closest robot as the leader
             closest_robot = None
             min_distance = float('inf')
-            for robot_id, position in self.follower_positions.items():
+            for robot_id, position in self.planning_positions().items():
                 distance = self.calculate_distance(position, self.target_position)
                 if distance < min_distance:
                     min_distance = distance
@@ -190,28 +453,84 @@ class SwarmController:
                 # Assign roles
                 roles = {robot_id: "follower" for robot_id in self.follower_positions.keys() if robot_id != closest_robot}
                 roles[closest_robot] = "leader"
-                print(f"Assigned roles: {roles}")
+                if self.verbose:
+                    print(f"Assigned roles: {roles}")
 
-                # Publish roles to swarm/formation
-                self.client.publish(MQTT_TOPIC_FORMATION, json.dumps({
-                    "mode": self.get_formation_mode(),
+                # Publish roles to swarm/formation when they changed
+                formation = {
+                    "mode": self.formation_mode,
                     "leader": closest_robot,
                     "roles": roles
-                }))
-                print(f"Sent roles to {MQTT_TOPIC_FORMATION}")
+                }
+                if formation != self.assigned_formation:
+                    self.client.publish(MQTT_TOPIC_FORMATION, json.dumps(formation))
+                    self.assigned_formation = formation
+                    if self.verbose:
+                        print(f"Sent roles to {MQTT_TOPIC_FORMATION}")
 
                 # Calculate and publish target positions for each robot
                 for robot_id, role in roles.items():
-                    if role == "leader":
+                    if robot_id in self.mission.current:
+                        # Robots with their own waypoints follow those instead of the formation
+                        target = self.mission.current[robot_id]
+                    elif role == "leader":
                         # Leader gets the original target position
                         target = self.target_position
                     else:
                         # Followers get positions based on formation
                         target = self.calculate_formation_position(robot_id, closest_robot, self.target_position)
+                    self.send_target(robot_id, target)
+
+    def send_target(self, robot_id, target):
+        """Give a robot a new target. Nothing is sent if the target is unchanged."""
+        # Only robots whose target moved need a new message
+        if self.assigned_targets.get(robot_id) == target:
+            return
+
+        self.assigned_targets[robot_id] = target
+        self.robots_reached_target.discard(robot_id)
+        if robot_id in self.reached_events:
+            self.reached_events[robot_id].clear()
+        self.check_reached(robot_id)
+        if self.use_snapshot:
+            # Delivered with the next snapshot
+            return
+
+        # Publish target position to the robot
+        fmt = self.robot_formats.get(robot_id, FORMAT_JSON)
+        # Echo the fix this target is based on, so the robot can time the whole loop
+        fix = self.robot_fixes.get(robot_id) if LATENCY_TRACE else None
+        trace = (fix[0], fix[1], self.clock.time()) if fix is not None else None
+        self.scheduler.submit(robot_id, f"swarm/target/{robot_id}", encode_target(target[0], target[1], fmt, trace))
+        if self.verbose:
+            print(f"Sent target position to robot {robot_id}: {target}")
+
+    def publish_snapshot(self):
+        """Publish every robot's target and the formation mode as a single message.
+
+        Every keyframe_interval snapshots the snapshot holds all robots; otherwise it
+        only holds robots whose target changed and robots that left. Binary
+        encoding is used only when every robot reported in binary.
+        """
+        keyframe = self.snapshot_seq % self.keyframe_interval == 0
+        if keyframe:
+            targets = dict(self.assigned_targets)
+        else:
+            targets = {robot_id: target for robot_id, target in self.assigned_targets.items()
+                       if self.snapshot_targets.get(robot_id) != target}
+        removed = [robot_id for robot_id in self.snapshot_targets if robot_id not in self.assigned_targets]
 
-                    # Publish target position to the robot
-                    self.client.publish(f"swarm/target/{robot_id}", json.dumps({"x": target[0], "y": target[1]}))
-                    print(f"Sent target position to robot {robot_id}: {target}")
+        formats = set(self.robot_formats.values())
+        fmt = FORMAT_BINARY if formats == {FORMAT_BINARY} else FORMAT_JSON
+        sent_time = self.clock.time() if LATENCY_TRACE else None
+        payload = encode_snapshot(self.snapshot_seq, keyframe, self.formation_mode, targets, removed, fmt, sent_time)
+
+        self.snapshot_targets = dict(self.assigned_targets)
+        self.snapshot_seq = (self.snapshot_seq + 1) & 0xFFFFFFFF
+
+        self.client.publish(MQTT_TOPIC_SNAPSHOT, payload)
+        if self.verbose and (targets or removed):
+            print(f"Sent {'keyframe' if keyframe else 'delta'} snapshot: {len(targets)} targets, {len(removed)} removed")
 
     def calculate_distance(self, pos1, pos2):
         """Calculate the Euclidean distance between two positions."""
@@ -277,20 +596,53 @@ class SwarmController:
 
     async def run(self):
         """Main loop for the swarm controller."""
+        self.bind_loop()
         self.client.connect(MQTT_BROKER, MQTT_PORT, 60)
         self.client.loop_start()
+        self.scheduler_task = asyncio.create_task(self.scheduler.run())
 
-        # Wait for all robots to report initial positions
-        while len(self.follower_positions) < self.num_robots:
-            print(f"Waiting for robots to report positions... ({len(self.follower_positions)}/{self.num_robots})")
-            await asyncio.sleep(1)
+        # Wait for the expected robots, but start with whoever has reported once the startup timeout expires
+        print(f"Waiting for robots to report positions... ({len(self.follower_positions)}/{self.num_robots})")
+        if not await self.wait_for_robots(STARTUP_TIMEOUT):
+            print(f"Startup timeout: continuing with {len(self.follower_positions)}/{self.num_robots} robots")
 
         # Assign roles and send target positions
         await self.assign_roles()
+        if self.use_snapshot:
+            self.snapshot_task = asyncio.create_task(self.snapshot_loop())
 
-        # Keep the script running
+        # Tick once a second, or right away when membership changes
+        while True:
+            await self.tick()
+            await self.clock.async_wait(self.membership_event, 1)
+
+    async def tick(self):
+        """One controller tick: expire stale robots and reassign on membership changes."""
+        self.check_liveness()
+        if self.membership_event is not None:
+            self.membership_event.clear()
+        if self.membership_changed:
+            print(f"Membership changed: {len(self.follower_positions)} robots, events {self.membership_events}")
+            await self.assign_roles()
+        elif self.mission_changed:
+            print(f"Mission: {self.mission.stats()}")
+            await self.assign_roles()
+        if self.verbose and self.predictor is not None and self.predictor.residuals:
+            print(f"Prediction residuals: {self.predictor.residual_stats()}")
+        self.scheduler.drain()
+
+    async def snapshot_loop(self):
+        """Publish the snapshot every snapshot_interval seconds.
+
+        Snapshots keep their own fixed schedule, so early ticks on membership
+        changes neither add snapshots nor shift the ones after them.
+        """
+        next_time = self.clock.time()
         while True:
-            await asyncio.sleep(1)
+            if self.target_position:
+                self.publish_snapshot()
+            next_time += self.snapshot_interval
+            await self.clock.async_sleep(max(0.0, next_time - self.clock.time()))
 
 if __name__ == "__main__":
     controller = SwarmController()
@@ -301,4 +653,15 @@ if __name__ == "__main__":
     target_y = float(input("Enter target Y coordinate: "))
     controller.target_position = (target_x, target_y)
 
-    asyncio.run(controller.run())
\ No newline at end of file
+    # Optional waypoints after the first target, e.g. "1.0,2.0; 2.0,2.0"
+    waypoints = input("Enter further waypoints as x,y; x,y (blank for none): ").strip()
+    if waypoints:
+        legs = [tuple(float(v) for v in leg.split(",")) for leg in waypoints.split(";") if leg.strip()]
+        controller.mission.add(FORMATION, [controller.target_position] + legs)
+
+    if LATENCY_TRACE:
+        dump_on_exit()
+    try:
+        asyncio.run(controller.run())
+    except KeyboardInterrupt:
+        print(f"Mission: {controller.mission.stats()}")
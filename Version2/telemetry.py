@@ -0,0 +1,118 @@
+"""
+Background pose telemetry for a robot.
+
+Publishes the robot's position and heading on the follower position topic at
+a fixed rate. Poses that moved less than a threshold since the last publish
+are suppressed, and while the broker has not yet accepted the previous
+message the tick is skipped, so only the latest pose is ever sent.
+
+Timestamps and the tick wait go through the clock (see clock.py). Under a
+VirtualClock, call publish_latest() from the simulation's own thread
+instead of start(), since virtual time must be driven from one thread.
+"""
+
+import threading
+from clock import get_clock
+from codec import encode_position
+from sharding import position_topic
+from latency import get_recorder
+from clock_sync import reference_time, to_reference
+from config import (ROBOT_ID, PAYLOAD_FORMAT, LATENCY_TRACE, TELEMETRY_RATE, TELEMETRY_MIN_DISTANCE,
+                    TELEMETRY_MIN_HEADING)
+from navigation import normalize_angle
+
+
+class TelemetryPublisher:
+    def __init__(self, client, get_pose, rate=TELEMETRY_RATE, min_distance=TELEMETRY_MIN_DISTANCE,
+                 min_heading=TELEMETRY_MIN_HEADING, get_fix=None, clock=None):
+        """
+        client must already be connected with its network loop running.
+        get_pose returns ((x, y), heading); positions of (None, None) are skipped.
+        get_fix optionally returns the (sequence number, parse time) of the UWB fix, for latency tracing.
+        """
+        self.clock = clock or get_clock()
+        self.client = client
+        self.get_pose = get_pose
+        self.get_fix = get_fix
+        self.period = 1.0 / rate
+        self.min_distance = min_distance
+        self.min_heading = min_heading
+
+        self.last_sent = None  # ((x, y), heading) of the last published pose
+        self.in_flight = None  # MQTTMessageInfo of the last publish
+        self.in_flight_since = 0.0
+        self.in_flight_timeout = max(1.0, 5 * self.period)  # Give up on a publish lost to a disconnect
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        # Statistics
+        self.published = 0
+        self.suppressed = 0  # Pose moved less than the threshold
+        self.coalesced = 0  # Broker still busy with the previous message
+        self.start_time = None
+
+    def start(self):
+        self.start_time = self.clock.time()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        print(f"Telemetry started at {1.0 / self.period:.1f} Hz")
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        print(f"Telemetry stopped: {self.stats()}")
+
+    def has_moved(self, position, heading):
+        """Whether the pose differs enough from the last published one to be worth sending."""
+        if self.last_sent is None:
+            return True
+        (last_x, last_y), last_heading = self.last_sent
+        distance = ((position[0] - last_x) ** 2 + (position[1] - last_y) ** 2) ** 0.5
+        return distance >= self.min_distance or abs(normalize_angle(heading - last_heading)) >= self.min_heading
+
+    def publish_latest(self):
+        """Publish the current pose if it moved and the broker is keeping up."""
+        position, heading = self.get_pose()
+        if position == (None, None):
+            return
+        if not self.has_moved(position, heading):
+            self.suppressed += 1
+            return
+        now = self.clock.time()
+        if (self.in_flight is not None and not self.in_flight.is_published()
+                and now - self.in_flight_since < self.in_flight_timeout):
+            # Skip this tick; the next one reads a fresher pose anyway
+            self.coalesced += 1
+            return
+
+        trace = None
+        fix = self.get_fix() if LATENCY_TRACE and self.get_fix else None
+        if fix is not None:
+            sent_time, fix_time = reference_time(), to_reference(fix[1])
+            trace = (fix[0], fix_time, sent_time)
+            get_recorder().record("uwb_to_publish", sent_time - fix_time)
+        payload = encode_position(ROBOT_ID, position[0], position[1], heading, PAYLOAD_FORMAT, trace)
+        self.in_flight = self.client.publish(position_topic(ROBOT_ID, position), payload)
+        self.in_flight_since = now
+        self.last_sent = (position, heading)
+        self.published += 1
+
+    def run(self):
+        next_tick = self.clock.time()
+        while not self.stop_event.is_set():
+            self.publish_latest()
+            next_tick += self.period
+            # Don't try to catch up on missed ticks
+            next_tick = max(next_tick, self.clock.time())
+            self.clock.wait(self.stop_event, next_tick - self.clock.time())
+
+    def stats(self):
+        """Return publish rate and counters since start()."""
+        elapsed = self.clock.time() - self.start_time if self.start_time else 0.0
+        return {
+            "publish_rate": self.published / elapsed if elapsed > 0 else 0.0,
+            "published": self.published,
+            "suppressed": self.suppressed,
+            "coalesced": self.coalesced
+        }
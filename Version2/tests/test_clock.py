@@ -0,0 +1,53 @@
+import asyncio
+import threading
+import pytest
+from clock import SkewedClock, SystemClock, VirtualClock, get_clock, set_clock
+
+
+def test_virtual_sleep_advances_time():
+    clock = VirtualClock(start=100.0)
+    clock.sleep(2.5)
+    clock.sleep(-1.0)
+    assert clock.time() == clock.monotonic() == 102.5
+
+
+def test_virtual_wait_jumps_ahead_only_while_clear():
+    clock = VirtualClock()
+    event = threading.Event()
+    assert not clock.wait(event, 1.0)
+    assert clock.time() == 1.0
+    event.set()
+    assert clock.wait(event, 1.0)
+    assert clock.time() == 1.0
+
+
+def test_virtual_async_wait():
+    clock = VirtualClock()
+
+    async def run():
+        event = asyncio.Event()
+        assert not await clock.async_wait(event, 0.5)
+        asyncio.get_running_loop().call_soon(event.set)
+        # Without a timeout it blocks until set instead of spinning virtual time forward
+        assert await clock.async_wait(event)
+
+    asyncio.run(run())
+    assert clock.time() == 0.5
+
+
+def test_skewed_clock_offset_and_drift():
+    base = VirtualClock(start=10.0)
+    skewed = SkewedClock(base, offset=0.25, drift=100e-6)
+    assert skewed.time() == pytest.approx(10.25)
+    base.advance(1000.0)
+    assert skewed.time() == pytest.approx(1010.25 + 0.1)
+    assert skewed.monotonic() - 10.0 == pytest.approx(1000.1)
+
+
+def test_set_clock_replaces_process_clock():
+    clock = VirtualClock()
+    set_clock(clock)
+    try:
+        assert get_clock() is clock
+    finally:
+        set_clock(SystemClock())
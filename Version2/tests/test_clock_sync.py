@@ -0,0 +1,69 @@
+import random
+import pytest
+from clock import SkewedClock, VirtualClock
+from clock_sync import MQTT_TOPIC_TIME_REQUEST, ClockSyncClient, ClockSyncEstimator, ClockSyncServer
+from transport import LocalBroker, LocalClient
+
+
+def exchange(estimator, t, offset, drift, out, back, processing=0.0001):
+    """One request at robot time t against a controller clock that runs offset + drift * t ahead."""
+    def controller(local):
+        return local + offset + drift * local
+    t1 = controller(t + out)
+    estimator.add_sample(t, t1, t1 + processing, t + out + processing + back)
+
+
+def test_symmetric_delay_gives_exact_offset():
+    estimator = ClockSyncEstimator(window=8)
+    assert estimator.offset(0.0) == 0.0
+    exchange(estimator, 100.0, 0.25, 0.0, 0.002, 0.002)
+    assert estimator.offset(100.0) == pytest.approx(0.25, abs=1e-9)
+    assert estimator.delay == pytest.approx(0.004)
+
+
+def test_delayed_samples_are_ignored():
+    estimator = ClockSyncEstimator(window=16)
+    for i in range(8):
+        exchange(estimator, i * 1.0, 0.25, 0.0, 0.001, 0.001)
+    # A reply queued for 50 ms on the way back skews its own offset by 25 ms
+    exchange(estimator, 8.0, 0.25, 0.0, 0.001, 0.051)
+    assert estimator.offset(8.0) == pytest.approx(0.25, abs=1e-6)
+
+
+def test_drift_is_tracked():
+    rng = random.Random(1)
+    estimator = ClockSyncEstimator(window=32)
+    for i in range(32):
+        exchange(estimator, i * 10.0, -0.5, 50e-6, rng.uniform(0.001, 0.0012), rng.uniform(0.001, 0.0012))
+    assert estimator.drift == pytest.approx(50e-6, rel=0.1)
+    assert estimator.to_reference(400.0) == pytest.approx(400.0 - 0.5 + 50e-6 * 400.0, abs=1e-4)
+
+
+def test_client_converges_against_server():
+    base = VirtualClock(start=1000.0)
+    robot_clock = SkewedClock(base, offset=-0.25)
+    broker = LocalBroker(latency=0.002, clock=base)
+    server_client = LocalClient(broker)
+    server = ClockSyncServer(server_client, clock=base)
+    server_client.on_message = lambda client, userdata, msg: server.handle_request(msg, base.time())
+    server_client.connect()
+    server_client.subscribe(MQTT_TOPIC_TIME_REQUEST)
+    robot_client = LocalClient(broker)
+    owner_messages = []
+    robot_client.on_message = lambda client, userdata, msg: owner_messages.append(msg)
+    robot_client.connect()
+    sync = ClockSyncClient(robot_client, "robot_1", clock=robot_clock)
+    sync.subscribe()
+
+    for _ in range(5):
+        sync.send_request()
+        base.advance(0.002)
+        server_client.loop(timeout=0)
+        base.advance(0.002)
+        sync.client.loop(timeout=0)
+        base.advance(1.0)
+    assert sync.replies == 5
+    assert sync.reference_time() == pytest.approx(base.time(), abs=1e-6)
+    assert server.offsets["robot_1"][0] == pytest.approx(0.25, abs=1e-6)
+    # Replies go to the sync client only; the session's owner never sees them
+    assert owner_messages == []
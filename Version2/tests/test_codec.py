@@ -0,0 +1,48 @@
+import pytest
+from codec import (FORMAT_BINARY, FORMAT_JSON, POSITION_V1, POSITION_V2, TARGET_V1, decode_position, decode_target,
+                   detect_format, encode_position, encode_target)
+
+
+@pytest.mark.parametrize("fmt", [FORMAT_JSON, FORMAT_BINARY])
+def test_position_round_trip(fmt):
+    payload = encode_position("robot_7", 1.5, -2.25, 0.75, fmt)
+    assert detect_format(payload) == fmt
+    assert decode_position(payload) == {"id": "robot_7", "x": 1.5, "y": -2.25, "heading": 0.75}
+
+
+@pytest.mark.parametrize("fmt", [FORMAT_JSON, FORMAT_BINARY])
+def test_target_round_trip(fmt):
+    payload = encode_target(0.5, 3.0, fmt)
+    assert detect_format(payload) == fmt
+    assert decode_target(payload) == {"x": 0.5, "y": 3.0}
+
+
+@pytest.mark.parametrize("fmt", [FORMAT_JSON, FORMAT_BINARY])
+def test_traced_payloads_carry_trace_fields(fmt):
+    trace = (42, 1000.125, 1000.5)
+    position = decode_position(encode_position("robot_1", 1.0, 2.0, 0.0, fmt, trace))
+    target = decode_target(encode_target(1.0, 2.0, fmt, trace))
+    for decoded in (position, target):
+        assert (decoded["seq"], decoded["t_fix"], decoded["t_sent"]) == trace
+
+
+def test_binary_sizes():
+    assert len(encode_position("robot_1", 0.0, 0.0, 0.0, FORMAT_BINARY)) == POSITION_V1.size
+    assert len(encode_position("robot_1", 0.0, 0.0, 0.0, FORMAT_BINARY, (1, 0.0, 0.0))) == POSITION_V2.size
+    assert len(encode_target(0.0, 0.0, FORMAT_BINARY)) == TARGET_V1.size
+
+
+def test_json_text_and_bytes_decode_alike():
+    payload = encode_position("robot_1", 1.0, 2.0, 3.0)
+    assert decode_position(payload) == decode_position(payload.encode("utf-8"))
+
+
+def test_long_robot_id_is_rejected():
+    with pytest.raises(ValueError):
+        encode_position("a_robot_id_that_is_too_long", 0.0, 0.0, 0.0, FORMAT_BINARY)
+
+
+def test_truncated_binary_is_rejected():
+    payload = encode_target(1.0, 2.0, FORMAT_BINARY)
+    with pytest.raises(ValueError):
+        decode_target(payload[:-1])
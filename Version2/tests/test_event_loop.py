@@ -0,0 +1,62 @@
+import asyncio
+import threading
+from codec import encode_position
+from config import MQTT_TOPIC_FOLLOWER_POSITION
+from swarm_controller import SwarmController
+from transport import LocalBroker, LocalClient, LocalMessage
+
+
+def position(robot_id, x, y):
+    return LocalMessage(MQTT_TOPIC_FOLLOWER_POSITION, encode_position(robot_id, x, y, 0.0))
+
+
+def test_messages_from_network_thread_are_handled_on_the_loop():
+    controller = SwarmController(client=LocalClient(LocalBroker()), verbose=False)
+    controller.num_robots = 2
+
+    async def run():
+        controller.bind_loop()
+        loop_thread = threading.get_ident()
+        handled_on = []
+        handle_message = controller.handle_message
+        controller.handle_message = lambda *args: (handled_on.append(threading.get_ident()), handle_message(*args))
+
+        def network():
+            for robot_id in ("robot_1", "robot_2"):
+                controller.on_message(controller.client, None, position(robot_id, 0.0, 0.0))
+
+        threading.Thread(target=network).start()
+        assert await controller.wait_for_robots(timeout=2.0)
+        assert handled_on == [loop_thread, loop_thread]
+        assert controller.membership_event.is_set()
+
+    asyncio.run(run())
+
+
+def test_wait_for_robots_times_out():
+    controller = SwarmController(client=LocalClient(LocalBroker()), verbose=False)
+    controller.num_robots = 2
+
+    async def run():
+        controller.bind_loop()
+        controller.handle_message(position("robot_1", 0.0, 0.0))
+        assert not await controller.wait_for_robots(timeout=0.05)
+
+    asyncio.run(run())
+
+
+def test_wait_for_target_reached():
+    controller = SwarmController(client=LocalClient(LocalBroker()), verbose=False)
+
+    async def run():
+        controller.bind_loop()
+        controller.handle_message(position("robot_1", 0.0, 0.0))
+        controller.send_target("robot_1", (1.0, 0.0))
+        waiter = asyncio.create_task(controller.wait_for_target_reached("robot_1", timeout=2.0))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        controller.handle_message(position("robot_1", 1.0, 0.0))
+        assert await waiter
+
+    asyncio.run(run())
+
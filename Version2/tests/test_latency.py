@@ -0,0 +1,48 @@
+import random
+import pytest
+from latency import LatencyHistogram, LatencyRecorder, get_recorder, record_trace
+
+
+def test_percentiles_within_precision():
+    rng = random.Random(1)
+    samples = sorted(rng.lognormvariate(-5, 1) for _ in range(10000))
+    histogram = LatencyHistogram()
+    for sample in samples:
+        histogram.record(sample)
+    for percent in (50, 90, 99, 99.9):
+        exact = samples[int(len(samples) * percent / 100) - 1]
+        assert histogram.percentile(percent) == pytest.approx(exact, rel=0.02)
+    assert histogram.max == samples[-1]
+    assert histogram.mean() == pytest.approx(sum(samples) / len(samples))
+
+
+def test_out_of_range_values_are_clamped():
+    histogram = LatencyHistogram(highest=1.0)
+    histogram.record(-0.5)
+    histogram.record(100.0)
+    assert histogram.count == 2
+    assert histogram.percentile(50) < histogram.resolution
+    assert histogram.percentile(100) <= 100.0
+
+
+def test_empty_histogram():
+    assert LatencyHistogram().summary()["p99"] == 0.0
+
+
+def test_recorder_counts_negative_samples_per_stage():
+    recorder = LatencyRecorder()
+    recorder.record("position_network", -0.001)
+    recorder.record("position_network", 0.002)
+    assert recorder.negative == {"position_network": 1}
+    assert recorder.summary()["position_network"]["count"] == 2
+
+
+def test_record_trace_records_network_and_loop_legs():
+    before = get_recorder().summary()
+    record_trace({"seq": 1, "t_fix": 10.0, "t_sent": 10.25}, "test_network", "test_loop", now=10.5)
+    record_trace({"x": 1.0}, "test_network", now=10.5)
+    summary = get_recorder().summary()
+    added = summary["test_network"]["count"] - before.get("test_network", {"count": 0})["count"]
+    assert added == 1
+    assert summary["test_network"]["max"] >= 0.25
+    assert summary["test_loop"]["max"] >= 0.5
@@ -0,0 +1,92 @@
+import json
+from clock import VirtualClock
+from codec import encode_position
+from config import MQTT_TOPIC_FOLLOWER_POSITION, MQTT_TOPIC_HEARTBEAT
+from swarm_controller import SwarmController
+from transport import LocalBroker, LocalClient, LocalMessage
+
+
+def position(robot_id, x, y):
+    return LocalMessage(MQTT_TOPIC_FOLLOWER_POSITION, encode_position(robot_id, x, y, 0.5))
+
+
+def heartbeat(robot_id, status):
+    return LocalMessage(MQTT_TOPIC_HEARTBEAT, json.dumps({"id": robot_id, "status": status}).encode("utf-8"))
+
+
+def test_position_report_joins_the_swarm():
+    controller = SwarmController(client=LocalClient(LocalBroker()), verbose=False, clock=VirtualClock())
+    controller.on_message(controller.client, None, position("robot_1", 1.0, 2.0))
+    assert controller.follower_positions == {"robot_1": (1.0, 2.0)}
+    assert controller.membership_events["join"] == 1
+    assert controller.membership_changed
+
+
+def test_heartbeat_alone_does_not_join():
+    controller = SwarmController(client=LocalClient(LocalBroker()), verbose=False, clock=VirtualClock())
+    controller.on_message(controller.client, None, heartbeat("robot_1", "alive"))
+    assert controller.last_seen == {}
+
+
+def test_done_heartbeat_keeps_robot_alive():
+    clock = VirtualClock()
+    controller = SwarmController(heartbeat_timeout=5.0, client=LocalClient(LocalBroker(clock=clock)), verbose=False,
+                                 clock=clock)
+    controller.on_message(controller.client, None, position("robot_1", 1.0, 2.0))
+    for _ in range(10):
+        clock.advance(1.0)
+        controller.on_message(controller.client, None, heartbeat("robot_1", "done"))
+        controller.check_liveness()
+    assert "robot_1" in controller.follower_positions
+
+
+def test_silent_robot_goes_stale():
+    clock = VirtualClock()
+    controller = SwarmController(heartbeat_timeout=5.0, client=LocalClient(LocalBroker(clock=clock)), verbose=False,
+                                 clock=clock)
+    controller.on_message(controller.client, None, position("robot_1", 1.0, 2.0))
+    clock.advance(4.0)
+    controller.on_message(controller.client, None, heartbeat("robot_1", "alive"))
+    clock.advance(4.0)
+    controller.check_liveness()
+    assert "robot_1" in controller.follower_positions
+    clock.advance(2.0)
+    controller.check_liveness()
+    assert "robot_1" not in controller.follower_positions
+    assert controller.membership_events["stale"] == 1
+
+
+def test_offline_heartbeat_leaves_right_away():
+    controller = SwarmController(client=LocalClient(LocalBroker()), verbose=False, clock=VirtualClock())
+    controller.on_message(controller.client, None, position("robot_1", 1.0, 2.0))
+    controller.on_message(controller.client, None, heartbeat("robot_1", "offline"))
+    assert "robot_1" not in controller.follower_positions
+    assert controller.membership_events["leave"] == 1
+
+
+def test_heartbeat_after_going_stale_rejoins():
+    clock = VirtualClock()
+    controller = SwarmController(heartbeat_timeout=5.0, client=LocalClient(LocalBroker(clock=clock)), verbose=False,
+                                 clock=clock)
+    controller.on_message(controller.client, None, position("robot_1", 1.0, 2.0))
+    clock.advance(6.0)
+    controller.check_liveness()
+    assert "robot_1" not in controller.last_seen
+
+    # A robot holding its final target only heartbeats; that is enough to bring it back
+    controller.on_message(controller.client, None, heartbeat("robot_1", "done"))
+    assert "robot_1" in controller.last_seen
+    assert controller.follower_positions == {"robot_1": (1.0, 2.0)}
+    assert controller.membership_events == {"join": 2, "leave": 0, "stale": 1}
+
+
+def test_heartbeat_after_leaving_does_not_rejoin():
+    clock = VirtualClock()
+    controller = SwarmController(heartbeat_timeout=5.0, client=LocalClient(LocalBroker(clock=clock)), verbose=False,
+                                 clock=clock)
+    controller.on_message(controller.client, None, position("robot_1", 1.0, 2.0))
+    clock.advance(6.0)
+    controller.check_liveness()
+    controller.on_message(controller.client, None, heartbeat("robot_1", "offline"))
+    controller.on_message(controller.client, None, heartbeat("robot_1", "alive"))
+    assert controller.last_seen == {}
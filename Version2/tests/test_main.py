@@ -0,0 +1,36 @@
+import threading
+import main
+from clock import SystemClock, VirtualClock, set_clock
+from codec import encode_target
+from config import ROBOT_ID
+from transport import LocalBroker, LocalClient
+
+
+def test_subscribe_to_target_keeps_the_session_open(monkeypatch):
+    monkeypatch.setattr(main, "target_position", None)
+    broker = LocalBroker()
+    LocalClient(broker).publish(f"swarm/target/{ROBOT_ID}", encode_target(1.0, 2.0), retain=True)
+    client = LocalClient(broker)
+    client.connect()
+    client.loop_start()
+    try:
+        main.subscribe_to_target(client)
+        assert main.target_position == (1.0, 2.0)
+        # The same session carries heartbeats and telemetry for the rest of the run
+        assert client.connected
+    finally:
+        client.loop_stop()
+
+
+def test_hold_does_not_spin_a_virtual_clock(monkeypatch):
+    monkeypatch.setattr(main, "stop_requested", threading.Event())
+    clock = VirtualClock()
+    set_clock(clock)
+    try:
+        timer = threading.Timer(0.05, main.stop)
+        timer.start()
+        main.hold_until_stopped()
+        timer.join()
+        assert clock.time() == 0.0
+    finally:
+        set_clock(SystemClock())
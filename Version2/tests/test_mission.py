@@ -0,0 +1,51 @@
+from clock import VirtualClock
+from mission import FORMATION, MissionQueue
+
+
+def test_waypoints_go_out_one_at_a_time():
+    mission = MissionQueue(blend_distance=0.3, clock=VirtualClock())
+    assert mission.add("robot_1", [(1, 0), (2, 0), (3, 0)])
+    assert mission.current["robot_1"] == (1.0, 0.0)
+    assert mission.complete("robot_1")
+    assert mission.current["robot_1"] == (2.0, 0.0)
+    assert mission.stats()["pending"] == 1
+
+
+def test_blend_distance_applies_to_intermediate_waypoints_only():
+    mission = MissionQueue(blend_distance=0.3, clock=VirtualClock())
+    mission.add(FORMATION, [(1, 0), (2, 0)])
+    assert mission.completion_radius(FORMATION, 0.1) == 0.3
+    mission.complete(FORMATION)
+    assert mission.completion_radius(FORMATION, 0.1) == 0.1
+
+
+def test_last_waypoint_is_held_until_more_are_added():
+    mission = MissionQueue(clock=VirtualClock())
+    mission.add("robot_1", [(1, 0)])
+    assert not mission.complete("robot_1")
+    assert "robot_1" in mission.finished and not mission.active("robot_1")
+    assert mission.current["robot_1"] == (1.0, 0.0)
+    # Completing again is a no-op, and new waypoints start right away
+    assert not mission.complete("robot_1")
+    assert mission.add("robot_1", [(2, 0)])
+    assert mission.active("robot_1") and mission.current["robot_1"] == (2.0, 0.0)
+
+
+def test_adding_to_an_active_mission_queues_behind_it():
+    mission = MissionQueue(clock=VirtualClock())
+    mission.add("robot_1", [(1, 0)])
+    assert not mission.add("robot_1", [(2, 0)])
+    assert mission.current["robot_1"] == (1.0, 0.0)
+    assert mission.has_next("robot_1")
+
+
+def test_throughput_stats():
+    clock = VirtualClock()
+    mission = MissionQueue(clock=clock)
+    mission.add("robot_1", [(1, 0), (2, 0), (3, 0)])
+    clock.advance(30.0)
+    mission.complete("robot_1")
+    mission.complete("robot_1")
+    stats = mission.stats()
+    assert stats["completed"] == 2 and stats["in_flight"] == 1
+    assert stats["waypoints_per_minute"] == 4.0
@@ -0,0 +1,47 @@
+import pytest
+from pose_predictor import PosePredictor
+
+
+def test_constant_velocity_is_extrapolated():
+    predictor = PosePredictor(alpha=0.8, beta=0.5, max_horizon=1.0)
+    for i in range(20):
+        predictor.update("robot_1", (0.1 * i, 0.0), 0.0, 0.5 * i)
+    x, y = predictor.predict_positions(9.5 + 0.5)["robot_1"]
+    assert x == pytest.approx(2.0, abs=0.01)
+    assert y == pytest.approx(0.0, abs=1e-9)
+    assert predictor.residual_stats()["mean"] < predictor.residual_stats()["stale_mean"]
+
+
+def test_extrapolation_stops_at_max_horizon():
+    predictor = PosePredictor(alpha=1.0, beta=1.0, max_horizon=0.5)
+    predictor.update("robot_1", (0.0, 0.0), 0.0, 0.0)
+    predictor.update("robot_1", (0.1, 0.0), 0.0, 0.5)
+    assert predictor.predict_positions(10.0)["robot_1"][0] == pytest.approx(0.2)
+
+
+def test_remove_keeps_rows_packed():
+    predictor = PosePredictor(capacity=2)
+    for i in range(5):
+        predictor.update(f"robot_{i}", (float(i), 0.0), 0.0, 0.0)
+    predictor.remove("robot_1")
+    predictor.remove("robot_9")
+    assert len(predictor) == 4
+    assert predictor.predict_positions(0.0) == {f"robot_{i}": (float(i), 0.0) for i in (0, 2, 3, 4)}
+
+
+def test_close_pairs():
+    predictor = PosePredictor()
+    predictor.update("robot_1", (0.0, 0.0), 0.0, 0.0)
+    predictor.update("robot_2", (0.1, 0.0), 0.0, 0.0)
+    predictor.update("robot_3", (1.0, 0.0), 0.0, 0.0)
+    assert [(a, b) for a, b, _ in predictor.close_pairs(0.0, 0.2)] == [("robot_1", "robot_2")]
+
+
+def test_set_state_copies_another_tracker():
+    worker = PosePredictor(alpha=0.8, beta=0.5, max_horizon=1.0)
+    for i in range(10):
+        worker.update("robot_1", (0.1 * i, 0.0), 0.0, 0.5 * i)
+    coordinator = PosePredictor()
+    coordinator.set_state("robot_1", *worker.state("robot_1"))
+    assert coordinator.predict_positions(5.0) == pytest.approx(worker.predict_positions(5.0))
+    assert not coordinator.residuals
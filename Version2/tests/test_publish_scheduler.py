@@ -0,0 +1,63 @@
+import asyncio
+import pytest
+from clock import VirtualClock
+from publish_scheduler import PublishScheduler
+
+
+class RecordingClient:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload, qos=0):
+        self.published.append((topic, payload))
+
+
+@pytest.fixture
+def scheduler():
+    return PublishScheduler(RecordingClient(), rate=10.0, burst=2, clock=VirtualClock())
+
+
+def test_newer_message_replaces_pending_one_in_place(scheduler):
+    scheduler.submit("robot_1", "t/1", "a")
+    scheduler.submit("robot_2", "t/2", "b")
+    scheduler.submit("robot_1", "t/1", "c")
+    assert scheduler.drain() == 2
+    assert scheduler.client.published == [("t/1", "c"), ("t/2", "b")]
+    assert scheduler.coalesced == 1
+
+
+def test_cancel_drops_only_that_key(scheduler):
+    scheduler.submit("robot_1", "t/1", "a")
+    scheduler.submit("robot_2", "t/2", "b")
+    assert scheduler.cancel("robot_1")
+    assert not scheduler.cancel("robot_1")
+    scheduler.drain()
+    assert scheduler.client.published == [("t/2", "b")]
+
+
+def test_budget_limits_publishes(scheduler):
+    for i in range(5):
+        scheduler.submit(f"robot_{i}", f"t/{i}", "x")
+    assert scheduler.drain() == 2
+    assert scheduler.drain() == 0
+    scheduler.clock.advance(0.1)
+    assert scheduler.drain() == 1
+    scheduler.clock.advance(10.0)
+    # Tokens never pile up beyond the burst
+    assert scheduler.drain() == 2
+    assert scheduler.stats()["depth"] == 0
+    assert scheduler.stats()["max_depth"] == 5
+
+
+def test_idle_scheduler_does_not_advance_virtual_time():
+    clock = VirtualClock()
+    scheduler = PublishScheduler(RecordingClient(), rate=10.0, clock=clock)
+
+    async def run():
+        task = asyncio.create_task(scheduler.run())
+        for _ in range(100):
+            await asyncio.sleep(0)
+        task.cancel()
+
+    asyncio.run(run())
+    assert clock.time() == 0.0
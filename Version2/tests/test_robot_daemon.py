@@ -0,0 +1,75 @@
+import json
+import paho.mqtt.client as mqtt
+import pytest
+from codec import FORMAT_BINARY, encode_snapshot, encode_target
+from config import MQTT_TOPIC_SNAPSHOT, ROBOT_ID
+from main import set_offline_will, start_heartbeat
+from robot_daemon import RobotDaemon
+from sharding import heartbeat_topic
+from transport import LocalBroker, LocalClient
+
+TARGET_TOPIC = f"swarm/target/{ROBOT_ID}"
+
+
+def message(topic, payload):
+    msg = mqtt.MQTTMessage(topic=topic.encode("utf-8"))
+    msg.payload = payload.encode("utf-8") if isinstance(payload, str) else payload
+    return msg
+
+
+@pytest.fixture
+def daemon():
+    return RobotDaemon()
+
+
+def test_target_message_sets_target(daemon):
+    daemon.on_message(daemon.client, None, message(TARGET_TOPIC, encode_target(1.0, 2.0)))
+    assert daemon.target_position == (1.0, 2.0)
+    assert daemon.new_target.is_set()
+    assert daemon.targets_received == 1
+
+
+def test_repeated_target_does_not_preempt(daemon):
+    daemon.on_message(daemon.client, None, message(TARGET_TOPIC, encode_target(1.0, 2.0)))
+    daemon.new_target.clear()
+    daemon.on_message(daemon.client, None, message(TARGET_TOPIC, encode_target(1.0, 2.0, FORMAT_BINARY)))
+    assert not daemon.new_target.is_set()
+    assert daemon.targets_received == 1
+
+
+def test_snapshot_sets_own_target_only(daemon):
+    other = encode_snapshot(0, True, "line", {"robot_99": (5.0, 5.0)})
+    daemon.on_message(daemon.client, None, message(MQTT_TOPIC_SNAPSHOT, other))
+    assert daemon.target_position is None
+    own = encode_snapshot(1, False, "line", {ROBOT_ID: (3.0, -1.0)}, fmt=FORMAT_BINARY)
+    daemon.on_message(daemon.client, None, message(MQTT_TOPIC_SNAPSHOT, own))
+    assert daemon.target_position == (3.0, -1.0)
+
+
+def test_malformed_target_is_ignored(daemon):
+    daemon.on_message(daemon.client, None, message(TARGET_TOPIC, b'{"x": 1.0}'))
+    daemon.on_message(daemon.client, None, message(TARGET_TOPIC, b"{not json"))
+    assert daemon.target_position is None
+
+
+def test_daemon_session_carries_the_offline_will():
+    broker = LocalBroker()
+    heartbeats = []
+    listener = LocalClient(broker)
+    listener.on_message = lambda client, userdata, msg: heartbeats.append(json.loads(msg.payload))
+    listener.connect()
+    listener.subscribe(heartbeat_topic(ROBOT_ID))
+
+    daemon = RobotDaemon(client=LocalClient(broker))
+    set_offline_will(daemon.client)
+    daemon.client.connect()
+    thread, stop = start_heartbeat(daemon.client, interval=60.0)
+    listener.loop(timeout=0)
+    assert heartbeats == [{"id": ROBOT_ID, "status": "alive"}]
+
+    # Losing the daemon's one session is what the controller hears about
+    daemon.client.drop()
+    listener.loop(timeout=0)
+    assert heartbeats[1:] == [{"id": ROBOT_ID, "status": "offline"}]
+    stop.set()
+    thread.join()
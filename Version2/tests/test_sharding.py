@@ -0,0 +1,159 @@
+import json
+import pytest
+from clock import VirtualClock
+from codec import FORMAT_BINARY, encode_position
+from sharded_controller import ShardCoordinator, ShardWorker
+from sharding import robot_shard, shard_for_id, shard_for_position, shard_topic
+from transport import LocalBroker, LocalClient, LocalMessage
+
+
+def test_id_shard_is_stable_and_in_range():
+    shards = [shard_for_id(f"robot_{i}", 4) for i in range(100)]
+    assert shards == [shard_for_id(f"robot_{i}", 4) for i in range(100)]
+    assert set(shards) == {0, 1, 2, 3}
+
+
+def test_region_shard_clamps_to_edge_strips():
+    assert shard_for_position(-10.0, 4, (0.0, 4.0)) == 0
+    assert shard_for_position(2.5, 4, (0.0, 4.0)) == 2
+    assert shard_for_position(10.0, 4, (0.0, 4.0)) == 3
+
+
+def test_region_shard_falls_back_to_id_without_a_position():
+    assert robot_shard("robot_1", (None, None), 4, "region") == shard_for_id("robot_1", 4)
+    with pytest.raises(ValueError):
+        robot_shard("robot_1", None, 4, "nearest")
+
+
+class Network:
+    """Two shard workers and a coordinator on one in-process broker."""
+
+    def __init__(self):
+        self.clock = VirtualClock(start=1000.0)
+        broker = LocalBroker(clock=self.clock)
+        self.workers = [ShardWorker(shard, client=LocalClient(broker), clock=self.clock) for shard in range(2)]
+        self.coordinator = ShardCoordinator(num_shards=2, client=LocalClient(broker), verbose=False,
+                                            clock=self.clock)
+        self.coordinator.client.connect()
+
+    def report(self, shard, robot_id, x, y, trace=None):
+        payload = encode_position(robot_id, x, y, 0.0, FORMAT_BINARY, trace)
+        self.workers[shard].on_message(None, None, LocalMessage(shard_topic(shard, "position"), payload))
+
+    def heartbeat(self, shard, robot_id, status):
+        payload = json.dumps({"id": robot_id, "status": status}).encode("utf-8")
+        self.workers[shard].on_message(None, None, LocalMessage(shard_topic(shard, "heartbeat"), payload))
+
+    def flush(self):
+        for worker in self.workers:
+            worker.publish_summary()
+        self.coordinator.client.loop(timeout=0)
+
+
+def test_summaries_carry_positions_and_trace_fields():
+    network = Network()
+    network.report(0, "robot_1", 1.0, 2.0, trace=(7, 999.5, 999.75))
+    network.flush()
+    coordinator = network.coordinator
+    assert coordinator.follower_positions == {"robot_1": (1.0, 2.0)}
+    assert coordinator.robot_formats["robot_1"] == FORMAT_BINARY
+    assert coordinator.robot_fixes["robot_1"] == (7, 999.5)
+    assert not network.workers[0].publish_summary()
+
+
+def test_handoff_keeps_robot_and_newest_position():
+    network = Network()
+    network.report(0, "robot_1", 1.0, 0.0)
+    network.flush()
+    network.clock.advance(0.1)
+    network.report(1, "robot_1", 2.5, 0.0)
+    network.clock.advance(0.1)
+    network.flush()
+    coordinator = network.coordinator
+    assert coordinator.handoffs == 1
+    assert coordinator.shard_counts() == [0, 1]
+    assert coordinator.follower_positions["robot_1"] == (2.5, 0.0)
+
+
+def test_late_summary_from_old_shard_is_ignored():
+    network = Network()
+    network.report(0, "robot_1", 1.0, 0.0)
+    network.clock.advance(0.1)
+    network.report(1, "robot_1", 2.5, 0.0)
+    # The new shard's summary arrives first
+    network.workers[1].publish_summary()
+    network.workers[0].publish_summary()
+    network.coordinator.client.loop(timeout=0)
+    assert network.coordinator.follower_positions["robot_1"] == (2.5, 0.0)
+    assert network.coordinator.robot_shard["robot_1"] == 1
+
+
+def test_offline_heartbeat_removes_robot():
+    network = Network()
+    network.report(0, "robot_1", 1.0, 0.0)
+    network.flush()
+    network.heartbeat(0, "robot_1", "offline")
+    network.flush()
+    assert "robot_1" not in network.coordinator.follower_positions
+    assert network.coordinator.shard_counts() == [0, 0]
+
+
+def test_worker_forwards_only_liveness_changes():
+    network = Network()
+    network.report(0, "robot_1", 1.0, 0.0)
+    network.heartbeat(0, "robot_1", "alive")
+    network.flush()
+    coordinator = network.coordinator
+    assert coordinator.membership_events["join"] == 1
+    for _ in range(3):
+        network.clock.advance(1.0)
+        network.heartbeat(0, "robot_1", "alive")
+        # Steady heartbeats are absorbed by the worker
+        assert not network.workers[0].publish_summary()
+
+    network.clock.advance(6.0)
+    coordinator.check_liveness()
+    assert "robot_1" in coordinator.follower_positions
+    network.flush()
+    assert "robot_1" not in coordinator.follower_positions
+    assert coordinator.membership_events["stale"] == 1
+
+    # The next heartbeat brings it back at its last position
+    network.heartbeat(0, "robot_1", "done")
+    network.flush()
+    assert coordinator.follower_positions == {"robot_1": (1.0, 0.0)}
+    assert coordinator.membership_events["join"] == 2
+
+
+def test_small_moves_are_held_back_for_a_while():
+    network = Network()
+    network.report(0, "robot_1", 1.0, 0.0)
+    network.flush()
+    network.clock.advance(0.2)
+    network.report(0, "robot_1", 1.03125, 0.0)
+    network.flush()
+    coordinator = network.coordinator
+    assert coordinator.follower_positions["robot_1"] == (1.0, 0.0)
+
+    # A robot that stops just short of the deadband still gets its final position through
+    network.clock.advance(1.0)
+    network.flush()
+    assert coordinator.follower_positions["robot_1"] == (1.03125, 0.0)
+
+    network.clock.advance(0.2)
+    network.report(0, "robot_1", 1.25, 0.0)
+    network.flush()
+    assert coordinator.follower_positions["robot_1"] == (1.25, 0.0)
+    assert network.workers[0].positions_forwarded == 3
+
+
+def test_coordinator_takes_the_workers_tracked_pose():
+    network = Network()
+    for i in range(5):
+        network.report(0, "robot_1", 0.5 * i, 0.0)
+        network.flush()
+        network.clock.advance(1.0)
+    worker = network.workers[0].predictor
+    coordinator = network.coordinator.predictor
+    assert coordinator.state("robot_1") == pytest.approx(worker.state("robot_1"))
+    assert coordinator.velocities[0][0] > 0.0
@@ -0,0 +1,30 @@
+import asyncio
+from simulate_swarm import simulate
+
+
+def test_small_swarm_reaches_formation_in_virtual_time():
+    result = asyncio.run(simulate(num_robots=5, duration=60.0, tick_period=1.0, arena=4.0, latency=0.002, seed=1,
+                                  virtual=True))
+    assert result["in_formation"] == 5
+    assert result["time_to_formation"] is not None
+    assert result["assignment_latency"] is not None
+    # Virtual seconds are cheap: the run must take far less wall time than it simulates
+    assert result["wall_time"] < result["elapsed"]
+
+
+def test_mission_waypoints_complete():
+    result = asyncio.run(simulate(num_robots=3, duration=120.0, tick_period=1.0, arena=4.0, latency=0.002, seed=2,
+                                  virtual=True, waypoints=1))
+    assert result["time_to_formation"] is not None
+    assert result["waypoints_per_minute"] > 0
+
+
+def test_sharded_swarm_reaches_formation_with_fewer_controller_messages():
+    single = asyncio.run(simulate(num_robots=8, duration=60.0, tick_period=1.0, arena=4.0, latency=0.002, seed=1,
+                                  virtual=True))
+    sharded = asyncio.run(simulate(num_robots=8, duration=60.0, tick_period=1.0, arena=4.0, latency=0.002, seed=1,
+                                   virtual=True, shards=2))
+    assert sharded["in_formation"] == 8
+    assert sharded["worker_load"] is not None
+    assert sharded["capacity_per_s"] > 0
+    assert sharded["controller_messages"] < single["controller_messages"] / 2
@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+from clock import VirtualClock
+from codec import FORMAT_BINARY, FORMAT_JSON, decode_snapshot, encode_snapshot
+from config import MQTT_TOPIC_SNAPSHOT
+from swarm_controller import SwarmController
+from transport import LocalBroker, LocalClient
+
+
+@pytest.mark.parametrize("fmt", [FORMAT_JSON, FORMAT_BINARY])
+def test_snapshot_round_trip(fmt):
+    targets = {"robot_1": (1.0, 2.0), "robot_2": (-0.5, 0.25)}
+    snapshot = decode_snapshot(encode_snapshot(7, False, "line", targets, ["robot_3"], fmt, 12.5))
+    assert snapshot["seq"] == 7
+    assert snapshot["keyframe"] is False
+    assert snapshot["mode"] == "line"
+    assert snapshot["targets"] == targets
+    assert snapshot["removed"] == ["robot_3"]
+    assert snapshot["t_sent"] == 12.5
+
+
+def test_malformed_binary_snapshot_is_rejected():
+    payload = encode_snapshot(0, True, "single", {"robot_1": (0.0, 0.0)}, fmt=FORMAT_BINARY)
+    with pytest.raises(ValueError):
+        decode_snapshot(payload[:-4])
+
+
+def test_keyframes_and_deltas(monkeypatch):
+    controller = SwarmController(use_snapshot=True, keyframe_interval=3)
+    sent = []
+    monkeypatch.setattr(controller.client, "publish", lambda topic, payload, *args, **kwargs: sent.append((topic, payload)))
+    controller.assigned_targets = {"robot_1": (1.0, 0.0), "robot_2": (2.0, 0.0)}
+    controller.publish_snapshot()
+    controller.assigned_targets = {"robot_1": (1.5, 0.0)}
+    controller.publish_snapshot()
+    controller.publish_snapshot()
+    controller.publish_snapshot()
+    assert all(topic == MQTT_TOPIC_SNAPSHOT for topic, _ in sent)
+    keyframe, delta, unchanged, next_keyframe = (decode_snapshot(payload) for _, payload in sent)
+    assert keyframe["keyframe"] and keyframe["targets"] == {"robot_1": (1.0, 0.0), "robot_2": (2.0, 0.0)}
+    assert not delta["keyframe"] and delta["targets"] == {"robot_1": (1.5, 0.0)} and delta["removed"] == ["robot_2"]
+    assert unchanged["targets"] == {} and unchanged["removed"] == []
+    assert next_keyframe["keyframe"] and next_keyframe["targets"] == {"robot_1": (1.5, 0.0)}
+
+
+def test_snapshots_keep_their_own_schedule():
+    clock = VirtualClock()
+    controller = SwarmController(client=LocalClient(LocalBroker(clock=clock)), verbose=False, clock=clock,
+                                 use_snapshot=True, snapshot_interval=0.5)
+    controller.target_position = (0.0, 0.0)
+    published = []
+    publish_snapshot = controller.publish_snapshot
+    controller.publish_snapshot = lambda: (published.append(clock.time()), publish_snapshot())
+
+    async def run():
+        controller.bind_loop()
+        task = asyncio.create_task(controller.snapshot_loop())
+        for _ in range(5):
+            # Membership changes tick the controller early; none of that may publish or shift a snapshot
+            controller.membership_changed = True
+            controller.update_events()
+            await controller.tick()
+            await asyncio.sleep(0)
+        task.cancel()
+
+    asyncio.run(run())
+    assert len(published) >= 3
+    assert all(later - earlier == pytest.approx(0.5) for earlier, later in zip(published, published[1:]))
@@ -0,0 +1,88 @@
+import pytest
+from clock import VirtualClock
+from codec import decode_position
+from telemetry import TelemetryPublisher
+
+
+class PendingInfo:
+    def __init__(self):
+        self.published = False
+
+    def is_published(self):
+        return self.published
+
+
+class RecordingClient:
+    """Client whose publishes stay in flight until marked published."""
+
+    def __init__(self):
+        self.messages = []
+        self.info = None
+
+    def publish(self, topic, payload):
+        self.messages.append(decode_position(payload))
+        self.info = PendingInfo()
+        return self.info
+
+
+class Pose:
+    def __init__(self):
+        self.position = (0.0, 0.0)
+        self.heading = 0.0
+
+    def __call__(self):
+        return self.position, self.heading
+
+
+def test_small_moves_are_suppressed():
+    client, pose = RecordingClient(), Pose()
+    telemetry = TelemetryPublisher(client, pose, min_distance=0.02, min_heading=0.035)
+    telemetry.publish_latest()
+    client.info.published = True
+    pose.position = (0.01, 0.0)
+    telemetry.publish_latest()
+    assert len(client.messages) == 1 and telemetry.suppressed == 1
+    pose.heading = 0.05
+    telemetry.publish_latest()
+    assert len(client.messages) == 2
+
+
+def test_busy_broker_coalesces_to_latest_pose():
+    client, pose = RecordingClient(), Pose()
+    telemetry = TelemetryPublisher(client, pose)
+    telemetry.publish_latest()
+    pose.position = (0.5, 0.0)
+    telemetry.publish_latest()
+    pose.position = (1.0, 0.0)
+    telemetry.publish_latest()
+    assert telemetry.coalesced == 2
+    client.info.published = True
+    telemetry.publish_latest()
+    assert [(message["x"], message["y"]) for message in client.messages] == [(0.0, 0.0), (1.0, 0.0)]
+
+
+def test_lost_publish_is_given_up_after_timeout():
+    client, pose = RecordingClient(), Pose()
+    telemetry = TelemetryPublisher(client, pose, clock=VirtualClock())
+    telemetry.publish_latest()
+    pose.position = (1.0, 0.0)
+    telemetry.clock.advance(telemetry.in_flight_timeout)
+    telemetry.publish_latest()
+    assert len(client.messages) == 2
+
+
+def test_missing_position_is_skipped():
+    client, pose = RecordingClient(), Pose()
+    telemetry = TelemetryPublisher(client, pose)
+    pose.position = (None, None)
+    telemetry.publish_latest()
+    assert client.messages == [] and telemetry.suppressed == 0
+
+
+def test_run_paces_on_the_clock():
+    client, pose = RecordingClient(), Pose()
+    clock = VirtualClock()
+    telemetry = TelemetryPublisher(client, pose, rate=5.0, clock=clock)
+    telemetry.publish_latest = lambda: (telemetry.stop_event.set() if clock.time() >= 1.0 else None)
+    telemetry.run()
+    assert clock.time() == pytest.approx(1.0)
@@ -0,0 +1,106 @@
+import threading
+import pytest
+from clock import VirtualClock
+from transport import LocalBroker, LocalClient, topic_matches
+
+
+@pytest.mark.parametrize("subscription, topic, expected", [
+    ("swarm/target/robot_1", "swarm/target/robot_1", True),
+    ("swarm/target/+", "swarm/target/robot_1", True),
+    ("swarm/+", "swarm/target/robot_1", False),
+    ("swarm/#", "swarm/target/robot_1", True),
+    ("swarm/target/robot_1", "swarm/target", False),
+])
+def test_topic_matches(subscription, topic, expected):
+    assert topic_matches(subscription, topic) == expected
+
+
+class Receiver:
+    def __init__(self, broker, topic, qos=0):
+        self.messages = []
+        self.client = LocalClient(broker)
+        self.client.on_message = lambda client, userdata, msg: self.messages.append(msg)
+        self.client.connect()
+        self.client.subscribe(topic, qos)
+
+
+def test_delivery_waits_for_latency():
+    clock = VirtualClock()
+    broker = LocalBroker(latency=0.1, clock=clock)
+    receiver = Receiver(broker, "a/#")
+    LocalClient(broker).publish("a/b", "hello")
+    receiver.client.loop(timeout=0)
+    assert receiver.messages == []
+    clock.advance(0.1)
+    receiver.client.loop(timeout=0)
+    assert [msg.payload for msg in receiver.messages] == [b"hello"]
+
+
+def test_retained_message_reaches_late_subscriber():
+    broker = LocalBroker()
+    LocalClient(broker).publish("status", "up", retain=True)
+    receiver = Receiver(broker, "status")
+    receiver.client.loop(timeout=0)
+    assert [(msg.payload, msg.retain) for msg in receiver.messages] == [(b"up", True)]
+
+
+def test_will_is_published_on_drop_only():
+    broker = LocalBroker()
+    receiver = Receiver(broker, "will")
+    clean, dropped = LocalClient(broker), LocalClient(broker)
+    for client in (clean, dropped):
+        client.will_set("will", "gone")
+        client.connect()
+    clean.disconnect()
+    dropped.drop()
+    receiver.client.loop(timeout=0)
+    assert len(receiver.messages) == 1
+
+
+def test_loss_drops_qos0_but_not_qos1():
+    broker = LocalBroker(loss=0.5, seed=3)
+    qos0, qos1 = Receiver(broker, "t", 0), Receiver(broker, "t", 1)
+    publisher = LocalClient(broker)
+    for _ in range(200):
+        publisher.publish("t", "x", qos=1)
+    qos0.client.loop(timeout=0)
+    qos1.client.loop(timeout=0)
+    assert 0 < len(qos0.messages) < 200
+    assert len(qos1.messages) == 200
+    assert broker.dropped == 200 - len(qos0.messages)
+
+
+def test_counters_are_consistent_across_publisher_threads():
+    broker = LocalBroker(jitter=0.001, loss=0.1, seed=1, clock=VirtualClock())
+    Receiver(broker, "t")
+
+    def publish():
+        client = LocalClient(broker)
+        for _ in range(2000):
+            client.publish("t", "x")
+
+    threads = [threading.Thread(target=publish) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert broker.published == 8000
+    assert broker.delivered + broker.dropped == 8000
+
+
+def test_topic_callbacks_take_matching_messages_from_on_message():
+    broker = LocalBroker()
+    receiver = Receiver(broker, "a/#")
+    routed = []
+    receiver.client.message_callback_add("a/time/+", lambda client, userdata, msg: routed.append(msg))
+    publisher = LocalClient(broker)
+    publisher.publish("a/time/robot_1", "reply")
+    publisher.publish("a/target", "go")
+    receiver.client.loop(timeout=0)
+    assert [msg.payload for msg in routed] == [b"reply"]
+    assert [msg.payload for msg in receiver.messages] == [b"go"]
+
+    receiver.client.message_callback_remove("a/time/+")
+    publisher.publish("a/time/robot_1", "reply")
+    receiver.client.loop(timeout=0)
+    assert [msg.payload for msg in receiver.messages] == [b"go", b"reply"]
@@ -0,0 +1,33 @@
+from clock import VirtualClock
+from uwb_reader import UWBReader
+
+
+class SerialLines:
+    """Serial port that yields the given lines, then stops the reader."""
+
+    def __init__(self, reader, lines):
+        self.reader = reader
+        self.lines = [line.encode("utf-8") for line in lines]
+
+    @property
+    def in_waiting(self):
+        if not self.lines:
+            self.reader.running = False
+        return len(self.lines)
+
+    def readline(self):
+        return self.lines.pop(0)
+
+
+def test_position_and_fix_come_from_the_same_line():
+    clock = VirtualClock(start=5.0)
+    reader = UWBReader(clock=clock)
+    assert reader.get_latest_position() == (None, None)
+    assert reader.get_latest_fix() is None
+
+    reader.ser = SerialLines(reader, ["POS,1.0,2.0,0.0", "garbage", "POS,3.0,4.0,0.0"])
+    reader.running = True
+    reader.read_uwb_data()
+    assert reader.latest == (3.0, 4.0, 2, 5.0)
+    assert reader.get_latest_position() == (3.0, 4.0)
+    assert reader.get_latest_fix() == (2, 5.0)
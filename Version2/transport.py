@@ -0,0 +1,276 @@
+"""
+MQTT transports for the swarm code.
+
+create_client() returns either a real paho client or a LocalClient attached
+to an in-process LocalBroker. LocalClient implements the subset of the paho
+client API this project uses (callbacks, connect/disconnect, loop_start,
+loop, publish, subscribe, will_set), so the controller and any number of
+robot loops can share one process without a network or a broker.
+"""
+
+import heapq
+import itertools
+import random
+import threading
+from clock import get_clock
+from config import MQTT_TRANSPORT
+
+TRANSPORT_PAHO = "paho"
+TRANSPORT_LOCAL = "local"
+
+
+def topic_matches(subscription, topic):
+    """MQTT topic filter matching with '+' (one level) and '#' (all remaining levels)."""
+    sub_levels = subscription.split("/")
+    topic_levels = topic.split("/")
+    for i, level in enumerate(sub_levels):
+        if level == "#":
+            return True
+        if i >= len(topic_levels):
+            return False
+        if level != "+" and level != topic_levels[i]:
+            return False
+    return len(sub_levels) == len(topic_levels)
+
+
+def encode_payload(payload):
+    """Payloads go over the wire as bytes, with str encoded as UTF-8 like paho does."""
+    if isinstance(payload, str):
+        return payload.encode("utf-8")
+    if payload is None:
+        return b""
+    return bytes(payload)
+
+
+class LocalMessage:
+    """Same attributes as paho's MQTTMessage."""
+
+    def __init__(self, topic, payload, qos=0, retain=False):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+
+
+class LocalMessageInfo:
+    """Same interface as paho's MQTTMessageInfo. Local publishes are accepted immediately."""
+
+    def __init__(self, mid):
+        self.mid = mid
+        self.rc = 0
+
+    def is_published(self):
+        return True
+
+    def wait_for_publish(self, timeout=None):
+        pass
+
+
+class LocalBroker:
+    """In-process pub/sub broker with injectable latency and QoS 0 loss.
+
+    latency is a fixed delivery delay in seconds, jitter adds up to that much
+    uniformly random delay, and loss is the probability that a QoS 0 delivery
+    is dropped. QoS 1 deliveries are never dropped; a "lost" QoS 1 delivery is
+    retried, costing one extra latency. Delivery times follow clock, so with
+    a VirtualClock clients must be pumped with loop(timeout=0).
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, loss=0.0, seed=None, clock=None):
+        self._clock = clock
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.subscriptions = {}  # client -> {topic filter: qos}
+        self.retained = {}
+
+        # Statistics
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    @property
+    def clock(self):
+        # Resolved on use so the shared default broker follows set_clock()
+        return self._clock or get_clock()
+
+    def attach(self, client):
+        with self.lock:
+            self.subscriptions.setdefault(client, {})
+
+    def detach(self, client):
+        with self.lock:
+            self.subscriptions.pop(client, None)
+
+    def subscribe(self, client, topic, qos):
+        with self.lock:
+            self.subscriptions.setdefault(client, {})[topic] = qos
+            retained = [msg for retained_topic, msg in self.retained.items() if topic_matches(topic, retained_topic)]
+        for msg in retained:
+            self.deliver(client, LocalMessage(msg.topic, msg.payload, min(msg.qos, qos), True))
+
+    def unsubscribe(self, client, topic):
+        with self.lock:
+            self.subscriptions.get(client, {}).pop(topic, None)
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        with self.lock:
+            self.published += 1
+            if retain:
+                if payload:
+                    self.retained[topic] = LocalMessage(topic, payload, qos, True)
+                else:
+                    self.retained.pop(topic, None)
+            targets = []
+            for client, filters in self.subscriptions.items():
+                granted = [sub_qos for sub, sub_qos in filters.items() if topic_matches(sub, topic)]
+                if granted:
+                    # Effective QoS is the lower of publish and subscription QoS
+                    targets.append((client, min(qos, max(granted))))
+        for client, effective_qos in targets:
+            self.deliver(client, LocalMessage(topic, payload, effective_qos, False))
+
+    def deliver(self, client, msg):
+        # Publishers on several threads share the random stream and the counters
+        with self.lock:
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+            if self.loss and self.random.random() < self.loss:
+                if msg.qos == 0:
+                    self.dropped += 1
+                    return
+                delay += self.latency
+            self.delivered += 1
+        client.enqueue(msg, self.clock.monotonic() + delay)
+
+
+# Default broker shared by every local client in the process
+default_broker = LocalBroker()
+
+
+class LocalClient:
+    """paho-compatible client bound to a LocalBroker."""
+
+    _mid = itertools.count(1)
+
+    def __init__(self, broker=None):
+        self.broker = broker or default_broker
+        self.on_connect = None
+        self.on_message = None
+        self.on_disconnect = None
+        self.connected = False
+        self.will = None
+        self.topic_callbacks = {}  # topic filter -> on_message-style callback, as paho's message_callback_add
+
+        self.inbox = []  # heap of (deliver_at, order, message)
+        self.order = itertools.count()
+        self.inbox_ready = threading.Condition()
+        self.loop_thread = None
+        self.loop_running = False
+
+    def will_set(self, topic, payload=None, qos=0, retain=False):
+        self.will = (topic, encode_payload(payload), qos, retain)
+
+    def connect(self, host=None, port=None, keepalive=60):
+        self.broker.attach(self)
+        self.connected = True
+        if self.on_connect:
+            self.on_connect(self, None, {}, 0)
+        return 0
+
+    def disconnect(self):
+        """Clean disconnect; the will is discarded."""
+        self.broker.detach(self)
+        self.connected = False
+        if self.on_disconnect:
+            self.on_disconnect(self, None, 0)
+        return 0
+
+    def drop(self):
+        """Simulate an unclean disconnect; the broker publishes the will."""
+        self.broker.detach(self)
+        self.connected = False
+        if self.will:
+            self.broker.publish(*self.will)
+
+    def subscribe(self, topic, qos=0):
+        # Accept the same forms as paho: a topic string or a list of (topic, qos)
+        topics = topic if isinstance(topic, list) else [(topic, qos)]
+        for sub_topic, sub_qos in topics:
+            self.broker.subscribe(self, sub_topic, sub_qos)
+        return (0, next(self._mid))
+
+    def unsubscribe(self, topic):
+        self.broker.unsubscribe(self, topic)
+        return (0, next(self._mid))
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.broker.publish(topic, encode_payload(payload), qos, retain)
+        return LocalMessageInfo(next(self._mid))
+
+    def message_callback_add(self, sub, callback):
+        self.topic_callbacks[sub] = callback
+
+    def message_callback_remove(self, sub):
+        self.topic_callbacks.pop(sub, None)
+
+    def enqueue(self, msg, deliver_at):
+        with self.inbox_ready:
+            heapq.heappush(self.inbox, (deliver_at, next(self.order), msg))
+            self.inbox_ready.notify()
+
+    def loop(self, timeout=1.0):
+        """Deliver messages that are due, waiting up to timeout for the first one."""
+        deadline = self.broker.clock.monotonic() + timeout
+        delivered = False
+        while True:
+            with self.inbox_ready:
+                now = self.broker.clock.monotonic()
+                if self.inbox and self.inbox[0][0] <= now:
+                    msg = heapq.heappop(self.inbox)[2]
+                else:
+                    if delivered or now >= deadline:
+                        return 0
+                    wait_until = min(deadline, self.inbox[0][0]) if self.inbox else deadline
+                    self.inbox_ready.wait(wait_until - now)
+                    continue
+            # Like paho, on_message only gets messages that no topic callback matched
+            callbacks = [callback for sub, callback in list(self.topic_callbacks.items())
+                         if topic_matches(sub, msg.topic)]
+            for callback in callbacks:
+                callback(self, None, msg)
+            if not callbacks and self.on_message:
+                self.on_message(self, None, msg)
+            delivered = True
+
+    def loop_start(self):
+        self.loop_running = True
+        self.loop_thread = threading.Thread(target=self._loop_forever, daemon=True)
+        self.loop_thread.start()
+
+    def loop_stop(self):
+        self.loop_running = False
+        with self.inbox_ready:
+            self.inbox_ready.notify()
+        if self.loop_thread and self.loop_thread is not threading.current_thread():
+            self.loop_thread.join()
+
+    def loop_forever(self):
+        self.loop_running = True
+        self._loop_forever()
+
+    def _loop_forever(self):
+        while self.loop_running:
+            self.loop(timeout=0.1)
+
+
+def create_client(transport=None, broker=None):
+    """Return an MQTT client for the configured transport ("paho" or "local")."""
+    transport = transport or MQTT_TRANSPORT
+    if transport == TRANSPORT_LOCAL:
+        return LocalClient(broker)
+    if transport == TRANSPORT_PAHO:
+        import paho.mqtt.client as mqtt
+        return mqtt.Client()
+    raise ValueError(f"Unknown MQTT transport '{transport}'")